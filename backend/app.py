@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 import sqlite3
 import uuid
 import json
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
 # Load environment variables from .env file
 # Try to load from backend directory explicitly
@@ -78,9 +79,18 @@ def init_db():
                 )
                 """
             )
+            # Columns added after the initial schema
+            add_missing_columns(conn, 'mockups', {'parent_id': 'TEXT'})
+            add_missing_columns(conn, 'feedback', {'applied_at': 'TEXT', 'applied_in': 'TEXT'})
     finally:
         conn.close()
 
+def add_missing_columns(conn, table, columns):
+    existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    for name, column_type in columns.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
 def save_mockup_to_db(mockup_data, html_content):
     conn = get_db_connection()
     try:
@@ -89,8 +99,8 @@ def save_mockup_to_db(mockup_data, html_content):
                 """
                 INSERT INTO mockups (
                     id, project_name, prompt, html_content,
-                    html_filename, screenshot_filename, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    html_filename, screenshot_filename, created_at, parent_id
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
                 """,
                 (
                     mockup_data['id'],
@@ -99,11 +109,13 @@ def save_mockup_to_db(mockup_data, html_content):
                     html_content,
                     mockup_data['html_filename'],
                     mockup_data['screenshot_filename'],
-                    mockup_data['created_at']
+                    mockup_data['created_at'],
+                    mockup_data.get('parent_id')
                 )
             )
     finally:
         conn.close()
+    prompt_cache.add(mockup_data['id'], mockup_data['prompt'])
 
 def get_mockup_from_db(mockup_id):
     conn = get_db_connection()
@@ -135,17 +147,28 @@ def list_mockups_from_db(limit=None, include_html=False):
             'created_at': row['created_at'],
             'html_filename': row['html_filename'],
             'screenshot_filename': row['screenshot_filename'],
+            'parent_id': row['parent_id'],
             **({'html_content': row['html_content']} if include_html else {})
         }
         for row in rows
     ]
 
+def list_prompts_from_db():
+    conn = get_db_connection()
+    try:
+        rows = conn.execute(
+            "SELECT id, prompt FROM mockups ORDER BY datetime(created_at) ASC"
+        ).fetchall()
+    finally:
+        conn.close()
+    return [(row['id'], row['prompt']) for row in rows]
+
 def get_feedback_from_db(mockup_id):
     conn = get_db_connection()
     try:
         rows = conn.execute(
             """
-            SELECT id, author, text, timestamp
+            SELECT id, author, text, timestamp, applied_at, applied_in
             FROM feedback
             WHERE mockup_id = ?
             ORDER BY timestamp ASC
@@ -159,11 +182,27 @@ def get_feedback_from_db(mockup_id):
             'id': row['id'],
             'author': row['author'],
             'text': row['text'],
-            'timestamp': row['timestamp']
+            'timestamp': row['timestamp'],
+            'applied_at': row['applied_at'],
+            'applied_in': row['applied_in']
         }
         for row in rows
     ]
 
+def mark_feedback_applied(feedback_ids, refined_mockup_id):
+    if not feedback_ids:
+        return
+    conn = get_db_connection()
+    applied_at = datetime.now().isoformat()
+    try:
+        with conn:
+            conn.executemany(
+                "UPDATE feedback SET applied_at = ?, applied_in = ? WHERE id = ?",
+                [(applied_at, refined_mockup_id, feedback_id) for feedback_id in feedback_ids]
+            )
+    finally:
+        conn.close()
+
 def add_feedback_to_db(mockup_id, author, feedback_text):
     conn = get_db_connection()
     timestamp = datetime.now().isoformat()
@@ -200,13 +239,100 @@ def serialize_mockup_row(row, include_html=False):
         'prompt': row['prompt'],
         'created_at': row['created_at'],
         'html_filename': row['html_filename'],
-        'screenshot_filename': row['screenshot_filename']
+        'screenshot_filename': row['screenshot_filename'],
+        'parent_id': row['parent_id']
     }
     if include_html:
         mockup['html_content'] = row['html_content']
     return mockup
 
-from nemotron_client import call_nvidia_nemotron
+from nemotron_client import call_nvidia_nemotron, call_nvidia_nemotron_variants
+import metrics
+from context_packer import get_budget as get_context_budget, pack_context, source as context_source
+from context_gathering import gather_context, get_stats as get_context_gathering_stats
+from deadline import Deadline, DeadlineExceeded, MIN_CALL_SECONDS
+from github_cache import get_stats as get_github_cache_stats
+from github_rate_limit import get_stats as get_github_rate_limit_stats
+from history_compaction import HistoryCompactor
+from html_diff import compute_line_changes, content_hash
+from intent_classifier import (
+    JIRA as INTENT_JIRA, README as INTENT_README, REPO_FILES as INTENT_REPO_FILES, classify_intent,
+    get_stats as get_intent_stats
+)
+from jira_index import aggregate_counts, diff_snapshots, format_delta, get_ticket_index, snapshot_tickets
+from prompt_assembly import (
+    PromptAssembler, STATIC, SESSION, VOLATILE, content_version, segment as prompt_segment
+)
+from prompt_cache import PromptCache, AUTO_RETURN as PROMPT_CACHE_AUTO_RETURN
+from repo_snapshots import get_stats as get_repo_snapshot_stats
+from speculative_generation import (
+    SpeculativeGenerator, AMBIGUOUS, CONFIRM, MODIFY, build_spec_from_suggestion_set, classify_confirmation,
+    extract_tagged_block, parse_suggestion_set
+)
+
+# Near-duplicate prompt cache over stored mockups
+prompt_cache = PromptCache(list_prompts_from_db)
+metrics.register_provider('prompt_cache', prompt_cache.get_stats)
+
+def find_similar_mockup(prompt):
+    """Return (row, similarity) for a stored mockup with a near-duplicate prompt, or None"""
+    match = prompt_cache.lookup(prompt)
+    if not match:
+        return None
+    row = get_mockup_from_db(match['mockup_id'])
+    if not row:
+        return None
+    print(f"Prompt cache hit: mockup {match['mockup_id']} (similarity {match['similarity']})")
+    return row, match['similarity']
+
+# System message for mockup generation without repository context
+MOCKUP_SYSTEM_MESSAGE = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
+
+Your mockups should:
+1. Be fully self-contained with inline CSS (no external dependencies)
+2. Use modern, professional design principles
+3. Include responsive design
+4. Use a cohesive color scheme
+5. Include placeholder content that makes sense for the use case
+6. Be visually appealing and suitable for stakeholder presentations
+7. Include semantic HTML5 elements
+8. Use modern CSS features (flexbox, grid, gradients, shadows, etc.)
+
+Return ONLY the complete HTML code, no explanations or markdown formatting."""
+
+# Limits for /api/generate-mockups/batch
+MAX_BATCH_VARIANTS = 5
+MAX_BATCH_MOCKUPS = 10
+
+# Pool for screenshot rendering: background renders and renders bounded by a request deadline.
+# Sized so a full batch renders all of its mockups at once
+render_executor = ThreadPoolExecutor(max_workers=MAX_BATCH_MOCKUPS, thread_name_prefix='render')
+
+# Seconds of the request deadline kept for mockup generation itself; repository context only gets the rest
+MOCKUP_GENERATION_RESERVE = 90
+
+def render_mockup_screenshot(html_content, screenshot_filename, deadline=None):
+    """
+    Render a mockup screenshot, logging (not raising) rendering errors
+    
+    With a deadline, waits only for the time left and lets a slow render finish in the background.
+    """
+    if deadline is not None:
+        future = render_executor.submit(render_mockup_screenshot, html_content, screenshot_filename)
+        try:
+            future.result(timeout=deadline.remaining())
+        except FutureTimeoutError:
+            metrics.increment('deadline.deferred_screenshots')
+            print(f"Screenshot {screenshot_filename} is still rendering at the request deadline")
+        return
+    try:
+        hti.screenshot(
+            html_str=html_content,
+            save_as=screenshot_filename,
+            size=(1400, 900)
+        )
+    except Exception as e:
+        print(f"Error generating screenshot: {str(e)}")
 
 def generate_mock_html(prompt):
     """Generate a simple HTML mockup (fallback for development)"""
@@ -328,131 +454,136 @@ def health_check():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'message': 'PM Mockup Generator API is running'})
 
-@app.route('/api/chat', methods=['POST'])
-def chat():
-    """Handle chat messages and manage conversation"""
-    try:
-        data = request.json
-        message = data.get('message', '')
-        conversation_id = data.get('conversation_id')
-        
-        if not message:
-            return jsonify({'error': 'Message is required'}), 400
-        
-        # Generate or use existing conversation ID
-        if not conversation_id:
-            conversation_id = str(uuid.uuid4())
-        
-        # Initialize conversation if new
-        if conversation_id not in chat_conversations:
-            chat_conversations[conversation_id] = {
-                'messages': [],
-                'ready_to_generate': False,
-                'project_info': {},
-                'readme': None,
-                'awaiting_confirmation': False,
-                'pending_mockup': None
-            }
-        
-        conversation = chat_conversations[conversation_id]
-        
-        # Check if user is asking to fetch/load README
-        fetch_readme_keywords = ['fetch readme', 'load readme', 'get readme', 'show readme', 'read readme']
-        should_fetch_readme = any(keyword in message.lower() for keyword in fetch_readme_keywords)
-        
-        if should_fetch_readme and not conversation.get('readme'):
-            github_url = os.environ.get('GITHUB_REPO_URL', '')
-            if github_url:
-                try:
-                    from repo_mockup_generator import parse_github_url
-                    from github_integration import get_repo_readme
-                    
-                    owner, repo_name = parse_github_url(github_url)
-                    if owner and repo_name:
-                        print(f"User requested README - Fetching from {owner}/{repo_name}...")
-                        github_token = os.environ.get('GITHUB_TOKEN', '')
-                        readme_content = get_repo_readme(owner, repo_name, github_token if github_token else None)
-                        if readme_content:
-                            conversation['readme'] = readme_content
-                            print(f"README loaded successfully ({len(readme_content)} chars)")
-                        else:
-                            print("No README found in repository")
-                except Exception as e:
-                    print(f"Could not fetch README: {str(e)}")
-        
-        # Add user message to conversation history
-        conversation['messages'].append({
-            'role': 'user',
-            'content': message
-        })
-        
-        # Include README context if available
-        tech_stack_context = ""
-        readme_instruction = ""
-        
-        if conversation.get('readme'):
-            tech_stack_context = f"""
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Report cache and pipeline metrics"""
+    return jsonify(metrics.snapshot())
 
-========================================
-PROJECT README (ALREADY LOADED)
-========================================
-
-{conversation['readme'][:2500]}
-
-========================================
-"""
-            readme_instruction = """
-
-CRITICAL: The user's GitHub README is ALREADY PROVIDED ABOVE. You have direct access to it.
+def prepare_chat_mockup(summary, deadline=None):
+    """Generate and render a chat mockup without storing it in the database"""
+    system_message_mockup = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
 
-When the user asks:
-- "What tech stack am I using?" → Answer directly from the README above
-- "Tell me about my README" → Summarize the README above
-- "What technologies do I use?" → List them from the README above
-
-DO NOT ask them to paste the README. You already have it!"""
-        
-        # Fetch JIRA data for chatbot context
-        jira_context = ""
-        try:
-            from jira_integration import get_jira_data_for_chatbot
-            jira_data = get_jira_data_for_chatbot(board_id=1, project_key="KAN")
-            
-            if jira_data and jira_data.get('tickets'):
-                # Format JIRA data for the chatbot
-                jira_context = f"""
-
-========================================
-JIRA PROJECT DATA (LIVE ACCESS)
-========================================
-
-Project: {jira_data['project_key']}
-Total Tickets: {jira_data['total_tickets']}
+CRITICAL INSTRUCTIONS:
+- You MUST return ONLY valid HTML code
+- Do NOT include any explanations, markdown formatting, or code blocks
+- Do NOT wrap the HTML in ```html``` or ``` tags
+- Start directly with <!DOCTYPE html> and end with </html>
+- The HTML must be complete, functional, and ready to use
 
-Status Breakdown:
-{json.dumps(jira_data['status_counts'], indent=2)}
+Your mockups should:
+1. Be fully self-contained with inline CSS (no external dependencies)
+2. Use modern, professional design principles
+3. Include responsive design
+4. Use a cohesive color scheme
+5. Include placeholder content that makes sense for the use case
+6. Be visually appealing and suitable for stakeholder presentations
+7. Include semantic HTML5 elements
+8. Use modern CSS features (flexbox, grid, gradients, shadows, etc.)
+9. Be production-ready and polished
 
-Current Tickets:
-"""
-                # Add ticket details
-                for ticket in jira_data['tickets'][:20]:  # Limit to 20 most recent
-                    jira_context += f"\n- [{ticket['key']}] {ticket['summary']}"
-                    jira_context += f"\n  Status: {ticket['status']} | Assignee: {ticket['assignee']} | Priority: {ticket['priority']}"
-                
-                jira_context += """
+Return ONLY the complete HTML code starting with <!DOCTYPE html>, no explanations or markdown formatting."""
+    
+    html_content = call_nvidia_nemotron(summary, system_message_mockup, [], deadline)
+    
+    # Clean up the HTML response
+    if '<think>' in html_content and '</think>' in html_content:
+        start_idx = html_content.find('<think>')
+        end_idx = html_content.find('</think>') + len('</think>')
+        html_content = html_content[:start_idx] + html_content[end_idx:]
+        html_content = html_content.strip()
+    
+    if '```html' in html_content:
+        html_content = html_content.split('```html')[1].split('```')[0].strip()
+    elif '```' in html_content:
+        html_content = html_content.split('```')[1].split('```')[0].strip()
+    
+    # Generate mockup metadata
+    mockup_id = datetime.now().strftime('%Y%m%d_%H%M%S%f')
+    created_at = datetime.now().isoformat()
+    
+    # Save HTML file
+    html_filename = f'mockup_{mockup_id}.html'
+    html_path = MOCKUPS_DIR / html_filename
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    
+    # Generate screenshot
+    screenshot_filename = f'mockup_{mockup_id}.png'
+    render_mockup_screenshot(html_content, screenshot_filename, deadline)
+    
+    return {
+        'id': mockup_id,
+        'created_at': created_at,
+        'html_filename': html_filename,
+        'screenshot_filename': screenshot_filename,
+        'html_content': html_content
+    }
 
-========================================
+def discard_prepared_mockup(prepared):
+    """Remove the files of a prepared mockup that was never stored"""
+    for filename in (prepared['html_filename'], prepared['screenshot_filename']):
+        (MOCKUPS_DIR / filename).unlink(missing_ok=True)
 
-You have access to the current JIRA board data. You can:
-- Answer questions about ticket counts and status
-- Tell users what tickets are in progress, done, or to do
-- Provide insights on project status
-- Reference existing tickets when creating new ones
-"""
-        except Exception as e:
-            print(f"[DEBUG] Could not load JIRA data: {str(e)}")
-        
-        system_message = f"""You are a helpful Product Manager assistant chatbot.{tech_stack_context}{jira_context}{readme_instruction}
+def store_chat_mockup(summary, prepared):
+    """Save a prepared chat mockup to the database"""
+    mockup_data = {
+        'id': prepared['id'],
+        'project_name': f"Chat Project {prepared['id']}",
+        'prompt': summary,
+        'html_filename': prepared['html_filename'],
+        'screenshot_filename': prepared['screenshot_filename'],
+        'created_at': prepared['created_at'],
+        'feedback': []
+    }
+    save_mockup_to_db(mockup_data, prepared['html_content'])
+    return mockup_data, prepared['html_content']
+
+def generate_chat_mockup(summary, deadline=None):
+    """Generate, render and store a mockup from a confirmed chat summary"""
+    return store_chat_mockup(summary, prepare_chat_mockup(summary, deadline))
+
+# Background mockup builds started as soon as the assistant suggests features
+speculative_generator = SpeculativeGenerator(prepare_chat_mockup, discard_prepared_mockup)
+metrics.register_provider('speculative_generation', speculative_generator.get_stats)
+
+def complete_chat_generation(conversation_id, conversation, summary, use_speculative, reuse_similar, deadline):
+    """Produce the mockup for a confirmed chat request and update the conversation state"""
+    similar_mockup = None
+    # Use the speculative build if the user accepted the suggestions unchanged, waiting only for the time left;
+    # otherwise it was built from a spec that may not match this summary
+    if use_speculative:
+        prepared = speculative_generator.claim(conversation_id, timeout=deadline.remaining())
+    else:
+        prepared = None
+        speculative_generator.discard(conversation_id)
+    similar = None if prepared else find_similar_mockup(summary)
+    if prepared:
+        print(f"Using speculative mockup {prepared['id']} for conversation {conversation_id}")
+        mockup_data, html_content = store_chat_mockup(summary, prepared)
+    # Reuse a stored mockup when the summary is a near-duplicate
+    elif similar and reuse_similar:
+        cached_row, similarity = similar
+        metrics.increment('prompt_cache.served')
+        mockup_data = serialize_mockup_row(cached_row)
+        mockup_data['feedback'] = get_feedback_from_db(cached_row['id'])
+        html_content = cached_row['html_content']
+    else:
+        mockup_data, html_content = generate_chat_mockup(summary, deadline)
+        if similar:
+            similar_mockup = serialize_mockup_row(similar[0])
+            similar_mockup['similarity'] = similar[1]
+    
+    conversation['ready_to_generate'] = True
+    conversation['awaiting_confirmation'] = False
+    conversation['suggestion_set'] = None
+    conversation['mockup_id'] = mockup_data['id']
+    # Tag the READY_TO_GENERATE message so history compaction keeps the mockup reference
+    if conversation['messages'] and conversation['messages'][-1]['role'] == 'assistant':
+        conversation['messages'][-1]['mockup_id'] = mockup_data['id']
+    return mockup_data, html_content, similar_mockup
+
+# Chat system message instructions (static, so they form the cacheable prompt prefix)
+CHAT_SYSTEM_INSTRUCTIONS = """You are a helpful Product Manager assistant chatbot.
 
 You can have normal conversations about product management, features, ideas, best practices, etc.
 
@@ -485,13 +616,353 @@ Examples of when NOT to suggest (just chat normally):
 
 Be friendly and helpful."""
 
-        # Prepare conversation history for the AI
-        conversation_history = []
-        for msg in conversation['messages'][:-1]:  # All messages except the current one
-            conversation_history.append({
-                'role': msg['role'],
-                'content': msg['content']
+# Fixed share of the chat context budget for the README, so its block does not change with Jira data
+CHAT_README_SHARE = 0.6
+
+prompt_assembler = PromptAssembler()
+metrics.register_provider('prompt_assembly', prompt_assembler.get_stats)
+metrics.register_provider('intent', get_intent_stats)
+metrics.register_provider('context_gathering', get_context_gathering_stats)
+metrics.register_provider('github_cache', get_github_cache_stats)
+metrics.register_provider('github_rate_limit', get_github_rate_limit_stats)
+metrics.register_provider('repo_snapshots', get_repo_snapshot_stats)
+
+# Folds older chat turns into a rolling summary once the history gets long
+history_compactor = HistoryCompactor(call_nvidia_nemotron)
+metrics.register_provider('history_compaction', history_compactor.get_stats)
+
+
+# Seconds the chat endpoint waits for each context source
+CHAT_SOURCE_TIMEOUTS = {
+    'readme': 10,
+    'jira': 8,
+    'repo_files': 20,
+}
+
+
+def fetch_chat_readme(deadline=None):
+    """Fetch the README of the configured GitHub repository (None if unavailable)"""
+    from repo_mockup_generator import parse_github_url
+    from github_integration import get_repo_readme
+    from repo_snapshots import find_snapshot
+    
+    owner, repo_name = parse_github_url(os.environ.get('GITHUB_REPO_URL', ''))
+    if not owner or not repo_name:
+        return None
+    print(f"Fetching README from {owner}/{repo_name}...")
+    github_token = os.environ.get('GITHUB_TOKEN', '')
+    # A stored snapshot at the current head already has the README; otherwise fetch just the README
+    snapshot = find_snapshot(owner, repo_name, github_token if github_token else None, deadline)
+    if snapshot:
+        readme_content = snapshot['readme']
+    else:
+        readme_content = get_repo_readme(owner, repo_name, github_token if github_token else None, deadline)
+    if not readme_content:
+        print("No README found in repository")
+    return readme_content
+
+
+def fetch_chat_repo_excerpts(message, deadline=None):
+    """Retrieve the repository file excerpts most relevant to a chat message ('' if none)"""
+    from repo_mockup_generator import get_repo_digest, parse_github_url, retrieve_repo_excerpts
+    
+    owner, repo_name = parse_github_url(os.environ.get('GITHUB_REPO_URL', ''))
+    if not owner or not repo_name:
+        return ''
+    github_token = os.environ.get('GITHUB_TOKEN', '')
+    digest = get_repo_digest(owner, repo_name, github_token if github_token else None, use_llm=False, deadline=deadline)
+    return retrieve_repo_excerpts(digest, message, get_context_budget('chat_repo'))
+
+
+def fetch_chat_jira_data(deadline=None):
+    """Fetch the JIRA board summary used as chat context"""
+    from jira_integration import get_jira_data_for_chatbot
+    return get_jira_data_for_chatbot(board_id=1, project_key="KAN", deadline=deadline)
+
+
+def render_readme_block(readme, budget):
+    """Render the README context block for the chat system message"""
+    packed = pack_context([context_source('readme', readme, priority=1)], budget)
+    return f"""
+
+========================================
+PROJECT README (ALREADY LOADED)
+========================================
+
+{packed['readme']}
+
+========================================
+
+CRITICAL: The user's GitHub README is ALREADY PROVIDED ABOVE. You have direct access to it.
+
+When the user asks:
+- "What tech stack am I using?" → Answer directly from the README above
+- "Tell me about my README" → Summarize the README above
+- "What technologies do I use?" → List them from the README above
+
+DO NOT ask them to paste the README. You already have it!"""
+
+
+def render_repo_files_block(excerpts):
+    """Render the retrieved repository file excerpts for the chat system message"""
+    return f"""
+
+========================================
+RELEVANT REPOSITORY FILES (EXCERPTS)
+========================================
+
+{excerpts}
+
+========================================
+
+These excerpts were retrieved from the user's repository for this message. Use them to answer questions about the code, components and styling."""
+
+
+def build_chat_jira_context(conversation, jira_data, message, budget):
+    """
+    Build the Jira context for the current chat message, relative to what the conversation has already seen
+    
+    The first Jira turn (or the first after the snapshot turn was summarized away) gets the full block.
+    Later turns get only changes since the last snapshot and relevant tickets not shown yet, or nothing.
+    """
+    jira_version = content_version(json.dumps(jira_data, sort_keys=True, default=str))
+    # Only the tickets relevant to this message, plus board-wide counts
+    relevant_tickets = get_ticket_index(jira_data['tickets'], jira_version).search(message)
+    current = snapshot_tickets(jira_data['tickets'])
+    message_index = len(conversation['messages']) - 1
+    seen = conversation.get('jira_snapshot')
+    
+    # The snapshot must still be in the verbatim history for a delta to make sense
+    if not seen or seen['message_index'] < conversation.get('summarized_count', 0):
+        conversation['jira_snapshot'] = {
+            'version': jira_version,
+            'message_index': message_index,
+            'tickets': current,
+            'status_counts': jira_data['status_counts'],
+            'shown': [t['key'] for t in relevant_tickets],
+        }
+        metrics.increment('jira_context.full')
+        return render_jira_block(jira_data, relevant_tickets, budget).strip()
+    
+    unseen_tickets = [t for t in relevant_tickets if t['key'] not in seen['shown']]
+    if seen['version'] == jira_version and not unseen_tickets:
+        metrics.increment('jira_context.unchanged')
+        return ''
+    
+    delta_lines = format_delta(diff_snapshots(seen['tickets'], current), current)
+    parts = ["JIRA UPDATE (since the Jira data earlier in this conversation):"]
+    if delta_lines:
+        parts.append(f"Changes:\n{delta_lines}")
+    if jira_data['status_counts'] != seen['status_counts']:
+        parts.append(f"Status Breakdown now: {json.dumps(jira_data['status_counts'])}")
+    if unseen_tickets:
+        ticket_lines = '\n'.join(
+            f"- [{t['key']}] {t['summary']} | Status: {t['status']} | Assignee: {t['assignee']} | Priority: {t['priority']}"
+            for t in unseen_tickets
+        )
+        packed = pack_context([context_source('jira_tickets', ticket_lines, priority=1)], budget)
+        parts.append(f"Other tickets relevant to this message:\n{packed['jira_tickets']}")
+    
+    seen.update({
+        'version': jira_version,
+        'tickets': current,
+        'status_counts': jira_data['status_counts'],
+        'shown': seen['shown'] + [t['key'] for t in unseen_tickets],
+    })
+    metrics.increment('jira_context.delta')
+    return '\n\n'.join(parts)
+
+
+def message_with_context(msg):
+    """Return a chat message's text with the context recorded for it (e.g., Jira data) in front"""
+    if msg.get('context'):
+        return f"{msg['context']}\n\n{msg['content']}"
+    return msg['content']
+
+
+def render_jira_block(jira_data, tickets, budget):
+    """Render the live Jira context block (relevant tickets and board-wide counts) for the chat system message"""
+    ticket_lines = ""
+    for ticket in tickets:
+        ticket_lines += f"\n- [{ticket['key']}] {ticket['summary']}"
+        ticket_lines += f"\n  Status: {ticket['status']} | Assignee: {ticket['assignee']} | Priority: {ticket['priority']}"
+    packed = pack_context([context_source('jira_tickets', ticket_lines.strip(), priority=1)], budget)
+    counts = aggregate_counts(jira_data['tickets'])
+
+    return f"""
+
+========================================
+JIRA PROJECT DATA (LIVE ACCESS)
+========================================
+
+Project: {jira_data['project_key']}
+Total Tickets: {jira_data['total_tickets']}
+
+Status Breakdown:
+{json.dumps(jira_data['status_counts'], indent=2)}
+
+By Assignee:
+{json.dumps(counts['assignee'], indent=2)}
+
+By Type:
+{json.dumps(counts['type'], indent=2)}
+
+Tickets Most Relevant to the Current Message ({len(tickets)} of {jira_data['total_tickets']}):
+{packed['jira_tickets']}
+
+========================================
+
+You have access to the current JIRA board data. You can:
+- Answer questions about ticket counts and status (use the breakdowns above for totals)
+- Tell users what tickets are in progress, done, or to do
+- Provide insights on project status
+- Reference existing tickets when creating new ones
+"""
+
+
+@app.route('/api/chat', methods=['POST'])
+def chat():
+    """Handle chat messages and manage conversation"""
+    try:
+        data = request.json
+        message = data.get('message', '')
+        conversation_id = data.get('conversation_id')
+        
+        if not message:
+            return jsonify({'error': 'Message is required'}), 400
+        
+        # Generate or use existing conversation ID
+        if not conversation_id:
+            conversation_id = str(uuid.uuid4())
+        
+        # Initialize conversation if new
+        if conversation_id not in chat_conversations:
+            chat_conversations[conversation_id] = {
+                'messages': [],
+                'ready_to_generate': False,
+                'project_info': {},
+                'readme': None,
+                'awaiting_confirmation': False,
+                'suggestion_set': None,
+                'pending_mockup': None
+            }
+        
+        conversation = chat_conversations[conversation_id]
+        deadline = Deadline()
+        
+        # A reply to suggestions accepts them as-is, changes the request, or is left to the model
+        reply_kind = classify_confirmation(message) if conversation.get('awaiting_confirmation') else None
+        if reply_kind == MODIFY:
+            # The stored suggestions no longer describe what the user wants
+            conversation['suggestion_set'] = None
+            speculative_generator.discard(conversation_id)
+        # Ambiguous replies keep the suggestion set and its build until the model has answered; the build is
+        # only used for clear confirmations, since an ambiguous reply may carry a change ("make the header blue")
+        kept_suggestions = reply_kind in (CONFIRM, AMBIGUOUS)
+        
+        # Clear confirmations go straight to generation from the stored suggestion set;
+        # only ambiguous replies need the model to decide
+        if reply_kind == CONFIRM and conversation.get('suggestion_set'):
+            metrics.increment('chat.local_confirmations')
+            summary = build_spec_from_suggestion_set(conversation['suggestion_set'])
+            conversation['messages'].append({'role': 'user', 'content': message})
+            conversation['messages'].append({
+                'role': 'assistant',
+                'content': f"<READY_TO_GENERATE>\n{summary}\n</READY_TO_GENERATE>"
             })
+            mockup_data, html_content, similar_mockup = complete_chat_generation(
+                conversation_id, conversation, summary,
+                use_speculative=True,
+                reuse_similar=data.get('reuse_similar', PROMPT_CACHE_AUTO_RETURN),
+                deadline=deadline
+            )
+            return jsonify({
+                'success': True,
+                'conversation_id': conversation_id,
+                'message': f"Great! Creating your mockup with these features:\n\n{summary}",
+                'has_suggestions': False,
+                'awaiting_confirmation': False,
+                'ready_to_generate': True,
+                'mockup': mockup_data,
+                'html_content': html_content,
+                'similar_mockup': similar_mockup
+            })
+        
+        # Decide which context providers this message needs; the others are not loaded
+        intent = classify_intent(message, conversation.get('context_providers'))
+        conversation['context_providers'] = intent['providers']
+        print(f"[DEBUG] Context providers for message: {intent['providers']} ({intent['source']})")
+        needs_readme = INTENT_README in intent['providers']
+        needs_repo_files = INTENT_REPO_FILES in intent['providers']
+        needs_jira = INTENT_JIRA in intent['providers']
+        
+        # Check if user is asking to fetch/load README
+        fetch_readme_keywords = ['fetch readme', 'load readme', 'get readme', 'show readme', 'read readme']
+        should_fetch_readme = any(keyword in message.lower() for keyword in fetch_readme_keywords)
+        if should_fetch_readme:
+            needs_readme = True
+        
+        # Add user message to conversation history
+        conversation['messages'].append({
+            'role': 'user',
+            'content': message
+        })
+        
+        # Fetch the README and JIRA data concurrently, continuing without any source that is too slow
+        context_sources = {}
+        if needs_readme and not conversation.get('readme') and os.environ.get('GITHUB_REPO_URL', ''):
+            context_sources['readme'] = lambda: fetch_chat_readme(deadline)
+        if needs_jira:
+            context_sources['jira'] = lambda: fetch_chat_jira_data(deadline)
+        if needs_repo_files and os.environ.get('GITHUB_REPO_URL', ''):
+            context_sources['repo_files'] = lambda: fetch_chat_repo_excerpts(message, deadline)
+        source_timeouts = {name: min(seconds, deadline.remaining()) for name, seconds in CHAT_SOURCE_TIMEOUTS.items()}
+        gathered = gather_context(context_sources, timeouts=source_timeouts) if context_sources else None
+        
+        jira_data = None
+        repo_excerpts = None
+        if gathered:
+            for name, error in gathered['errors'].items():
+                print(f"[DEBUG] Could not load {name} context: {error}")
+            if gathered['results'].get('readme'):
+                conversation['readme'] = gathered['results']['readme']
+                print(f"README loaded successfully ({len(conversation['readme'])} chars)")
+            jira_data = gathered['results'].get('jira')
+            repo_excerpts = gathered['results'].get('repo_files')
+        
+        # Prepare conversation history for the AI: recent turns verbatim, older turns summarized
+        conversation_history = history_compactor.build_history(conversation_id, conversation)
+        
+        # Static instructions first, then the README (stable for the conversation), then the summary
+        # and per-message context; Jira data travels with the user messages as snapshots and deltas
+        chat_budget = get_context_budget('chat')
+        readme_budget = int(chat_budget * CHAT_README_SHARE)
+        segments = [prompt_segment('instructions', STATIC, text=CHAT_SYSTEM_INSTRUCTIONS)]
+        # Once loaded, the README stays in the prefix on every turn so the prefix doesn't change;
+        # the intent only decides whether to load it and which volatile sources to add
+        if conversation.get('readme'):
+            segments.append(prompt_segment(
+                'readme', SESSION,
+                render=lambda: render_readme_block(conversation['readme'], readme_budget),
+                version=content_version(conversation['readme'], readme_budget),
+            ))
+        if conversation.get('history_summary'):
+            segments.append(prompt_segment(
+                'history_summary', SESSION,
+                render=lambda: history_compactor.render_summary(conversation),
+                version=content_version(conversation['history_summary'], conversation.get('history_markers')),
+            ))
+        if repo_excerpts:
+            segments.append(prompt_segment(
+                'repo_files', VOLATILE,
+                render=lambda: render_repo_files_block(repo_excerpts),
+                version=content_version(repo_excerpts),
+            ))
+        if jira_data and jira_data.get('tickets'):
+            jira_context = build_chat_jira_context(conversation, jira_data, message, chat_budget - readme_budget)
+            if jira_context:
+                conversation['messages'][-1]['context'] = jira_context
+        system_message = prompt_assembler.assemble(conversation_id, segments, separator='')
         
         # Debug: Log if README is being used
         if conversation.get('readme'):
@@ -503,7 +974,9 @@ Be friendly and helpful."""
         print(f"[DEBUG] System message length: {len(system_message)} chars")
         
         # Call NVIDIA Nemotron for response
-        ai_response = call_nvidia_nemotron(message, system_message, conversation_history)
+        ai_response = call_nvidia_nemotron(
+            message_with_context(conversation['messages'][-1]), system_message, conversation_history, deadline
+        )
         
         # Clean up <think> tags from the response
         if '<think>' in ai_response and '</think>' in ai_response:
@@ -529,10 +1002,19 @@ Be friendly and helpful."""
         if has_suggestions:
             display_message = display_message.replace('<SUGGESTIONS>', '').replace('</SUGGESTIONS>', '').strip()
             conversation['awaiting_confirmation'] = True
+            # Keep the suggestion set so a confirmation can skip the model, and since
+            # most users confirm, start building the suggested mockup right away
+            suggestions = extract_tagged_block(ai_response, 'SUGGESTIONS')
+            if suggestions:
+                conversation['suggestion_set'] = parse_suggestion_set(message, suggestions)
+                speculative_generator.start(
+                    conversation_id, build_spec_from_suggestion_set(conversation['suggestion_set'])
+                )
         
         # If ready to generate, extract the summary and generate mockup
         mockup_data = None
         html_content = None
+        similar_mockup = None
         
         if ready_to_generate:
             # Extract the summary between tags
@@ -542,80 +1024,16 @@ Be friendly and helpful."""
             end_idx = ai_response.find(end_tag)
             summary = ai_response[start_idx:end_idx].strip()
             
-            # Generate mockup using the summary as prompt
-            system_message_mockup = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
-
-CRITICAL INSTRUCTIONS:
-- You MUST return ONLY valid HTML code
-- Do NOT include any explanations, markdown formatting, or code blocks
-- Do NOT wrap the HTML in ```html``` or ``` tags
-- Start directly with <!DOCTYPE html> and end with </html>
-- The HTML must be complete, functional, and ready to use
-
-Your mockups should:
-1. Be fully self-contained with inline CSS (no external dependencies)
-2. Use modern, professional design principles
-3. Include responsive design
-4. Use a cohesive color scheme
-5. Include placeholder content that makes sense for the use case
-6. Be visually appealing and suitable for stakeholder presentations
-7. Include semantic HTML5 elements
-8. Use modern CSS features (flexbox, grid, gradients, shadows, etc.)
-9. Be production-ready and polished
-
-Return ONLY the complete HTML code starting with <!DOCTYPE html>, no explanations or markdown formatting."""
-            
-            html_content = call_nvidia_nemotron(summary, system_message_mockup, [])
-            
-            # Clean up the HTML response
-            if '<think>' in html_content and '</think>' in html_content:
-                start_idx = html_content.find('<think>')
-                end_idx = html_content.find('</think>') + len('</think>')
-                html_content = html_content[:start_idx] + html_content[end_idx:]
-                html_content = html_content.strip()
-            
-            if '```html' in html_content:
-                html_content = html_content.split('```html')[1].split('```')[0].strip()
-            elif '```' in html_content:
-                html_content = html_content.split('```')[1].split('```')[0].strip()
-            
-            # Generate mockup metadata
-            mockup_id = datetime.now().strftime('%Y%m%d_%H%M%S%f')
-            created_at = datetime.now().isoformat()
-            
-            # Save HTML file
-            html_filename = f'mockup_{mockup_id}.html'
-            html_path = MOCKUPS_DIR / html_filename
-            with open(html_path, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            # Generate screenshot
-            screenshot_filename = f'mockup_{mockup_id}.png'
-            try:
-                hti.screenshot(
-                    html_str=html_content,
-                    save_as=screenshot_filename,
-                    size=(1400, 900)
-                )
-            except Exception as e:
-                print(f"Error generating screenshot: {str(e)}")
-            
-            # Create mockup data
-            mockup_data = {
-                'id': mockup_id,
-                'project_name': f"Chat Project {mockup_id}",
-                'prompt': summary,
-                'html_filename': html_filename,
-                'screenshot_filename': screenshot_filename,
-                'created_at': created_at,
-                'feedback': []
-            }
-            
-            # Save to database
-            save_mockup_to_db(mockup_data, html_content)
-            
-            conversation['ready_to_generate'] = True
-            conversation['mockup_id'] = mockup_id
+            mockup_data, html_content, similar_mockup = complete_chat_generation(
+                conversation_id, conversation, summary,
+                use_speculative=reply_kind == CONFIRM,
+                reuse_similar=data.get('reuse_similar', PROMPT_CACHE_AUTO_RETURN),
+                deadline=deadline
+            )
+        elif kept_suggestions and not has_suggestions:
+            # The model did not generate after all; don't keep a stale build around
+            conversation['suggestion_set'] = None
+            speculative_generator.discard(conversation_id)
         
         return jsonify({
             'success': True,
@@ -625,9 +1043,16 @@ Return ONLY the complete HTML code starting with <!DOCTYPE html>, no explanation
             'awaiting_confirmation': conversation.get('awaiting_confirmation', False),
             'ready_to_generate': ready_to_generate,
             'mockup': mockup_data,
-            'html_content': html_content
+            'html_content': html_content,
+            'similar_mockup': similar_mockup
         })
     
+    except DeadlineExceeded as e:
+        print(f"Chat request ran out of time: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 504
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")
         import traceback
@@ -703,13 +1128,51 @@ def generate_mockup():
     
     if not prompt:
         return jsonify({'error': 'Prompt is required'}), 400
+    deadline = Deadline()
+
+    # Check for a near-duplicate prompt before calling Nemotron
+    if not data.get('force_generate'):
+        similar = find_similar_mockup(prompt)
+        if similar:
+            cached_row, similarity = similar
+            cached_mockup = serialize_mockup_row(cached_row)
+            if data.get('reuse_similar', PROMPT_CACHE_AUTO_RETURN):
+                metrics.increment('prompt_cache.served')
+                cached_mockup['feedback'] = get_feedback_from_db(cached_row['id'])
+                return jsonify({
+                    'success': True,
+                    'mockup': cached_mockup,
+                    'html_content': cached_row['html_content'],
+                    'used_github_context': False,
+                    'cache_hit': True,
+                    'similarity': similarity
+                })
+            return jsonify({
+                'success': True,
+                'cache_offer': True,
+                'similar_mockup': cached_mockup,
+                'similarity': similarity,
+                'message': 'A very similar mockup already exists. Resend with reuse_similar=true to use it, or force_generate=true to create a new one.'
+            })
+
+    # Repository context is optional: it only gets the time not reserved for generation
+    generation_prompt = prompt
+    system_message = MOCKUP_SYSTEM_MESSAGE
+    repo_deadline = deadline.before(MOCKUP_GENERATION_RESERVE)
+    if github_repo_url and not repo_deadline.has_budget(MIN_CALL_SECONDS):
+        metrics.increment('deadline.skipped_stages')
+        print("Skipping GitHub repository context: not enough time left")
+        github_repo_url = None
     
     # If GitHub repo URL is provided, use repo-aware generator to enhance with repo context
     if github_repo_url:
         try:
-            from repo_mockup_generator import generate_mockup_from_repo
+            from repo_mockup_generator import REPO_MOCKUP_SYSTEM_MESSAGE, prepare_repo_enhanced_prompts
             print(f"Using GitHub repository context: {github_repo_url}")
-            html_content = generate_mockup_from_repo(github_repo_url, prompt, None)
+            generation_prompt = prepare_repo_enhanced_prompts(
+                github_repo_url, [prompt], None, data.get('llm_enhancement'), repo_deadline
+            )[0]
+            system_message = REPO_MOCKUP_SYSTEM_MESSAGE
         except Exception as e:
             print(f"Error using GitHub repo context: {str(e)}")
             import traceback
@@ -718,25 +1181,11 @@ def generate_mockup():
             # Fall back to standard generation
             github_repo_url = None
     
-    # Standard mockup generation (if no GitHub repo or if GitHub integration failed)
-    if not github_repo_url:
-        # Create system message for mockup generation
-        system_message = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
-
-Your mockups should:
-1. Be fully self-contained with inline CSS (no external dependencies)
-2. Use modern, professional design principles
-3. Include responsive design
-4. Use a cohesive color scheme
-5. Include placeholder content that makes sense for the use case
-6. Be visually appealing and suitable for stakeholder presentations
-7. Include semantic HTML5 elements
-8. Use modern CSS features (flexbox, grid, gradients, shadows, etc.)
-
-Return ONLY the complete HTML code, no explanations or markdown formatting."""
-        
-        # Call NVIDIA Nemotron to generate HTML
-        html_content = call_nvidia_nemotron(prompt, system_message)
+    # Call NVIDIA Nemotron to generate HTML (standard prompt if no GitHub repo or if GitHub integration failed)
+    try:
+        html_content = call_nvidia_nemotron(generation_prompt, system_message, deadline=deadline)
+    except DeadlineExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
     
     # Clean up the response (remove thinking tags and markdown code blocks)
     # Remove <think>...</think> sections that the model might include
@@ -763,17 +1212,9 @@ Return ONLY the complete HTML code, no explanations or markdown formatting."""
     with open(html_path, 'w', encoding='utf-8') as f:
         f.write(html_content)
     
-    # Generate screenshot
+    # Generate screenshot (continues in the background if the deadline is reached)
     screenshot_filename = f'mockup_{mockup_id}.png'
-    try:
-        hti.screenshot(
-            html_str=html_content,
-            save_as=screenshot_filename,
-            size=(1400, 900)
-        )
-    except Exception as e:
-        print(f"Error generating screenshot: {str(e)}")
-        # Continue without screenshot
+    render_mockup_screenshot(html_content, screenshot_filename, deadline)
     
     # Save mockup metadata (include GitHub repo URL if used)
     mockup_data = {
@@ -796,6 +1237,106 @@ Return ONLY the complete HTML code, no explanations or markdown formatting."""
         'used_github_context': bool(github_repo_url)
     })
 
+@app.route('/api/generate-mockups/batch', methods=['POST'])
+def generate_mockups_batch():
+    """Generate several mockups (different prompts or variants of one prompt) in parallel"""
+    data = request.json or {}
+    prompts = data.get('prompts')
+    prompt = data.get('prompt', '')
+    project_name = data.get('project_name', 'Untitled Project')
+    github_repo_url = "https://github.com/GraysenGould/TestBanking.git"
+    
+    # Each job is (prompt, number of variants); variants only apply to a single prompt
+    if prompts:
+        if not isinstance(prompts, list) or not all(isinstance(p, str) and p.strip() for p in prompts):
+            return jsonify({'error': 'Prompts must be a list of non-empty strings'}), 400
+        jobs = [(p, 1) for p in prompts]
+    elif prompt:
+        try:
+            variants = int(data.get('variants', 1))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Variants must be an integer'}), 400
+        if variants < 1 or variants > MAX_BATCH_VARIANTS:
+            return jsonify({'error': f'Variants must be between 1 and {MAX_BATCH_VARIANTS}'}), 400
+        jobs = [(prompt, variants)]
+    else:
+        return jsonify({'error': 'Either prompt or prompts is required'}), 400
+    
+    if sum(count for _, count in jobs) > MAX_BATCH_MOCKUPS:
+        return jsonify({'error': f'A batch can generate at most {MAX_BATCH_MOCKUPS} mockups'}), 400
+    
+    from repo_mockup_generator import (
+        REPO_MOCKUP_SYSTEM_MESSAGE, clean_html_response, prepare_repo_enhanced_prompts
+    )
+    deadline = Deadline()
+    
+    # Repository analysis is done once for the whole batch, within the time not reserved for generation
+    try:
+        generation_prompts = prepare_repo_enhanced_prompts(
+            github_repo_url, [p for p, _ in jobs], None, data.get('llm_enhancement'),
+            deadline.before(MOCKUP_GENERATION_RESERVE)
+        )
+        system_message = REPO_MOCKUP_SYSTEM_MESSAGE
+    except Exception as e:
+        print(f"Error using GitHub repo context for batch: {str(e)}")
+        print("Falling back to standard mockup generation")
+        github_repo_url = None
+        generation_prompts = [p for p, _ in jobs]
+        system_message = MOCKUP_SYSTEM_MESSAGE
+    
+    try:
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            generated = list(pool.map(
+                lambda job: call_nvidia_nemotron_variants(job[0], system_message, job[1], deadline=deadline),
+                [(generation_prompt, count) for generation_prompt, (_, count) in zip(generation_prompts, jobs)]
+            ))
+    except DeadlineExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    except Exception as e:
+        print(f"Error generating mockup batch: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    # Persist every variant, then render all screenshots in parallel
+    batch_id = datetime.now().strftime('%Y%m%d_%H%M%S%f')
+    created_at = datetime.now().isoformat()
+    mockups = []
+    for job_index, ((original_prompt, _), html_variants) in enumerate(zip(jobs, generated)):
+        for variant_index, html_content in enumerate(html_variants):
+            html_content = clean_html_response(html_content)
+            mockup_id = f"{batch_id}_{len(mockups)}"
+            html_filename = f'mockup_{mockup_id}.html'
+            with open(MOCKUPS_DIR / html_filename, 'w', encoding='utf-8') as f:
+                f.write(html_content)
+            mockups.append({
+                'id': mockup_id,
+                'project_name': project_name,
+                'prompt': original_prompt,
+                'html_filename': html_filename,
+                'screenshot_filename': f'mockup_{mockup_id}.png',
+                'created_at': created_at,
+                'feedback': [],
+                'github_repo_url': github_repo_url,
+                'prompt_index': job_index,
+                'variant_index': variant_index,
+                'html_content': html_content
+            })
+    
+    with ThreadPoolExecutor(max_workers=len(mockups)) as pool:
+        list(pool.map(
+            lambda mockup: render_mockup_screenshot(mockup['html_content'], mockup['screenshot_filename'], deadline),
+            mockups
+        ))
+    
+    for mockup in mockups:
+        save_mockup_to_db(mockup, mockup['html_content'])
+    
+    return jsonify({
+        'success': True,
+        'batch_id': batch_id,
+        'mockups': mockups,
+        'used_github_context': bool(github_repo_url)
+    })
+
 @app.route('/api/mockups/<mockup_id>/html', methods=['GET'])
 def get_mockup_html(mockup_id):
     """Get HTML content of a mockup"""
@@ -837,16 +1378,8 @@ def get_feedback(mockup_id):
     mockup_feedback = get_feedback_from_db(mockup_id)
     return jsonify({'feedback': mockup_feedback})
 
-@app.route('/api/refine-mockup', methods=['POST'])
-def refine_mockup():
-    """Refine an existing mockup based on feedback"""
-    data = request.json
-    original_html = data.get('original_html', '')
-    feedback_list = data.get('feedback', [])
-    
-    if not original_html or not feedback_list:
-        return jsonify({'error': 'Original HTML and feedback are required'}), 400
-    
+def refine_html(original_html, feedback_list, deadline=None):
+    """Ask Nemotron to refine mockup HTML according to a list of feedback items"""
     # Create refinement prompt
     feedback_text = '\n'.join([f"- {fb}" for fb in feedback_list])
     refinement_prompt = f"""Based on the following feedback, refine this HTML mockup:
@@ -864,7 +1397,7 @@ Generate complete, improved HTML that addresses all feedback points while mainta
 Return ONLY the complete HTML code, no explanations."""
     
     # Call NVIDIA Nemotron to refine
-    refined_html = call_nvidia_nemotron(refinement_prompt, system_message)
+    refined_html = call_nvidia_nemotron(refinement_prompt, system_message, deadline=deadline)
     
     # Clean up the response (remove thinking tags and markdown code blocks)
     if '<think>' in refined_html and '</think>' in refined_html:
@@ -878,6 +1411,10 @@ Return ONLY the complete HTML code, no explanations."""
     elif '```' in refined_html:
         refined_html = refined_html.split('```')[1].split('```')[0].strip()
     
+    return refined_html, refinement_prompt
+
+def store_refined_mockup(refined_html, project_name, prompt, parent_id=None, deadline=None):
+    """Save a refined mockup version to disk and the database"""
     # Generate new mockup ID
     mockup_id = datetime.now().strftime('%Y%m%d_%H%M%S%f')
     created_at = datetime.now().isoformat()
@@ -890,30 +1427,87 @@ Return ONLY the complete HTML code, no explanations."""
     
     # Generate screenshot
     screenshot_filename = f'mockup_{mockup_id}.png'
-    try:
-        hti.screenshot(
-            html_str=refined_html,
-            save_as=screenshot_filename,
-            size=(1400, 900)
-        )
-    except Exception as e:
-        print(f"Error generating screenshot: {str(e)}")
+    render_mockup_screenshot(refined_html, screenshot_filename, deadline)
     
     refined_mockup_data = {
         'id': mockup_id,
-        'project_name': 'Refined Mockup',
-        'prompt': refinement_prompt,
+        'project_name': project_name,
+        'prompt': prompt,
         'html_filename': html_filename,
         'screenshot_filename': screenshot_filename,
         'created_at': created_at,
+        'parent_id': parent_id,
         'feedback': []
     }
 
     save_mockup_to_db(refined_mockup_data, refined_html)
+    return refined_mockup_data
+
+@app.route('/api/refine-mockup', methods=['POST'])
+def refine_mockup():
+    """Refine an existing mockup based on feedback"""
+    data = request.json
+    original_html = data.get('original_html', '')
+    feedback_list = data.get('feedback', [])
+    
+    if not original_html or not feedback_list:
+        return jsonify({'error': 'Original HTML and feedback are required'}), 400
+    
+    deadline = Deadline()
+    try:
+        refined_html, refinement_prompt = refine_html(original_html, feedback_list, deadline)
+    except DeadlineExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    refined_mockup_data = store_refined_mockup(refined_html, 'Refined Mockup', refinement_prompt, deadline=deadline)
 
     return jsonify({
         'success': True,
-        'mockup_id': mockup_id,
+        'mockup_id': refined_mockup_data['id'],
+        'html_content': refined_html
+    })
+
+@app.route('/api/mockups/<mockup_id>/refine', methods=['POST'])
+def refine_stored_mockup(mockup_id):
+    """Refine a stored mockup using its unapplied feedback, creating a linked new version"""
+    data = request.get_json(silent=True) or {}
+    extra_feedback = data.get('feedback', [])
+    
+    if not isinstance(extra_feedback, list):
+        return jsonify({'error': 'Feedback must be a list'}), 400
+    
+    mockup = get_mockup_from_db(mockup_id)
+    if not mockup:
+        return jsonify({'error': 'Mockup not found'}), 404
+    
+    pending_feedback = [fb for fb in get_feedback_from_db(mockup_id) if not fb['applied_at']]
+    feedback_list = [fb['text'] for fb in pending_feedback] + [str(fb) for fb in extra_feedback if fb]
+    
+    if not feedback_list:
+        return jsonify({'error': 'No unapplied feedback to refine with'}), 400
+    
+    deadline = Deadline()
+    try:
+        refined_html, _ = refine_html(mockup['html_content'], feedback_list, deadline)
+    except DeadlineExceeded as e:
+        return jsonify({'success': False, 'error': str(e)}), 504
+    except Exception as e:
+        print(f"Error refining mockup {mockup_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    refined_mockup_data = store_refined_mockup(
+        refined_html, mockup['project_name'], mockup['prompt'], parent_id=mockup_id, deadline=deadline
+    )
+    mark_feedback_applied([fb['id'] for fb in pending_feedback], refined_mockup_data['id'])
+
+    return jsonify({
+        'success': True,
+        'mockup': refined_mockup_data,
+        'mockup_id': refined_mockup_data['id'],
+        'parent_id': mockup_id,
+        'applied_feedback_ids': [fb['id'] for fb in pending_feedback],
         'html_content': refined_html
     })
 
@@ -934,10 +1528,15 @@ def simulate_feedback():
     css_content = '\n'.join(css_matches) if css_matches else 'No inline CSS found'
     js_content = '\n'.join(js_matches) if js_matches else 'No inline JavaScript found'
     
-    # Limit content to avoid token limits
-    html_preview = html_content[:5000] if len(html_content) > 5000 else html_content
-    css_preview = css_content[:2000] if len(css_content) > 2000 else css_content
-    js_preview = js_content[:2000] if len(js_content) > 2000 else js_content
+    # Fit the markup, styles and scripts into the feedback context budget
+    packed = pack_context([
+        context_source('html', html_content, priority=1, min_tokens=1000),
+        context_source('css', css_content, priority=2, min_tokens=400),
+        context_source('js', js_content, priority=3, min_tokens=300),
+    ], get_context_budget('feedback'))
+    html_preview = packed['html']
+    css_preview = packed['css']
+    js_preview = packed['js']
     
     # Create analysis prompt
     analysis_prompt = f"""Analyze this HTML mockup and provide the top 3 criticisms or feedback points that a stakeholder or end user might have.
@@ -980,7 +1579,7 @@ Your response must be valid JSON only, with no markdown formatting or explanatio
     
     try:
         # Call NVIDIA Nemotron to analyze
-        feedback_response = call_nvidia_nemotron(analysis_prompt, system_message)
+        feedback_response = call_nvidia_nemotron(analysis_prompt, system_message, deadline=Deadline())
         
         # Clean up the response
         if '<think>' in feedback_response:
@@ -996,7 +1595,6 @@ Your response must be valid JSON only, with no markdown formatting or explanatio
             feedback_response = feedback_response.split('```')[1].split('```')[0].strip()
         
         # Parse JSON
-        import json
         json_start = feedback_response.find('{')
         json_end = feedback_response.rfind('}') + 1
         
@@ -1051,6 +1649,12 @@ Your response must be valid JSON only, with no markdown formatting or explanatio
                 }
             ]
         })
+    except DeadlineExceeded as e:
+        print(f"Feedback simulation ran out of time: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 504
     except Exception as e:
         print(f"Error simulating feedback: {str(e)}")
         import traceback
@@ -1060,16 +1664,8 @@ Your response must be valid JSON only, with no markdown formatting or explanatio
             'error': f'Failed to simulate feedback: {str(e)}'
         }), 500
 
-@app.route('/api/edit-html', methods=['POST'])
-def edit_html():
-    """Edit HTML using natural language instructions"""
-    data = request.json
-    original_html = data.get('html_content', '')
-    edit_instruction = data.get('instruction', '')
-    
-    if not original_html or not edit_instruction:
-        return jsonify({'error': 'HTML content and edit instruction are required'}), 400
-    
+def edit_html_with_instruction(original_html, edit_instruction, deadline=None):
+    """Ask Nemotron to apply a natural language edit instruction to HTML"""
     # Create edit prompt
     edit_prompt = f"""Edit the following HTML according to this instruction: {edit_instruction}
 
@@ -1083,26 +1679,63 @@ When given HTML code and an edit instruction, modify the HTML to implement the r
 Maintain the overall structure and styling while making the specific requested modifications.
 Return ONLY the complete HTML code, no explanations."""
     
+    # Call NVIDIA Nemotron to edit
+    edited_html = call_nvidia_nemotron(edit_prompt, system_message, deadline=deadline)
+    
+    # Clean up the response (remove thinking tags and markdown code blocks)
+    if '<think>' in edited_html and '</think>' in edited_html:
+        start_idx = edited_html.find('<think>')
+        end_idx = edited_html.find('</think>') + len('</think>')
+        edited_html = edited_html[:start_idx] + edited_html[end_idx:]
+        edited_html = edited_html.strip()
+    
+    if '```html' in edited_html:
+        edited_html = edited_html.split('```html')[1].split('```')[0].strip()
+    elif '```' in edited_html:
+        edited_html = edited_html.split('```')[1].split('```')[0].strip()
+    
+    return edited_html
+
+def write_mockup_html(mockup_id, new_html):
+    """Store new HTML for an existing mockup in the database and on disk"""
+    # Update HTML in database
+    conn = get_db_connection()
     try:
-        # Call NVIDIA Nemotron to edit
-        edited_html = call_nvidia_nemotron(edit_prompt, system_message)
-        
-        # Clean up the response (remove thinking tags and markdown code blocks)
-        if '<think>' in edited_html and '</think>' in edited_html:
-            start_idx = edited_html.find('<think>')
-            end_idx = edited_html.find('</think>') + len('</think>')
-            edited_html = edited_html[:start_idx] + edited_html[end_idx:]
-            edited_html = edited_html.strip()
-        
-        if '```html' in edited_html:
-            edited_html = edited_html.split('```html')[1].split('```')[0].strip()
-        elif '```' in edited_html:
-            edited_html = edited_html.split('```')[1].split('```')[0].strip()
+        with conn:
+            conn.execute(
+                "UPDATE mockups SET html_content = ? WHERE id = ?",
+                (new_html, mockup_id)
+            )
+    finally:
+        conn.close()
+    
+    # Update HTML file
+    html_path = MOCKUPS_DIR / f'mockup_{mockup_id}.html'
+    with open(html_path, 'w', encoding='utf-8') as f:
+        f.write(new_html)
+
+@app.route('/api/edit-html', methods=['POST'])
+def edit_html():
+    """Edit HTML using natural language instructions"""
+    data = request.json
+    original_html = data.get('html_content', '')
+    edit_instruction = data.get('instruction', '')
+    
+    if not original_html or not edit_instruction:
+        return jsonify({'error': 'HTML content and edit instruction are required'}), 400
+    
+    try:
+        edited_html = edit_html_with_instruction(original_html, edit_instruction, Deadline())
         
         return jsonify({
             'success': True,
             'html_content': edited_html
         })
+    except DeadlineExceeded as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 504
     except Exception as e:
         print(f"Error in edit_html endpoint: {str(e)}")
         return jsonify({
@@ -1110,6 +1743,53 @@ Return ONLY the complete HTML code, no explanations."""
             'error': str(e)
         }), 500
 
+@app.route('/api/mockups/<mockup_id>/edit', methods=['POST'])
+def edit_stored_mockup(mockup_id):
+    """Edit a stored mockup with a natural language instruction and save the result"""
+    data = request.get_json(silent=True) or {}
+    edit_instruction = data.get('instruction', '')
+    
+    if not edit_instruction:
+        return jsonify({'error': 'Edit instruction is required'}), 400
+    
+    mockup = get_mockup_from_db(mockup_id)
+    if not mockup:
+        return jsonify({'error': 'Mockup not found'}), 404
+    
+    original_html = mockup['html_content']
+    try:
+        edited_html = edit_html_with_instruction(original_html, edit_instruction, Deadline())
+    except DeadlineExceeded as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 504
+    except Exception as e:
+        print(f"Error editing mockup {mockup_id}: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+    
+    if not edited_html:
+        return jsonify({'success': False, 'error': 'Model returned empty HTML'}), 500
+    
+    changes = compute_line_changes(original_html, edited_html)
+    if changes:
+        write_mockup_html(mockup_id, edited_html)
+        # The screenshot is not needed to answer the request, so render it in the background
+        render_executor.submit(render_mockup_screenshot, edited_html, f'mockup_{mockup_id}.png')
+    
+    return jsonify({
+        'success': True,
+        'mockup_id': mockup_id,
+        'base_hash': content_hash(original_html),
+        'html_hash': content_hash(edited_html),
+        # Length in UTF-16 code units, so JavaScript clients can check their patched copy
+        'html_length': len(edited_html.encode('utf-16-le')) // 2,
+        'changes': changes
+    })
+
 @app.route('/api/mockups/<mockup_id>/update', methods=['PUT'])
 def update_mockup_html(mockup_id):
     """Update the HTML content of an existing mockup"""
@@ -1123,32 +1803,10 @@ def update_mockup_html(mockup_id):
     if not mockup:
         return jsonify({'error': 'Mockup not found'}), 404
     
-    # Update HTML in database
-    conn = get_db_connection()
-    try:
-        with conn:
-            conn.execute(
-                "UPDATE mockups SET html_content = ? WHERE id = ?",
-                (new_html, mockup_id)
-            )
-    finally:
-        conn.close()
-    
-    # Update HTML file
-    html_path = MOCKUPS_DIR / f'mockup_{mockup_id}.html'
-    with open(html_path, 'w', encoding='utf-8') as f:
-        f.write(new_html)
+    write_mockup_html(mockup_id, new_html)
     
-    # Regenerate screenshot
-    screenshot_filename = f'mockup_{mockup_id}.png'
-    try:
-        hti.screenshot(
-            html_str=new_html,
-            save_as=screenshot_filename,
-            size=(1400, 900)
-        )
-    except Exception as e:
-        print(f"Error generating screenshot: {str(e)}")
+    # Regenerate the screenshot in the background; saving doesn't need to wait for it
+    render_executor.submit(render_mockup_screenshot, new_html, f'mockup_{mockup_id}.png')
     
     return jsonify({
         'success': True,
@@ -1345,7 +2003,7 @@ def create_tickets_from_chat(conversation_id):
         
         # Analyze repository and create tickets
         from repo_mockup_generator import parse_github_url
-        from github_integration import analyze_repo_for_mockup
+        from repo_snapshots import get_repo_snapshot
         from mockup_analyzer import analyze_mockup_vs_repo, create_tickets_from_analysis
         
         owner, repo_name = parse_github_url(github_repo_url)
@@ -1355,7 +2013,9 @@ def create_tickets_from_chat(conversation_id):
         print(f"Analyzing repository {owner}/{repo_name} for comparison with mockup")
         
         # Get repository data
-        repo_data = analyze_repo_for_mockup(owner, repo_name, mockup['prompt'], None)
+        # Ticket analysis wants broad file coverage, which one tarball download gives cheaply
+        repo_data = get_repo_snapshot(owner, repo_name, None, fetch_mode='tarball')
+        repo_data['user_request'] = mockup['prompt']
         
         # Analyze differences and create tickets
         print("Analyzing mockup vs repository to create tickets...")
@@ -1478,7 +2138,6 @@ Rules:
         ai_response = call_nvidia_nemotron(analysis_prompt, system_message, [])
         
         # Parse AI response to extract tickets
-        import json
         import re
         
         # Clean up response - remove markdown code blocks if present
@@ -0,0 +1,77 @@
+"""
+Concurrent context gathering.
+Fetches independent context sources (README, Jira, repo info, files) in parallel with per-source timeouts,
+so pre-LLM latency is the slowest source rather than the sum of all of them.
+"""
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+import metrics
+
+# Default seconds to wait for a source before continuing without it
+DEFAULT_SOURCE_TIMEOUT = float(os.environ.get('CONTEXT_SOURCE_TIMEOUT', '15'))
+
+# Shared pool for top-level gathers; sources that miss their deadline keep running here and their results
+# are dropped. A source that gathers again must pass its own executor, or its inner tasks can queue behind
+# outer tasks that are waiting for them
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='context')
+
+
+def gather_context(sources: Dict[str, Callable[[], Any]], timeouts: Optional[Dict[str, float]] = None,
+                   default_timeout: float = DEFAULT_SOURCE_TIMEOUT, executor: Optional[Executor] = None) -> Dict:
+    """
+    Run context sources concurrently and collect whatever finishes in time
+
+    Args:
+        sources: Dictionary mapping source name to a no-argument fetch function
+        timeouts: Optional per-source timeouts in seconds, measured from the start of gathering
+        default_timeout: Timeout for sources without an entry in timeouts
+        executor: Pool to run the sources on (default: the shared context pool; nested gathers need their own)
+
+    Returns:
+        Dictionary with 'results' (name -> value for sources that succeeded), 'errors'
+        (name -> message for sources that raised) and 'timed_out' (names that missed their deadline)
+    """
+    timeouts = timeouts or {}
+    started = time.monotonic()
+    executor = executor or _executor
+    futures = {name: executor.submit(fetch) for name, fetch in sources.items()}
+
+    results = {}
+    errors = {}
+    timed_out = []
+    # Wait for the shortest deadlines first so every source gets its full time budget
+    for name in sorted(futures, key=lambda n: timeouts.get(n, default_timeout)):
+        deadline = started + timeouts.get(name, default_timeout)
+        try:
+            results[name] = futures[name].result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            timed_out.append(name)
+            futures[name].cancel()
+        except Exception as e:
+            errors[name] = str(e)
+
+    elapsed = time.monotonic() - started
+    metrics.increment('context_gathering.runs')
+    metrics.increment('context_gathering.sources', len(sources))
+    metrics.increment('context_gathering.timeouts', len(timed_out))
+    metrics.increment('context_gathering.errors', len(errors))
+    metrics.increment('context_gathering.elapsed_ms', int(elapsed * 1000))
+    if timed_out or errors:
+        print(f"Context gathering finished in {elapsed:.2f}s (timed out: {timed_out}, failed: {list(errors)})")
+
+    return {'results': results, 'errors': errors, 'timed_out': timed_out}
+
+
+def get_stats() -> Dict:
+    """Report context gathering outcomes for the metrics endpoint"""
+    runs = metrics.get_counter('context_gathering.runs')
+    return {
+        'runs': runs,
+        'sources': metrics.get_counter('context_gathering.sources'),
+        'timeouts': metrics.get_counter('context_gathering.timeouts'),
+        'errors': metrics.get_counter('context_gathering.errors'),
+        'avg_elapsed_ms': round(metrics.get_counter('context_gathering.elapsed_ms') / runs, 1) if runs else 0.0,
+    }
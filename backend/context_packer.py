@@ -0,0 +1,183 @@
+"""
+Token-aware context packing for prompts.
+Allocates a per-profile token budget across context sources (README, files, Jira, history, HTML) by priority.
+"""
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+import metrics
+
+# Token budgets for the context part of each prompt profile (instructions are not counted)
+TOKEN_BUDGETS = {
+    'chat': 3000,
+    'enhance': 2500,
+    'analysis': 3000,
+    'feedback': 2500,
+    'retrieval': 1500,
+    'chat_repo': 1200,
+}
+
+# Local tokenizer: words, single punctuation marks, and whitespace runs
+_PIECE_PATTERN = re.compile(r"\s+|\w+|[^\w\s]")
+# Average characters per sub-word token for long words
+_CHARS_PER_TOKEN = 4
+
+# tiktoken is a listed requirement; the estimate above is only a fallback if its encoding cannot be loaded
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    _encoding = None
+
+
+def get_budget(profile: str) -> int:
+    """
+    Token budget for a prompt profile, overridable with CONTEXT_BUDGET_<PROFILE>
+
+    Args:
+        profile: Profile name (e.g., 'chat', 'enhance')
+
+    Returns:
+        Token budget
+    """
+    override = os.environ.get(f'CONTEXT_BUDGET_{profile.upper()}')
+    if override and override.isdigit():
+        return int(override)
+    return TOKEN_BUDGETS.get(profile, 2000)
+
+
+def _piece_tokens(piece: str) -> int:
+    if piece.isspace():
+        # A single space is merged into the following word by BPE tokenizers
+        return 0 if piece == ' ' else 1
+    return max(1, math.ceil(len(piece) / _CHARS_PER_TOKEN))
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count tokens in text with the local tokenizer (tiktoken, or the estimate if it is unavailable)
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Token count
+    """
+    if not text:
+        return 0
+    if _encoding is not None:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return sum(_piece_tokens(piece) for piece in _PIECE_PATTERN.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut text to at most max_tokens, preferring to end on a line boundary
+
+    Args:
+        text: Text to truncate
+        max_tokens: Maximum number of tokens to keep
+
+    Returns:
+        Truncated text (unchanged if it already fits)
+    """
+    if max_tokens <= 0 or not text:
+        return ''
+    if _encoding is not None:
+        tokens = _encoding.encode(text, disallowed_special=())
+        if len(tokens) <= max_tokens:
+            return text
+        cut = _encoding.decode(tokens[:max_tokens])
+    else:
+        used = 0
+        end = 0
+        for match in _PIECE_PATTERN.finditer(text):
+            used += _piece_tokens(match.group())
+            if used > max_tokens:
+                break
+            end = match.end()
+        else:
+            return text
+        cut = text[:end]
+
+    # Drop a trailing partial line unless that would throw away most of the text
+    last_newline = cut.rfind('\n')
+    if last_newline > len(cut) * 0.8:
+        cut = cut[:last_newline]
+    return cut.rstrip()
+
+
+def source(name: str, text: Optional[str], priority: int, min_tokens: int = 0, max_tokens: Optional[int] = None) -> Dict:
+    """
+    Describe a context source for pack_context
+
+    Args:
+        name: Key of the source in the packed result
+        text: Full source text (None or empty sources are skipped)
+        priority: Lower numbers are filled first
+        min_tokens: Tokens reserved for this source before lower priorities are extended
+        max_tokens: Upper bound for this source regardless of remaining budget
+
+    Returns:
+        Source dictionary
+    """
+    return {
+        'name': name,
+        'text': text or '',
+        'priority': priority,
+        'min_tokens': min_tokens,
+        'max_tokens': max_tokens,
+    }
+
+
+def pack_context(sources: List[Dict], budget: int) -> Dict[str, str]:
+    """
+    Fit sources into a token budget by priority
+
+    Every source first receives its reserved minimum (in priority order while budget lasts),
+    then the remaining budget extends sources in priority order up to their size or max_tokens.
+
+    Args:
+        sources: Sources built with source()
+        budget: Total tokens available for all sources
+
+    Returns:
+        Dictionary mapping source name to packed text ('' for sources that did not fit)
+    """
+    ordered = sorted(sources, key=lambda s: s['priority'])
+    sizes = {s['name']: count_tokens(s['text']) for s in ordered}
+    caps = {
+        s['name']: min(sizes[s['name']], s['max_tokens']) if s['max_tokens'] is not None else sizes[s['name']]
+        for s in ordered
+    }
+    allocation = {s['name']: 0 for s in ordered}
+    remaining = budget
+
+    # Pass 1: reserved minimums
+    for s in ordered:
+        grant = min(s['min_tokens'], caps[s['name']], remaining)
+        allocation[s['name']] = grant
+        remaining -= grant
+
+    # Pass 2: extend by priority
+    for s in ordered:
+        if remaining <= 0:
+            break
+        grant = min(caps[s['name']] - allocation[s['name']], remaining)
+        allocation[s['name']] += grant
+        remaining -= grant
+
+    packed = {}
+    for s in ordered:
+        name = s['name']
+        if allocation[name] >= sizes[name]:
+            packed[name] = s['text']
+        else:
+            packed[name] = truncate_to_tokens(s['text'], allocation[name])
+
+    metrics.increment('context.packs')
+    metrics.increment('context.tokens_packed', budget - remaining)
+    metrics.increment('context.tokens_dropped', sum(sizes.values()) - (budget - remaining))
+    return packed
@@ -0,0 +1,90 @@
+"""
+Request-scoped deadlines.
+A Deadline is created once per request and passed to every external call (GitHub, Jira, Nemotron,
+screenshot rendering), so each stage gets only the remaining budget and optional stages can be skipped.
+"""
+import os
+import time
+from typing import Optional
+
+import metrics
+
+# End-to-end budget for a generation request
+REQUEST_DEADLINE_SECONDS = float(os.environ.get('REQUEST_DEADLINE_SECONDS', '180'))
+# Below this many seconds an external call is not worth starting
+MIN_CALL_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request runs out of time before a stage can start"""
+
+
+class Deadline:
+    """
+    Absolute point in time by which a request must finish.
+    """
+
+    def __init__(self, seconds: float = REQUEST_DEADLINE_SECONDS):
+        """
+        Args:
+            seconds: Budget from now
+        """
+        self.budget = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """Seconds left (never negative)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def has_budget(self, seconds: float) -> bool:
+        """Check whether at least this many seconds are left (used to skip optional stages)"""
+        return self.remaining() >= seconds
+
+    def check(self, stage: str) -> None:
+        """Raise DeadlineExceeded if there is no time left to start a stage"""
+        if self.remaining() < MIN_CALL_SECONDS:
+            metrics.increment('deadline.exceeded')
+            raise DeadlineExceeded(f"Request deadline exceeded before {stage}")
+
+    def before(self, seconds: float) -> 'Deadline':
+        """
+        Deadline expiring this many seconds earlier, for an optional stage that must leave time for later ones
+
+        Args:
+            seconds: Time to keep in reserve
+
+        Returns:
+            New deadline
+        """
+        return Deadline(max(0.0, self.remaining() - seconds))
+
+    def timeout(self, cap: float, stage: str = 'request') -> float:
+        """
+        Timeout for one call: the stage's own cap, limited by the time left
+
+        Args:
+            cap: The call's normal timeout in seconds
+            stage: Name used in the error message
+
+        Returns:
+            Timeout in seconds
+        """
+        self.check(stage)
+        return min(cap, self.remaining())
+
+
+def call_timeout(deadline: Optional[Deadline], cap: float, stage: str = 'request') -> float:
+    """
+    Timeout for an external call that may or may not run under a deadline
+
+    Args:
+        deadline: Request deadline, or None for the call's normal timeout
+        cap: The call's normal timeout in seconds
+        stage: Name used in the error message
+
+    Returns:
+        Timeout in seconds
+    """
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap, stage)
@@ -0,0 +1,142 @@
+"""
+Value-aware selection of repository files before their content is downloaded.
+Ranks tree entries by file type, path and size, skips generated and oversized files,
+and picks the most useful files that fit a byte budget.
+"""
+import os
+import re
+from typing import Dict, List
+
+import metrics
+
+# Files larger than this are never fetched (mostly bundles, fixtures and data dumps)
+MAX_FILE_BYTES = int(os.environ.get('REPO_MAX_FILE_BYTES', str(100 * 1024)))
+# Total bytes fetched per repository analysis
+BYTE_BUDGET = int(os.environ.get('REPO_FILE_BYTE_BUDGET', str(300 * 1024)))
+
+# Lock files and other files produced by tools rather than written by people
+GENERATED_FILE_NAMES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'npm-shrinkwrap.json', 'composer.lock',
+    'poetry.lock', 'pipfile.lock', 'cargo.lock', 'gemfile.lock', 'bun.lockb',
+}
+GENERATED_DIRECTORIES = {'dist', 'build', 'out', '.next', '.nuxt', 'coverage', 'vendor', 'storybook-static'}
+_GENERATED_SUFFIX = re.compile(r'\.(min|bundle|chunk)\.(js|css)$|\.map$|\.d\.ts$|\.snap$')
+_HASHED_NAME = re.compile(r'[.-][0-9a-f]{8,}\.(js|css)$')
+
+# Value of a file for describing the project's stack and look, by exact name then by extension
+NAME_SCORES = {
+    'package.json': 100,
+    'requirements.txt': 90,
+    'pyproject.toml': 80,
+}
+NAME_PREFIX_SCORES = {
+    'tailwind.config': 85,
+    'theme': 75,
+    'variables': 75,
+    'globals': 70,
+}
+EXTENSION_SCORES = {
+    '.css': 60, '.scss': 60, '.less': 55,
+    '.tsx': 55, '.jsx': 55, '.vue': 55, '.svelte': 55,
+    '.html': 50,
+    '.ts': 35, '.js': 35,
+    '.md': 20,
+    '.yaml': 15, '.yml': 15,
+    '.json': 10,
+}
+# Path fragments that make a file more or less representative of the UI
+PATH_BONUSES = {
+    'components/': 20, 'styles/': 20, 'theme/': 20, 'pages/': 10, 'layouts/': 10, 'src/': 5,
+}
+PATH_PENALTIES = {
+    'test/': 30, 'tests/': 30, '__tests__/': 30, '.test.': 30, '.spec.': 30, 'fixtures/': 30, 'mocks/': 20,
+    'docs/': 15, '.github/': 25, 'examples/': 15, 'scripts/': 10,
+}
+
+
+def is_generated_file(file_path: str) -> bool:
+    """
+    Detect lock files, build output and minified or hashed bundles by path
+
+    Args:
+        file_path: Path of the file in the repository
+
+    Returns:
+        True if the file is generated
+    """
+    parts = file_path.lower().split('/')
+    name = parts[-1]
+    if name in GENERATED_FILE_NAMES:
+        return True
+    if any(directory in GENERATED_DIRECTORIES for directory in parts[:-1]):
+        return True
+    return bool(_GENERATED_SUFFIX.search(name) or _HASHED_NAME.search(name))
+
+
+def score_file(file_path: str, size: int) -> float:
+    """
+    Estimate how useful a file is as mockup context from its path and size
+
+    Args:
+        file_path: Path of the file in the repository
+        size: File size in bytes
+
+    Returns:
+        Score (higher is better)
+    """
+    path = file_path.lower()
+    name = os.path.basename(path)
+    extension = os.path.splitext(name)[1]
+
+    score = NAME_SCORES.get(name)
+    if score is None:
+        score = next((s for prefix, s in NAME_PREFIX_SCORES.items() if name.startswith(prefix)), None)
+    if score is None:
+        score = EXTENSION_SCORES.get(extension, 5)
+
+    score += sum(bonus for fragment, bonus in PATH_BONUSES.items() if fragment in path)
+    score -= sum(penalty for fragment, penalty in PATH_PENALTIES.items() if fragment in path)
+    # Prefer shallow files, and small files over large ones (a prompt only uses a few hundred tokens per file)
+    score -= 3 * path.count('/')
+    score -= 10 * size / MAX_FILE_BYTES
+    return score
+
+
+def select_files(entries: List[Dict], max_files: int, byte_budget: int = BYTE_BUDGET) -> List[Dict]:
+    """
+    Pick the most valuable files that fit the file count and byte budget
+
+    Args:
+        entries: Candidate tree entries with 'path' and 'size'
+        max_files: Maximum number of files
+        byte_budget: Maximum total size in bytes
+
+    Returns:
+        Selected entries, best first
+    """
+    candidates = []
+    for entry in entries:
+        size = entry.get('size') or 0
+        if is_generated_file(entry['path']):
+            metrics.increment('file_selection.skipped_generated')
+        elif size > MAX_FILE_BYTES:
+            metrics.increment('file_selection.skipped_large')
+        else:
+            candidates.append(entry)
+    ranked = sorted(candidates, key=lambda e: (-score_file(e['path'], e.get('size') or 0), e['path']))
+
+    selected = []
+    used = 0
+    for entry in ranked:
+        if len(selected) >= max_files:
+            break
+        size = entry.get('size') or 0
+        if used + size > byte_budget:
+            continue
+        selected.append(entry)
+        used += size
+
+    metrics.increment('file_selection.candidates', len(entries))
+    metrics.increment('file_selection.selected', len(selected))
+    metrics.increment('file_selection.bytes_selected', used)
+    return selected
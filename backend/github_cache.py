@@ -0,0 +1,200 @@
+"""
+Persistent conditional-request cache for GitHub API calls.
+Stores response bodies with their ETag / Last-Modified in SQLite, so repeated calls are revalidated with
+If-None-Match and answered by a 304, which GitHub does not count against the rate limit.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import metrics
+
+DATA_DIR = Path('data')
+DB_PATH = DATA_DIR / 'mockups.db'
+
+# Cached responses kept (least recently revalidated are dropped first)
+MAX_ENTRIES = int(os.environ.get('GITHUB_CACHE_MAX_ENTRIES', '5000'))
+# Stores between two prunes down to MAX_ENTRIES
+PRUNE_INTERVAL = 100
+
+_prune_lock = threading.Lock()
+_stores_since_prune = 0
+
+
+def _get_connection():
+    conn = sqlite3.connect(DB_PATH, timeout=10)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db():
+    """Create the response cache table if it does not exist"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS github_http_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    content_type TEXT,
+                    body BLOB NOT NULL,
+                    used_at TEXT NOT NULL
+                )
+                """
+            )
+    finally:
+        conn.close()
+
+
+# Create the table once per process
+init_db()
+
+
+def cache_key(url: str, params: Optional[Dict], headers: Dict[str, str]) -> str:
+    """
+    Key of a GET request: the URL, query parameters, media type and credentials
+
+    The Authorization header is part of the (hashed) key, so private responses are never served to another token.
+
+    Args:
+        url: Request URL
+        params: Query parameters
+        headers: Request headers
+
+    Returns:
+        Hex digest identifying the request
+    """
+    identity = json.dumps([
+        url,
+        sorted((params or {}).items()),
+        headers.get('Accept', ''),
+        headers.get('Authorization', ''),
+    ])
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+def load_response(key: str) -> Optional[Dict]:
+    """
+    Load a cached response
+
+    Args:
+        key: Result of cache_key
+
+    Returns:
+        Dictionary with 'etag', 'last_modified', 'content_type' and 'body' (bytes), or None
+    """
+    conn = _get_connection()
+    try:
+        row = conn.execute(
+            "SELECT etag, last_modified, content_type, body FROM github_http_cache WHERE cache_key = ?",
+            (key,)
+        ).fetchone()
+    finally:
+        conn.close()
+    return dict(row) if row else None
+
+
+def save_response(key: str, url: str, etag: Optional[str], last_modified: Optional[str],
+                  content_type: Optional[str], body: bytes) -> None:
+    """
+    Store a response body with its validators, pruning beyond MAX_ENTRIES every PRUNE_INTERVAL stores
+
+    Args:
+        key: Result of cache_key
+        url: Request URL (for inspection only)
+        etag: ETag response header
+        last_modified: Last-Modified response header
+        content_type: Content-Type response header
+        body: Raw response body
+    """
+    global _stores_since_prune
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO github_http_cache
+                    (cache_key, url, etag, last_modified, content_type, body, used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (key, url, etag, last_modified, content_type, body, datetime.now().isoformat())
+            )
+    finally:
+        conn.close()
+    metrics.increment('github_cache.stored')
+
+    with _prune_lock:
+        _stores_since_prune += 1
+        should_prune = _stores_since_prune >= PRUNE_INTERVAL
+        if should_prune:
+            _stores_since_prune = 0
+    if should_prune:
+        prune_responses()
+
+
+def prune_responses(max_entries: int = MAX_ENTRIES) -> int:
+    """
+    Delete the least recently revalidated responses beyond max_entries
+
+    Args:
+        max_entries: Responses kept
+
+    Returns:
+        Number of responses deleted
+    """
+    conn = _get_connection()
+    try:
+        with conn:
+            deleted = conn.execute(
+                """
+                DELETE FROM github_http_cache WHERE cache_key NOT IN (
+                    SELECT cache_key FROM github_http_cache ORDER BY used_at DESC LIMIT ?
+                )
+                """,
+                (max_entries,)
+            ).rowcount
+    finally:
+        conn.close()
+    if deleted:
+        metrics.increment('github_cache.pruned', deleted)
+    return deleted
+
+
+def touch_response(key: str) -> None:
+    """Mark a cached response as just revalidated, so pruning keeps it"""
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "UPDATE github_http_cache SET used_at = ? WHERE cache_key = ?",
+                (datetime.now().isoformat(), key)
+            )
+    finally:
+        conn.close()
+    metrics.increment('github_cache.revalidated')
+
+
+def get_stats() -> Dict:
+    """
+    Report conditional request outcomes
+
+    Returns:
+        Dictionary with request, revalidation and store counts and the revalidation ratio
+    """
+    return {
+        'requests': metrics.get_counter('github_cache.requests'),
+        'conditional_requests': metrics.get_counter('github_cache.conditional_requests'),
+        'revalidated': metrics.get_counter('github_cache.revalidated'),
+        'stored': metrics.get_counter('github_cache.stored'),
+        'pruned': metrics.get_counter('github_cache.pruned'),
+        'revalidated_ratio': metrics.ratio('github_cache.revalidated', 'github_cache.requests'),
+    }
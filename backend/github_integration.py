@@ -3,10 +3,20 @@ GitHub integration module for fetching repository information
 """
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from pathlib import Path
 from dotenv import load_dotenv
 from typing import Dict, List, Optional
 import base64
+import tarfile
+
+import metrics
+from context_gathering import gather_context
+from deadline import Deadline, MIN_CALL_SECONDS, call_timeout
+from file_selection import MAX_FILE_BYTES, is_generated_file, select_files
+from github_cache import cache_key, load_response, save_response, touch_response
+from github_rate_limit import RateLimitExceeded, acquire as acquire_quota, is_low as is_quota_low, record as record_quota, token_key
 
 # Load environment variables
 env_path = Path(__file__).parent / '.env'
@@ -15,9 +25,143 @@ load_dotenv()
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN", "")
 GITHUB_API_BASE = "https://api.github.com"
+# Number of repository files fetched concurrently
+FILE_FETCH_WORKERS = int(os.getenv("GITHUB_FETCH_WORKERS", "8"))
+
+# One pooled session for all GitHub calls, so concurrent requests reuse their connections
+session = requests.Session()
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=FILE_FETCH_WORKERS))
+_file_executor = ThreadPoolExecutor(max_workers=FILE_FETCH_WORKERS, thread_name_prefix="github-files")
+
+# Pool for the sources of analyze_repo_for_mockup, separate from the shared context pool because the
+# analysis itself runs as a chat context source
+_analysis_executor = ThreadPoolExecutor(max_workers=12, thread_name_prefix="github-analysis")
+
+# Seconds analyze_repo_for_mockup waits for each source before continuing without it
+ANALYSIS_SOURCE_TIMEOUTS = {
+    "repo_info": 10,
+    "readme": 10,
+    "relevant_files": 45,
+}
+
+# Directory depth below the repository root searched for relevant files
+MAX_TREE_DEPTH = 3
+IGNORED_DIRECTORIES = {".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build"}
+
+# How repository files are fetched: one request per file ("api") or one streamed archive ("tarball")
+FETCH_MODES = ("api", "tarball")
+FETCH_MODE = os.getenv("GITHUB_FETCH_MODE", "api")
+# Files read per repository analysis in api mode
+ANALYSIS_MAX_FILES = 15
+# Files read in tarball mode, which reads many files for the price of one request
+TARBALL_MAX_FILES = 60
+
+DEFAULT_FILE_PATTERNS = [
+    "package.json", "requirements.txt",
+    "README.md", "README.txt", "*.md",
+    "*.json", "*.yaml", "*.yml",
+    "*.tsx", "*.jsx", "*.ts", "*.js",
+    "*.css", "*.scss", "*.html"
+]
+# Patterns used when analyzing a repository for mockups and tickets
+ANALYSIS_FILE_PATTERNS = [
+    "package.json", "requirements.txt", "README.md",
+    "*.json", "*.md", "*.yaml", "*.yml",
+    "*.tsx", "*.jsx", "*.ts", "*.js",
+    "*.css", "*.html"
+]
+
+
+def _cached_response(cached: Dict, url: str, response: Optional[requests.Response] = None) -> requests.Response:
+    """Turn a stored cache entry into a 200 response (reusing a 304/403 response object if there is one)"""
+    if response is None:
+        response = requests.Response()
+        response.url = url
+    response.status_code = 200
+    response._content = cached["body"]
+    if cached["content_type"]:
+        response.headers["Content-Type"] = cached["content_type"]
+    return response
+
+
+def _is_rate_limited(response: requests.Response) -> bool:
+    return response.status_code == 429 or (
+        response.status_code == 403 and response.headers.get("X-RateLimit-Remaining") == "0"
+    )
+
+
+def github_get(url: str, headers: Dict[str, str], params: Optional[Dict] = None, timeout: float = 30, deadline: Optional[Deadline] = None) -> requests.Response:
+    """
+    GET a GitHub API URL, revalidating a previously cached response instead of downloading it again
+    
+    Requests are paced by the token's remaining quota. While the quota is low, cached responses are
+    served without revalidation.
+    
+    Args:
+        url: API URL
+        headers: Request headers (Accept and Authorization are part of the cache key)
+        params: Query parameters (optional)
+        timeout: Request timeout in seconds
+        deadline: Request deadline bounding any wait for quota (optional)
+    
+    Returns:
+        Response; a 304 is returned as the cached 200 response
+    
+    Raises:
+        RateLimitExceeded: The quota is exhausted, resets too late and nothing is cached
+    """
+    key = cache_key(url, params, headers)
+    quota_key = token_key(headers)
+    try:
+        cached = load_response(key)
+    except Exception as e:
+        print(f"Could not read GitHub response cache: {str(e)}")
+        cached = None
+    
+    if cached and is_quota_low(quota_key):
+        metrics.increment("github_rate_limit.served_from_cache")
+        return _cached_response(cached, url)
+    
+    request_headers = dict(headers)
+    if cached:
+        if cached["etag"]:
+            request_headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            request_headers["If-Modified-Since"] = cached["last_modified"]
+        metrics.increment("github_cache.conditional_requests")
+    metrics.increment("github_cache.requests")
+    
+    acquire_quota(quota_key, deadline)
+    if deadline is not None:
+        # Waiting for quota used part of the request's time
+        timeout = deadline.timeout(timeout, "GitHub request")
+    response = session.get(url, headers=request_headers, params=params, timeout=timeout)
+    record_quota(quota_key, response.headers)
+    
+    if response.status_code == 304 and cached:
+        try:
+            touch_response(key)
+        except Exception as e:
+            print(f"Could not update GitHub response cache: {str(e)}")
+        return _cached_response(cached, url, response)
+    
+    if _is_rate_limited(response):
+        if cached:
+            metrics.increment("github_rate_limit.served_from_cache")
+            return _cached_response(cached, url, response)
+        raise RateLimitExceeded("GitHub API rate limit exhausted")
+    
+    etag = response.headers.get("ETag")
+    last_modified = response.headers.get("Last-Modified")
+    if response.status_code == 200 and (etag or last_modified):
+        try:
+            save_response(key, url, etag, last_modified, response.headers.get("Content-Type"), response.content)
+        except Exception as e:
+            print(f"Could not cache GitHub response: {str(e)}")
+    return response
 
 
-def get_repo_contents(repo_owner: str, repo_name: str, path: str = "", token: Optional[str] = None) -> List[Dict]:
+def get_repo_contents(repo_owner: str, repo_name: str, path: str = "", token: Optional[str] = None, deadline: Optional[Deadline] = None) -> List[Dict]:
     """
     Fetch repository contents from GitHub API
     
@@ -26,6 +170,7 @@ def get_repo_contents(repo_owner: str, repo_name: str, path: str = "", token: Op
         repo_name: Repository name
         path: Path within repository (default: root)
         token: GitHub personal access token (optional, uses env var if not provided)
+        deadline: Request deadline limiting the call's timeout (optional)
     
     Returns:
         List of file/directory information
@@ -40,7 +185,7 @@ def get_repo_contents(repo_owner: str, repo_name: str, path: str = "", token: Op
     url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/contents/{path}"
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = github_get(url, headers=headers, timeout=call_timeout(deadline, 30, "GitHub contents"), deadline=deadline)
         response.raise_for_status()
         return response.json()
     except requests.exceptions.RequestException as e:
@@ -48,7 +193,7 @@ def get_repo_contents(repo_owner: str, repo_name: str, path: str = "", token: Op
         raise Exception(f"Failed to fetch repository contents: {str(e)}")
 
 
-def get_file_content(repo_owner: str, repo_name: str, file_path: str, token: Optional[str] = None) -> str:
+def get_file_content(repo_owner: str, repo_name: str, file_path: str, token: Optional[str] = None, deadline: Optional[Deadline] = None, ref: Optional[str] = None) -> str:
     """
     Fetch file content from GitHub repository
     
@@ -57,6 +202,8 @@ def get_file_content(repo_owner: str, repo_name: str, file_path: str, token: Opt
         repo_name: Repository name
         file_path: Path to file in repository
         token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+        ref: Commit SHA, branch or tag to read (optional, default branch if not provided)
     
     Returns:
         File content as string
@@ -71,7 +218,10 @@ def get_file_content(repo_owner: str, repo_name: str, file_path: str, token: Opt
     url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/contents/{file_path}"
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = github_get(
+            url, headers=headers, params={"ref": ref} if ref else None,
+            timeout=call_timeout(deadline, 30, "GitHub file fetch"), deadline=deadline
+        )
         response.raise_for_status()
         file_data = response.json()
         
@@ -86,7 +236,7 @@ def get_file_content(repo_owner: str, repo_name: str, file_path: str, token: Opt
         raise Exception(f"Failed to fetch file content: {str(e)}")
 
 
-def get_repo_readme(repo_owner: str, repo_name: str, token: Optional[str] = None) -> Optional[str]:
+def get_repo_readme(repo_owner: str, repo_name: str, token: Optional[str] = None, deadline: Optional[Deadline] = None) -> Optional[str]:
     """
     Fetch README file from repository using GitHub's /readme endpoint
     
@@ -94,6 +244,7 @@ def get_repo_readme(repo_owner: str, repo_name: str, token: Optional[str] = None
         repo_owner: Repository owner
         repo_name: Repository name
         token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
     
     Returns:
         README content or None if not found
@@ -103,12 +254,12 @@ def get_repo_readme(repo_owner: str, repo_name: str, token: Optional[str] = None
         "Accept": "application/vnd.github.v3.raw",  # Get raw text directly
     }
     if token:
-        headers["Authorization"] = f"Bearer {token}"
+        headers["Authorization"] = f"token {token}"
     
     url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/readme"
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = github_get(url, headers=headers, timeout=call_timeout(deadline, 30, "GitHub README"), deadline=deadline)
         response.raise_for_status()
         # Response is already raw text with the .raw Accept header
         return response.text
@@ -117,7 +268,7 @@ def get_repo_readme(repo_owner: str, repo_name: str, token: Optional[str] = None
         return None
 
 
-def get_repo_info(repo_owner: str, repo_name: str, token: Optional[str] = None) -> Dict:
+def get_repo_info(repo_owner: str, repo_name: str, token: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict:
     """
     Get repository information and key files
     
@@ -125,6 +276,7 @@ def get_repo_info(repo_owner: str, repo_name: str, token: Optional[str] = None)
         repo_owner: Repository owner
         repo_name: Repository name
         token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
     
     Returns:
         Dictionary with repository information
@@ -139,7 +291,7 @@ def get_repo_info(repo_owner: str, repo_name: str, token: Optional[str] = None)
     url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}"
     
     try:
-        response = requests.get(url, headers=headers, timeout=30)
+        response = github_get(url, headers=headers, timeout=call_timeout(deadline, 30, "GitHub repository info"), deadline=deadline)
         response.raise_for_status()
         repo_data = response.json()
         
@@ -156,83 +308,336 @@ def get_repo_info(repo_owner: str, repo_name: str, token: Optional[str] = None)
         raise Exception(f"Failed to fetch repository information: {str(e)}")
 
 
-def get_relevant_files(repo_owner: str, repo_name: str, file_patterns: List[str] = None, max_files: int = 10, token: Optional[str] = None) -> Dict[str, str]:
+def get_default_branch_head(repo_owner: str, repo_name: str, token: Optional[str] = None, deadline: Optional[Deadline] = None) -> str:
+    """
+    Get the commit SHA at the head of the default branch
+    
+    Args:
+        repo_owner: Repository owner
+        repo_name: Repository name
+        token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+    
+    Returns:
+        Commit SHA
+    """
+    token = token or GITHUB_TOKEN
+    headers = {
+        "Accept": "application/vnd.github.sha",  # Return only the SHA as text
+    }
+    if token:
+        headers["Authorization"] = f"token {token}"
+    
+    url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/commits/HEAD"
+    
+    try:
+        response = github_get(url, headers=headers, timeout=call_timeout(deadline, 10, "GitHub head lookup"), deadline=deadline)
+        response.raise_for_status()
+        return response.text.strip()
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching default branch head: {str(e)}")
+        raise Exception(f"Failed to fetch default branch head: {str(e)}")
+
+
+def get_repo_tree(repo_owner: str, repo_name: str, ref: str = "HEAD", token: Optional[str] = None, deadline: Optional[Deadline] = None) -> List[Dict]:
+    """
+    Fetch the full file tree of a repository in one request using the Git Trees API
+    
+    Args:
+        repo_owner: Repository owner
+        repo_name: Repository name
+        ref: Commit SHA, branch or tag to list (default: head of the default branch)
+        token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+    
+    Returns:
+        List of tree entries with 'path', 'type' ('blob' or 'tree'), 'sha' and 'size' (blobs only)
+    """
+    token = token or GITHUB_TOKEN
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+    }
+    if token:
+        headers["Authorization"] = f"token {token}"
+    
+    url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/git/trees/{ref}"
+    
+    try:
+        response = github_get(
+            url, headers=headers, params={"recursive": "1"},
+            timeout=call_timeout(deadline, 30, "GitHub tree listing"), deadline=deadline
+        )
+        response.raise_for_status()
+        data = response.json()
+        if data.get("truncated"):
+            # Very large repositories: GitHub returns a partial listing, which is still enough to pick files from
+            print(f"Tree listing of {repo_owner}/{repo_name} was truncated at {len(data.get('tree', []))} entries")
+        return data.get("tree", [])
+    except requests.exceptions.RequestException as e:
+        print(f"Error fetching repository tree: {str(e)}")
+        raise Exception(f"Failed to fetch repository tree: {str(e)}")
+
+
+def compare_commits(repo_owner: str, repo_name: str, base: str, head: str, token: Optional[str] = None, deadline: Optional[Deadline] = None) -> Dict:
+    """
+    Compare two commits with the GitHub compare API
+    
+    Args:
+        repo_owner: Repository owner
+        repo_name: Repository name
+        base: Older commit SHA
+        head: Newer commit SHA
+        token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+    
+    Returns:
+        Dictionary with 'status' ('ahead', 'behind', 'diverged' or 'identical') and 'files'
+        (each with 'filename', 'status' and, for renames, 'previous_filename')
+    """
+    token = token or GITHUB_TOKEN
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+    }
+    if token:
+        headers["Authorization"] = f"token {token}"
+    
+    url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/compare/{base}...{head}"
+    
+    try:
+        response = github_get(url, headers=headers, timeout=call_timeout(deadline, 30, "GitHub compare"), deadline=deadline)
+        response.raise_for_status()
+        data = response.json()
+        return {
+            "status": data.get("status"),
+            "files": [
+                {
+                    "filename": f.get("filename"),
+                    "status": f.get("status"),
+                    "previous_filename": f.get("previous_filename"),
+                }
+                for f in data.get("files", [])
+            ],
+        }
+    except requests.exceptions.RequestException as e:
+        print(f"Error comparing commits: {str(e)}")
+        raise Exception(f"Failed to compare commits: {str(e)}")
+
+
+def matches_file_patterns(file_path: str, file_patterns: List[str]) -> bool:
+    """
+    Check whether a file path matches any pattern ('*.ext' extension patterns or exact file names)
+    
+    Args:
+        file_path: Path of the file in the repository
+        file_patterns: List of file patterns (e.g., ['*.json', 'package.json'])
+    
+    Returns:
+        True if the path matches a pattern
+    """
+    for pattern in file_patterns:
+        if pattern.startswith("*."):
+            if file_path.endswith(pattern[1:]):
+                return True
+        elif file_path.endswith(pattern) or file_path == pattern:
+            return True
+    return False
+
+
+def is_candidate_path(file_path: str, file_patterns: List[str], max_depth: int = MAX_TREE_DEPTH) -> bool:
+    """
+    Check whether a repository file is worth reading: within the depth limit, outside ignored directories
+    and matching a file pattern
+    
+    Args:
+        file_path: Path of the file in the repository
+        file_patterns: List of file patterns to search for
+        max_depth: Maximum directory depth below the repository root
+    
+    Returns:
+        True if the file should be read
+    """
+    directories = file_path.split("/")[:-1]
+    if len(directories) > max_depth:
+        return False
+    # Skip common ignored directories
+    if any(directory in IGNORED_DIRECTORIES for directory in directories):
+        return False
+    return matches_file_patterns(file_path, file_patterns)
+
+
+def select_tree_files(tree: List[Dict], file_patterns: List[str], max_files: int, max_depth: int = MAX_TREE_DEPTH) -> List[Dict]:
+    """
+    Pick the files to fetch from a repository tree listing, without any further API calls
+    
+    Matching files are ranked by type, path and size; generated and oversized files are skipped,
+    and the selection stays within the file selection byte budget.
+    
+    Args:
+        tree: Entries from get_repo_tree
+        file_patterns: List of file patterns to search for
+        max_files: Maximum number of files to return
+        max_depth: Maximum directory depth below the repository root
+    
+    Returns:
+        Selected blob entries, most valuable first
+    """
+    candidates = [
+        entry for entry in tree
+        if entry.get("type") == "blob" and is_candidate_path(entry.get("path", ""), file_patterns, max_depth)
+    ]
+    return select_files(candidates, max_files)
+
+
+def get_relevant_files(repo_owner: str, repo_name: str, file_patterns: List[str] = None, max_files: int = 10, token: Optional[str] = None, deadline: Optional[Deadline] = None, ref: str = "HEAD") -> Dict[str, str]:
     """
     Get relevant files from repository based on patterns
     
+    The whole tree is listed with one API call and matched locally, so only the selected files
+    cost further requests.
+    
     Args:
         repo_owner: Repository owner
         repo_name: Repository name
         file_patterns: List of file patterns to search for (e.g., ['*.json', 'package.json', '*.md'])
         max_files: Maximum number of files to return
         token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+        ref: Commit SHA, branch or tag to read (default: head of the default branch)
     
     Returns:
         Dictionary mapping file paths to content
     """
     if file_patterns is None:
-        file_patterns = [
-            "package.json", "package-lock.json", "requirements.txt",
-            "README.md", "README.txt", "*.md",
-            "*.json", "*.yaml", "*.yml",
-            "*.tsx", "*.jsx", "*.ts", "*.js",
-            "*.css", "*.scss", "*.html"
-        ]
+        file_patterns = DEFAULT_FILE_PATTERNS
     
+    token = token or GITHUB_TOKEN
+    
+    try:
+        tree = get_repo_tree(repo_owner, repo_name, ref, token, deadline)
+    except RateLimitExceeded:
+        # Not an empty repository: let the caller report the files as missing
+        raise
+    except Exception as e:
+        print(f"Error listing repository files: {str(e)}")
+        return {}
+    
+    paths = [entry["path"] for entry in select_tree_files(tree, file_patterns, max_files)]
+    return fetch_files(repo_owner, repo_name, paths, token, deadline, ref)
+
+
+def fetch_files(repo_owner: str, repo_name: str, paths: List[str], token: Optional[str] = None, deadline: Optional[Deadline] = None, ref: str = "HEAD") -> Dict[str, str]:
+    """
+    Fetch several repository files concurrently
+    
+    Each request has its own timeout and a failed file is skipped.
+    
+    Args:
+        repo_owner: Repository owner
+        repo_name: Repository name
+        paths: File paths to fetch
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional, files not fetched by then are skipped)
+        ref: Commit SHA, branch or tag to read (default: head of the default branch)
+    
+    Returns:
+        Dictionary mapping the fetched file paths to content, in the order of paths
+    """
     relevant_files = {}
     token = token or GITHUB_TOKEN
+    file_ref = ref if ref != "HEAD" else None
+    fetches = [
+        (path, _file_executor.submit(get_file_content, repo_owner, repo_name, path, token, deadline, file_ref))
+        for path in paths
+    ]
     
-    def search_directory(path: str = "", depth: int = 0, max_depth: int = 3):
-        """Recursively search directory for relevant files"""
-        if depth > max_depth or len(relevant_files) >= max_files:
-            return
-        
+    # Collect in path order so the result does not depend on which request finished first
+    for path, future in fetches:
         try:
-            contents = get_repo_contents(repo_owner, repo_name, path, token)
-            
-            for item in contents:
-                if len(relevant_files) >= max_files:
-                    break
-                
-                item_path = item.get("path", "")
-                item_type = item.get("type", "")
-                
-                if item_type == "file":
-                    # Check if file matches patterns
-                    for pattern in file_patterns:
-                        if pattern.startswith("*."):
-                            # Extension match
-                            if item_path.endswith(pattern[1:]):
-                                try:
-                                    content = get_file_content(repo_owner, repo_name, item_path, token)
-                                    relevant_files[item_path] = content
-                                    break
-                                except:
-                                    continue
-                        elif item_path.endswith(pattern) or item_path == pattern:
-                            # Exact match
-                            try:
-                                content = get_file_content(repo_owner, repo_name, item_path, token)
-                                relevant_files[item_path] = content
-                                break
-                            except:
-                                continue
-                
-                elif item_type == "dir" and depth < max_depth:
-                    # Skip common ignored directories
-                    if item_path.split("/")[-1] not in [".git", "node_modules", "__pycache__", ".venv", "venv", "dist", "build"]:
-                        search_directory(item_path, depth + 1, max_depth)
-        
+            relevant_files[path] = future.result(timeout=deadline.remaining() if deadline is not None else None)
+        except FutureTimeoutError:
+            # Keep the files fetched so far once the request runs out of time
+            future.cancel()
+            print(f"Skipping {path}: request deadline reached")
+        except RateLimitExceeded:
+            raise
         except Exception as e:
-            print(f"Error searching directory {path}: {str(e)}")
-    
-    # Start search from root
-    search_directory()
+            print(f"Skipping {path}: {str(e)}")
     
     return relevant_files
 
 
-def analyze_repo_for_mockup(repo_owner: str, repo_name: str, user_request: str, token: Optional[str] = None) -> Dict:
+def get_relevant_files_from_tarball(repo_owner: str, repo_name: str, file_patterns: List[str] = None, max_files: int = TARBALL_MAX_FILES, token: Optional[str] = None, deadline: Optional[Deadline] = None, ref: str = "HEAD") -> Dict[str, str]:
+    """
+    Get relevant files by streaming the repository tarball and extracting matching files in memory
+    
+    One request replaces the per-file fetches; the archive is never written to disk. Matching files are
+    collected while streaming and then ranked and trimmed to the byte budget like the API fetch mode.
+    
+    Args:
+        repo_owner: Repository owner
+        repo_name: Repository name
+        file_patterns: List of file patterns to search for (e.g., ['*.json', 'package.json', '*.md'])
+        max_files: Maximum number of files to return
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional, extraction stops with the files read so far)
+        ref: Commit SHA, branch or tag to read (default: head of the default branch)
+    
+    Returns:
+        Dictionary mapping file paths to content, most valuable first, like get_relevant_files
+    """
+    if file_patterns is None:
+        file_patterns = DEFAULT_FILE_PATTERNS
+    
+    candidates = []
+    token = token or GITHUB_TOKEN
+    headers = {
+        "Accept": "application/vnd.github.v3+json",
+    }
+    if token:
+        headers["Authorization"] = f"token {token}"
+    
+    url = f"{GITHUB_API_BASE}/repos/{repo_owner}/{repo_name}/tarball"
+    if ref != "HEAD":
+        url += f"/{ref}"
+    
+    quota_key = token_key(headers)
+    acquire_quota(quota_key, deadline)
+    try:
+        with session.get(url, headers=headers, stream=True, timeout=call_timeout(deadline, 60, "GitHub tarball")) as response:
+            record_quota(quota_key, response.headers)
+            if _is_rate_limited(response):
+                raise RateLimitExceeded("GitHub API rate limit exhausted")
+            response.raise_for_status()
+            # "r|gz" reads the archive sequentially from the response stream
+            with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+                for member in archive:
+                    if deadline is not None and not deadline.has_budget(MIN_CALL_SECONDS):
+                        print("Stopping tarball extraction: request deadline reached")
+                        break
+                    if not member.isfile():
+                        continue
+                    # Archive paths start with an '{owner}-{repo}-{sha}/' directory
+                    path = member.name.split("/", 1)[-1]
+                    if not is_candidate_path(path, file_patterns):
+                        continue
+                    entry = {"path": path, "size": member.size}
+                    # Only files that selection can pick are read; the others are passed on by size for its metrics
+                    if member.size <= MAX_FILE_BYTES and not is_generated_file(path):
+                        try:
+                            entry["content"] = archive.extractfile(member).read().decode("utf-8")
+                        except UnicodeDecodeError:
+                            continue
+                    candidates.append(entry)
+    except RateLimitExceeded:
+        raise
+    except Exception as e:
+        print(f"Error reading repository tarball: {str(e)}")
+        raise Exception(f"Failed to read repository tarball: {str(e)}")
+    
+    return {entry["path"]: entry["content"] for entry in select_files(candidates, max_files)}
+
+
+def analyze_repo_for_mockup(repo_owner: str, repo_name: str, user_request: str, token: Optional[str] = None, deadline: Optional[Deadline] = None, ref: str = "HEAD", fetch_mode: Optional[str] = None) -> Dict:
     """
     Analyze repository and extract information relevant to mockup generation
     
@@ -241,41 +646,57 @@ def analyze_repo_for_mockup(repo_owner: str, repo_name: str, user_request: str,
         repo_name: Repository name
         user_request: Original user request for mockup
         token: GitHub personal access token (optional)
+        deadline: Request deadline limiting the call's timeout (optional)
+        ref: Commit SHA, branch or tag to read files from (default: head of the default branch)
+        fetch_mode: "api" (per-file requests) or "tarball" (one streamed archive, more files); default: GITHUB_FETCH_MODE
     
     Returns:
         Dictionary with analyzed repository information and enhanced prompt
     """
-    try:
-        # Get repository info
-        repo_info = get_repo_info(repo_owner, repo_name, token)
-        
-        # Get README
-        readme = get_repo_readme(repo_owner, repo_name, token)
-        
-        # Get relevant files
-        relevant_files = get_relevant_files(
-            repo_owner, 
-            repo_name, 
-            file_patterns=[
-                "package.json", "requirements.txt", "README.md",
-                "*.json", "*.md", "*.yaml", "*.yml",
-                "*.tsx", "*.jsx", "*.ts", "*.js",
-                "*.css", "*.html"
-            ],
-            max_files=15,
-            token=token
+    fetch_mode = fetch_mode or FETCH_MODE
+    
+    def fetch_relevant_files():
+        if fetch_mode == "tarball":
+            return get_relevant_files_from_tarball(
+                repo_owner, repo_name, ANALYSIS_FILE_PATTERNS, token=token, deadline=deadline, ref=ref
+            )
+        return get_relevant_files(
+            repo_owner, repo_name, ANALYSIS_FILE_PATTERNS, max_files=ANALYSIS_MAX_FILES, token=token, deadline=deadline, ref=ref
         )
-        
-        return {
-            "repo_info": repo_info,
-            "readme": readme,
-            "relevant_files": relevant_files,
-            "user_request": user_request
-        }
     
-    except Exception as e:
-        print(f"Error analyzing repository: {str(e)}")
-        raise Exception(f"Failed to analyze repository: {str(e)}")
+    # The three sources are independent, so fetch them concurrently and use whatever finishes in time
+    timeouts = ANALYSIS_SOURCE_TIMEOUTS
+    if deadline is not None:
+        timeouts = {name: min(seconds, deadline.remaining()) for name, seconds in timeouts.items()}
+    gathered = gather_context(
+        {
+            "repo_info": lambda: get_repo_info(repo_owner, repo_name, token, deadline),
+            "readme": lambda: get_repo_readme(repo_owner, repo_name, token, deadline),
+            "relevant_files": fetch_relevant_files,
+        },
+        timeouts=timeouts,
+        executor=_analysis_executor
+    )
+    results = gathered["results"]
+    
+    # A repository that cannot be read at all is still an error
+    if "repo_info" in gathered["errors"]:
+        print(f"Error analyzing repository: {gathered['errors']['repo_info']}")
+        raise Exception(f"Failed to analyze repository: {gathered['errors']['repo_info']}")
+    for name, error in gathered["errors"].items():
+        print(f"Continuing without {name}: {error}")
+    missing_sources = set(gathered["errors"]) | set(gathered["timed_out"])
+    # File fetching stops early at the deadline, so the file set may be incomplete
+    if deadline is not None and not deadline.has_budget(MIN_CALL_SECONDS):
+        missing_sources.add("relevant_files")
+    
+    return {
+        "repo_info": results.get("repo_info", {}),
+        "readme": results.get("readme"),
+        "relevant_files": results.get("relevant_files", {}),
+        "user_request": user_request,
+        "missing_sources": sorted(missing_sources)
+    }
 
 
 if __name__ == "__main__":
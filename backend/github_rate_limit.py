@@ -0,0 +1,168 @@
+"""
+GitHub rate limit tracking and request pacing.
+Reads the X-RateLimit-* headers of every GitHub response per token, spaces out requests as the quota runs low
+and waits for the reset (within the request deadline) instead of failing once it is exhausted.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Mapping, Optional
+
+import metrics
+from deadline import Deadline, MIN_CALL_SECONDS
+
+# Below this many remaining requests, requests are paced and cached responses are served without revalidation
+LOW_QUOTA = int(os.environ.get('GITHUB_LOW_QUOTA', '100'))
+# Longest pause between paced requests
+MAX_PACE_SECONDS = 2.0
+# Longest wait for a quota reset when a request has no deadline
+MAX_RESET_WAIT_SECONDS = 60
+
+
+class RateLimitExceeded(Exception):
+    """Raised when the GitHub quota is exhausted and does not reset within the time the request has"""
+
+
+class _Quota:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.limit = None
+        self.remaining = None
+        self.reset_at = None
+        self.updated_at = None
+        # Earliest time the next paced request may be sent
+        self.next_slot = 0.0
+
+
+_quotas_lock = threading.Lock()
+_quotas: Dict[str, _Quota] = {}
+
+
+def token_key(headers: Mapping[str, str]) -> str:
+    """
+    Identify the quota a request counts against (per token; unauthenticated requests share one quota)
+
+    Only the credential is hashed, so "token <t>" and "Bearer <t>" count against the same quota.
+
+    Args:
+        headers: Request headers
+
+    Returns:
+        Short hash of the token in the Authorization header, or 'anonymous'
+    """
+    credential = headers.get('Authorization', '').split(' ')[-1].strip()
+    if not credential:
+        return 'anonymous'
+    return hashlib.sha256(credential.encode('utf-8')).hexdigest()[:12]
+
+
+def _get_quota(key: str) -> _Quota:
+    with _quotas_lock:
+        if key not in _quotas:
+            _quotas[key] = _Quota()
+        return _quotas[key]
+
+
+def record(key: str, response_headers: Mapping[str, str]) -> None:
+    """
+    Update a quota from the X-RateLimit headers of a response
+
+    Args:
+        key: Result of token_key
+        response_headers: Response headers
+    """
+    remaining = response_headers.get('X-RateLimit-Remaining')
+    if remaining is None or response_headers.get('X-RateLimit-Resource', 'core') != 'core':
+        return
+    quota = _get_quota(key)
+    with quota.lock:
+        quota.remaining = int(remaining)
+        quota.limit = int(response_headers.get('X-RateLimit-Limit', quota.limit or 0)) or None
+        reset = response_headers.get('X-RateLimit-Reset')
+        quota.reset_at = float(reset) if reset else quota.reset_at
+        quota.updated_at = time.time()
+
+
+def is_low(key: str) -> bool:
+    """Check whether a quota is known to be below LOW_QUOTA until its reset"""
+    quota = _get_quota(key)
+    with quota.lock:
+        return (
+            quota.remaining is not None and quota.remaining < LOW_QUOTA
+            and quota.reset_at is not None and quota.reset_at > time.time()
+        )
+
+
+def acquire(key: str, deadline: Optional[Deadline] = None) -> None:
+    """
+    Wait until a request may be sent on a quota
+
+    With plenty of quota left this returns immediately. Below LOW_QUOTA, requests are spread over the time
+    until the reset; with no quota left, the call waits for the reset if the request has time for it.
+
+    Args:
+        key: Result of token_key
+        deadline: Request deadline bounding the wait (optional)
+
+    Raises:
+        RateLimitExceeded: The quota is exhausted and resets too late for this request
+    """
+    quota = _get_quota(key)
+    available = deadline.remaining() - MIN_CALL_SECONDS if deadline is not None else MAX_RESET_WAIT_SECONDS
+    with quota.lock:
+        now = time.time()
+        if quota.remaining is None or quota.reset_at is None or quota.reset_at <= now:
+            return
+        until_reset = quota.reset_at - now
+        if quota.remaining <= 0:
+            wait = until_reset + 1
+            if wait > available:
+                metrics.increment('github_rate_limit.rejected')
+                reset_time = datetime.fromtimestamp(quota.reset_at).strftime('%H:%M:%S')
+                raise RateLimitExceeded(f"GitHub API rate limit exhausted until {reset_time}")
+            metrics.increment('github_rate_limit.reset_waits')
+        elif quota.remaining < LOW_QUOTA:
+            # Spread the remaining requests over the time left in the window: each request reserves the next
+            # free slot, so concurrent requests go out one interval apart instead of together
+            interval = min(MAX_PACE_SECONDS, until_reset / quota.remaining)
+            slot = max(now, quota.next_slot)
+            quota.next_slot = slot + interval
+            # A request never waits past its own budget for its slot
+            wait = max(0.0, min(slot - now, available))
+            metrics.increment('github_rate_limit.paced')
+        else:
+            wait = 0
+        # Count the request now so concurrent callers see the reduced quota
+        quota.remaining -= 1
+    # Sleep outside the lock; the reserved slot already keeps concurrent requests apart
+    if wait > 0:
+        time.sleep(wait)
+
+
+def get_stats() -> Dict:
+    """
+    Report the last known quota of every token and pacing activity
+
+    Returns:
+        Dictionary with per-token quotas (keyed by token hash) and pacing counters
+    """
+    now = time.time()
+    with _quotas_lock:
+        quotas = dict(_quotas)
+    tokens = {}
+    for key, quota in quotas.items():
+        with quota.lock:
+            tokens[key] = {
+                'limit': quota.limit,
+                'remaining': quota.remaining,
+                'resets_in_seconds': max(0, int(quota.reset_at - now)) if quota.reset_at else None,
+            }
+    return {
+        'tokens': tokens,
+        'paced': metrics.get_counter('github_rate_limit.paced'),
+        'reset_waits': metrics.get_counter('github_rate_limit.reset_waits'),
+        'rejected': metrics.get_counter('github_rate_limit.rejected'),
+        'served_from_cache': metrics.get_counter('github_rate_limit.served_from_cache'),
+    }
@@ -0,0 +1,199 @@
+"""
+Conversation history compaction for long chat sessions.
+Keeps recent turns verbatim and folds older turns into a rolling summary produced in the background.
+"""
+import os
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import metrics
+from context_packer import count_tokens, truncate_to_tokens
+from speculative_generation import extract_tagged_block
+
+# Compact once the verbatim history grows past this many tokens
+HISTORY_TOKEN_THRESHOLD = int(os.environ.get('CHAT_HISTORY_TOKEN_THRESHOLD', '2000'))
+# Number of most recent messages that are never folded into the summary
+KEEP_RECENT_MESSAGES = int(os.environ.get('CHAT_HISTORY_KEEP_RECENT', '6'))
+# Structural markers kept verbatim alongside the summary (most recent last)
+MAX_MARKERS = 10
+MARKER_TOKENS = 150
+
+SUMMARY_SYSTEM_MESSAGE = """You summarize conversations between a product manager and an assistant that designs UI mockups.
+Write a concise summary of what was discussed: the product being planned, decisions made, requirements,
+preferences and open questions. Keep names, ticket keys and feature lists exact. Do not invent anything.
+Respond with the summary only."""
+
+
+def _one_line(text: str) -> str:
+    lines = (line.strip().lstrip('-*\u2022').strip() for line in text.splitlines())
+    return truncate_to_tokens('; '.join(line for line in lines if line), MARKER_TOKENS)
+
+
+def extract_markers(messages: List[Dict]) -> List[str]:
+    """
+    Pull structural markers (suggested features, generated mockups) out of messages
+
+    Args:
+        messages: Conversation messages [{'role', 'content', 'mockup_id'?}]
+
+    Returns:
+        One short line per marker, in conversation order
+    """
+    markers = []
+    for msg in messages:
+        content = msg.get('content') or ''
+        suggestions = extract_tagged_block(content, 'SUGGESTIONS')
+        if suggestions:
+            markers.append(f"Suggested features: {_one_line(suggestions)}")
+        summary = extract_tagged_block(content, 'READY_TO_GENERATE')
+        if summary:
+            reference = f" (mockup {msg['mockup_id']})" if msg.get('mockup_id') else ''
+            markers.append(f"Generated mockup{reference}: {_one_line(summary)}")
+    return markers
+
+
+def build_summary_prompt(previous_summary: str, messages: List[Dict]) -> str:
+    """
+    Build the prompt that folds older messages into the rolling summary
+
+    Args:
+        previous_summary: Summary of the turns folded earlier ('' if none)
+        messages: Messages to fold in
+
+    Returns:
+        Prompt text
+    """
+    transcript = '\n\n'.join(f"{msg['role'].upper()}: {msg['content']}" for msg in messages)
+    prompt = ''
+    if previous_summary:
+        prompt += f"Summary of the conversation so far:\n{previous_summary}\n\n"
+    prompt += f"Continue the summary with these messages:\n\n{transcript}"
+    return prompt
+
+
+class HistoryCompactor:
+    """
+    Decides when a conversation needs compacting and runs the summarization in the background.
+    Summaries are applied on the request thread, so conversation state is only touched there.
+    """
+
+    def __init__(self, llm_fn: Callable[[str, str], str], threshold: int = HISTORY_TOKEN_THRESHOLD,
+                 keep_recent: int = KEEP_RECENT_MESSAGES, max_workers: int = 1):
+        """
+        Args:
+            llm_fn: Calls the model with (prompt, system_message) and returns its text
+            threshold: Token count of verbatim history that triggers compaction
+            keep_recent: Number of most recent messages always sent verbatim
+            max_workers: Maximum concurrent summarizations
+        """
+        self._llm_fn = llm_fn
+        self._threshold = threshold
+        self._keep_recent = keep_recent
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='compaction')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+
+    def _summarize(self, previous_summary: str, messages: List[Dict]) -> str:
+        summary = self._llm_fn(build_summary_prompt(previous_summary, messages), SUMMARY_SYSTEM_MESSAGE)
+        summary = re.sub(r'<think>.*?</think>', '', summary, flags=re.DOTALL).strip()
+        if not summary:
+            raise Exception("Empty summary returned")
+        return summary
+
+    def _apply_finished(self, key: str, conversation: Dict):
+        with self._lock:
+            job = self._jobs.get(key)
+            if not job or not job['future'].done():
+                return
+            del self._jobs[key]
+
+        try:
+            summary = job['future'].result()
+        except Exception as e:
+            print(f"History compaction failed for conversation {key}: {str(e)}")
+            metrics.increment('history.compaction_failed')
+            return
+
+        folded = conversation['messages'][conversation.get('summarized_count', 0):job['end']]
+        markers = conversation.get('history_markers', []) + extract_markers(folded)
+        conversation['history_summary'] = summary
+        conversation['history_markers'] = markers[-MAX_MARKERS:]
+        conversation['summarized_count'] = job['end']
+        metrics.increment('history.compactions')
+        metrics.increment('history.messages_folded', len(folded))
+        print(f"Compacted {len(folded)} messages for conversation {key}")
+
+    def build_history(self, key: str, conversation: Dict) -> List[Dict]:
+        """
+        Return the verbatim history to send with the current turn, scheduling compaction if needed
+
+        The last message in conversation['messages'] is the current user message and is excluded.
+
+        Args:
+            key: Conversation ID
+            conversation: Conversation state (messages, summary fields)
+
+        Returns:
+            Messages not yet folded into the summary [{'role', 'content'}]
+        """
+        self._apply_finished(key, conversation)
+        messages = conversation['messages'][:-1]
+        start = conversation.get('summarized_count', 0)
+        recent = messages[start:]
+
+        # Context recorded with a message (e.g., a Jira snapshot) is sent with it until folded
+        contents = [f"{msg['context']}\n\n{msg['content']}" if msg.get('context') else msg['content'] for msg in recent]
+        tokens = [count_tokens(content) for content in contents]
+        recent_tokens = sum(tokens)
+        end = len(messages) - self._keep_recent
+        # Only compact when folding frees a worthwhile share of the threshold,
+        # so long recent turns alone don't trigger a summary every turn
+        if recent_tokens > self._threshold and sum(tokens[:max(end - start, 0)]) >= self._threshold // 2:
+            self._schedule(key, conversation, start, end)
+
+        metrics.increment('history.turns')
+        metrics.increment('history.tokens_sent', recent_tokens)
+        return [{'role': msg['role'], 'content': content} for msg, content in zip(recent, contents)]
+
+    def _schedule(self, key: str, conversation: Dict, start: int, end: int):
+        with self._lock:
+            if key in self._jobs:
+                return
+            to_fold = [{'role': msg['role'], 'content': msg['content']} for msg in conversation['messages'][start:end]]
+            future: Future = self._executor.submit(
+                self._summarize, conversation.get('history_summary') or '', to_fold
+            )
+            self._jobs[key] = {'future': future, 'end': end}
+        print(f"Scheduled history compaction of {end - start} messages for conversation {key}")
+
+    def render_summary(self, conversation: Dict) -> str:
+        """Render the summary block for the system message ('' if nothing has been folded)"""
+        if not conversation.get('history_summary'):
+            return ''
+        block = f"""
+
+========================================
+EARLIER CONVERSATION (SUMMARIZED)
+========================================
+
+{conversation['history_summary']}"""
+        if conversation.get('history_markers'):
+            block += "\n\nKey points from earlier turns:\n" + '\n'.join(
+                f"- {marker}" for marker in conversation['history_markers']
+            )
+        return block + "\n\n========================================"
+
+    def get_stats(self) -> Dict:
+        """Report compaction activity for the metrics endpoint"""
+        with self._lock:
+            pending = len(self._jobs)
+        turns = metrics.get_counter('history.turns')
+        return {
+            'pending': pending,
+            'compactions': metrics.get_counter('history.compactions'),
+            'failed': metrics.get_counter('history.compaction_failed'),
+            'messages_folded': metrics.get_counter('history.messages_folded'),
+            'avg_history_tokens': round(metrics.get_counter('history.tokens_sent') / turns, 1) if turns else 0.0,
+        }
@@ -0,0 +1,43 @@
+"""
+Line-based change sets for mockup HTML, so edit endpoints can return only what changed
+"""
+import difflib
+import hashlib
+import re
+from typing import Dict, List
+
+# Lines split on "\n" only (keeping the newline), matching how the frontend splits them
+_LINE_PATTERN = re.compile(r'[^\n]*\n|[^\n]+$')
+
+
+def content_hash(text: str) -> str:
+    """Return a short SHA-256 digest identifying a document version"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:16]
+
+
+def split_lines(text: str) -> List[str]:
+    """Split text into lines that keep their trailing newline"""
+    return _LINE_PATTERN.findall(text)
+
+
+def compute_line_changes(old_html: str, new_html: str) -> List[Dict]:
+    """
+    Describe how to turn old_html into new_html as line replacements
+
+    Args:
+        old_html: Stored document before the edit
+        new_html: Document after the edit
+
+    Returns:
+        List of changes {'start', 'end', 'lines'}: replace old lines [start, end) with lines.
+        Line strings keep their line endings, so joining them reproduces the document.
+    """
+    old_lines = split_lines(old_html)
+    new_lines = split_lines(new_html)
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+    return [
+        {'start': i1, 'end': i2, 'lines': new_lines[j1:j2]}
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
+
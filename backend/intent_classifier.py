@@ -0,0 +1,214 @@
+"""
+Local intent classifier for chat messages.
+Decides which context providers (Jira, README, repo files) a message needs, so the rest are not loaded.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Set
+
+import metrics
+
+JIRA = 'jira'
+README = 'readme'
+REPO_FILES = 'repo_files'
+GENERAL = 'general'
+
+PROVIDERS = (JIRA, README, REPO_FILES)
+
+# Words and phrases that on their own show a message needs a provider
+KEYWORDS = {
+    JIRA: {
+        'jira', 'ticket', 'tickets', 'issue', 'issues', 'board', 'sprint', 'sprints', 'backlog', 'epic',
+        'epics', 'story', 'stories', 'assignee', 'assigned', 'blocked', 'bug', 'bugs', 'kanban',
+        'in progress', 'to do', 'todo', 'project status', 'velocity', 'workload',
+    },
+    README: {
+        'readme', 'tech stack', 'stack', 'technologies', 'technology', 'framework', 'frameworks',
+        'dependencies', 'language', 'languages', 'library', 'libraries', 'my repo', 'my project',
+        'our project', 'setup', 'install',
+    },
+    REPO_FILES: {
+        'component', 'components', 'codebase', 'source code', 'my code', 'our code', 'file', 'files',
+        'stylesheet', 'css', 'theme', 'color scheme', 'colors', 'existing design', 'existing app',
+        'our app', 'my app', 'repository', 'repo', 'implementation', 'route', 'routes', 'endpoint',
+    },
+}
+
+# Ticket keys such as KAN-12
+_TICKET_KEY = re.compile(r'\b[A-Z][A-Z0-9]+-\d+\b')
+
+# Seed utterances for the naive Bayes model, covering phrasings the keywords miss
+TRAINING_EXAMPLES = {
+    JIRA: [
+        "what is everyone working on right now",
+        "how many things are still open",
+        "what is left before the release",
+        "which work items are done",
+        "who is handling the login work",
+        "what is the team doing this week",
+        "are we on track for the deadline",
+        "summarize our progress",
+        "what should we pick up next",
+        "what work is waiting for review",
+        "show me the open work",
+        "what got finished recently",
+    ],
+    README: [
+        "what are we building this with",
+        "what does my project do",
+        "describe the project",
+        "how is the app built",
+        "which tools does the project use",
+        "what is the project about",
+        "tell me about the repository",
+        "how do i run the project locally",
+        "what version of node do we need",
+    ],
+    REPO_FILES: [
+        "match the look of the current site",
+        "use the same buttons as the existing pages",
+        "make it consistent with what we already have",
+        "reuse the navbar from the app",
+        "follow the styling of the current pages",
+        "keep the same fonts and spacing as our site",
+        "how is the header implemented",
+        "where is the login form defined",
+    ],
+    GENERAL: [
+        "what makes a good onboarding flow",
+        "how should i design a dashboard",
+        "what are good features for a weather app",
+        "create a login page",
+        "build a landing page for a bakery",
+        "make a signup form with social login",
+        "what is a good color for a call to action",
+        "give me ideas for a settings page",
+        "how do i write good user stories",
+        "yes go ahead",
+        "looks good",
+        "thanks",
+        "hello",
+        "what is product market fit",
+        "how do i prioritize features",
+        "design a checkout flow",
+    ],
+}
+
+# Posterior probability above which the model alone enables a provider
+MODEL_THRESHOLD = 0.6
+# Short follow-ups referring back to the previous turn keep its providers
+_FOLLOW_UP_WORDS = {'it', 'that', 'those', 'them', 'these', 'they', 'more', 'else', 'other', 'others', 'rest'}
+_MAX_FOLLOW_UP_TOKENS = 8
+
+
+def _tokenize(text: str) -> List[str]:
+    return re.findall(r"[a-z0-9]+", (text or '').lower())
+
+
+class NaiveBayesIntentModel:
+    """
+    Multinomial naive Bayes over message words, trained on the seed utterances at import time.
+    """
+
+    def __init__(self, examples: Dict[str, List[str]], alpha: float = 1.0):
+        self._alpha = alpha
+        self._word_counts: Dict[str, Counter] = {}
+        self._totals: Dict[str, int] = {}
+        self._priors: Dict[str, float] = {}
+        vocabulary: Set[str] = set()
+        total_examples = sum(len(texts) for texts in examples.values())
+        for label, texts in examples.items():
+            counts = Counter()
+            for text in texts:
+                counts.update(_tokenize(text))
+            self._word_counts[label] = counts
+            self._totals[label] = sum(counts.values())
+            self._priors[label] = math.log(len(texts) / total_examples)
+            vocabulary.update(counts)
+        self._vocabulary_size = len(vocabulary)
+        self._vocabulary = vocabulary
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        """
+        Posterior probability of each label for a message
+
+        Args:
+            text: Message text
+
+        Returns:
+            Dictionary mapping label to probability
+        """
+        tokens = [t for t in _tokenize(text) if t in self._vocabulary]
+        scores = {}
+        for label, counts in self._word_counts.items():
+            denominator = self._totals[label] + self._alpha * self._vocabulary_size
+            scores[label] = self._priors[label] + sum(
+                math.log((counts[t] + self._alpha) / denominator) for t in tokens
+            )
+        best = max(scores.values())
+        exp_scores = {label: math.exp(score - best) for label, score in scores.items()}
+        total = sum(exp_scores.values())
+        return {label: value / total for label, value in exp_scores.items()}
+
+
+_model = NaiveBayesIntentModel(TRAINING_EXAMPLES)
+
+
+def keyword_providers(message: str) -> Set[str]:
+    """Return the providers whose keywords appear in a message"""
+    normalized = ' ' + ' '.join(_tokenize(message)) + ' '
+    found = {
+        provider for provider, words in KEYWORDS.items()
+        if any(f' {word} ' in normalized for word in words)
+    }
+    if _TICKET_KEY.search(message or ''):
+        found.add(JIRA)
+    return found
+
+
+def classify_intent(message: str, previous: Optional[List[str]] = None) -> Dict:
+    """
+    Decide which context providers a chat message needs
+
+    Keywords are checked first, short follow-ups ("what about the others?") keep the previous
+    turn's providers, and the naive Bayes model covers the remaining messages.
+
+    Args:
+        message: User chat message
+        previous: Providers used for the previous turn, if any
+
+    Returns:
+        Dictionary with 'providers' (sorted list) and 'source' ('keywords', 'model', 'follow_up' or 'none')
+    """
+    providers = keyword_providers(message)
+    source = 'keywords' if providers else 'none'
+
+    tokens = _tokenize(message)
+    if (not providers and previous and len(tokens) <= _MAX_FOLLOW_UP_TOKENS
+            and any(t in _FOLLOW_UP_WORDS for t in tokens)):
+        providers = set(previous)
+        source = 'follow_up'
+
+    if not providers:
+        probabilities = _model.predict_proba(message)
+        providers = {p for p in PROVIDERS if probabilities.get(p, 0.0) >= MODEL_THRESHOLD}
+        if providers:
+            source = 'model'
+
+    metrics.increment('intent.classified')
+    for provider in providers:
+        metrics.increment(f'intent.{provider}')
+    return {'providers': sorted(providers), 'source': source}
+
+
+def get_stats() -> Dict:
+    """Report how often each provider was requested for the metrics endpoint"""
+    classified = metrics.get_counter('intent.classified')
+    return {
+        'classified': classified,
+        **{
+            f'{provider}_rate': metrics.ratio(f'intent.{provider}', 'intent.classified')
+            for provider in PROVIDERS
+        },
+    }
@@ -0,0 +1,195 @@
+"""
+Local inverted index over Jira tickets.
+Selects the tickets relevant to a chat message (plus aggregate counts) instead of the first N board issues.
+"""
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import metrics
+
+# Number of tickets put into the chat prompt
+TOP_K = int(os.environ.get('JIRA_CONTEXT_TOP_K', '15'))
+
+# Weight of a term by the ticket field it appears in
+FIELD_WEIGHTS = {
+    'summary': 2.0,
+    'status': 1.5,
+    'assignee': 1.5,
+    'type': 1.0,
+    'priority': 1.0,
+}
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'do', 'does', 'for', 'from', 'has', 'have', 'how', 'i',
+    'in', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'our', 'show', 'tell', 'that', 'the', 'there',
+    'this', 'to', 'we', 'what', 'which', 'who', 'with', 'you', 'about', 'any', 'all', 'many', 'much',
+    'ticket', 'tickets', 'issue', 'issues', 'jira', 'board', 'list', 'give',
+}
+
+_TICKET_KEY = re.compile(r'\b[A-Za-z][A-Za-z0-9]+-\d+\b')
+
+
+def _tokenize(text: str) -> List[str]:
+    return [t for t in re.findall(r'[a-z0-9]+', (text or '').lower()) if t not in STOPWORDS]
+
+
+class TicketIndex:
+    """
+    Inverted index over ticket keys, summaries, statuses, assignees, types and priorities.
+    """
+
+    def __init__(self, tickets: List[Dict]):
+        self.tickets = tickets
+        self._keys = {ticket['key'].upper(): i for i, ticket in enumerate(tickets) if ticket.get('key')}
+        self._postings: Dict[str, Dict[int, float]] = defaultdict(dict)
+        for i, ticket in enumerate(tickets):
+            for field, weight in FIELD_WEIGHTS.items():
+                for term in _tokenize(str(ticket.get(field, ''))):
+                    self._postings[term][i] = self._postings[term].get(i, 0.0) + weight
+        count = len(tickets)
+        self._idf = {term: math.log(1 + count / len(postings)) for term, postings in self._postings.items()}
+
+    def search(self, message: str, k: int = TOP_K) -> List[Dict]:
+        """
+        Return the tickets most relevant to a message
+
+        Tickets named by key come first, then tickets ranked by weighted term matches.
+        If nothing matches, the first k tickets in board order are returned.
+
+        Args:
+            message: User chat message
+            k: Maximum number of tickets
+
+        Returns:
+            Up to k tickets
+        """
+        selected = []
+        for key in _TICKET_KEY.findall(message or ''):
+            index = self._keys.get(key.upper())
+            if index is not None and index not in selected:
+                selected.append(index)
+
+        scores = Counter()
+        for term in set(_tokenize(message)):
+            for index, weight in self._postings.get(term, {}).items():
+                scores[index] += weight * self._idf[term]
+        ranked = sorted(scores, key=lambda i: (-scores[i], i))
+        selected.extend(i for i in ranked if i not in selected)
+
+        metrics.increment('jira_index.searches')
+        if not selected:
+            metrics.increment('jira_index.fallbacks')
+            selected = list(range(len(self.tickets)))
+        return [self.tickets[i] for i in selected[:k]]
+
+
+def aggregate_counts(tickets: List[Dict]) -> Dict[str, Dict[str, int]]:
+    """
+    Count tickets by status, assignee, type and priority
+
+    Args:
+        tickets: All board tickets
+
+    Returns:
+        Dictionary mapping each field to its value counts (most common first)
+    """
+    return {
+        field: dict(Counter(ticket.get(field, 'Unknown') for ticket in tickets).most_common())
+        for field in ('status', 'assignee', 'type', 'priority')
+    }
+
+
+_cache_lock = threading.Lock()
+_cached_index: Dict = {'version': None, 'index': None}
+
+
+def get_ticket_index(tickets: List[Dict], version: Optional[str] = None) -> TicketIndex:
+    """
+    Get an index for a ticket list, reusing the last one while the tickets are unchanged
+
+    Args:
+        tickets: Board tickets from get_jira_data_for_chatbot
+        version: Identifier of the ticket data (index is always rebuilt when omitted)
+
+    Returns:
+        Ticket index
+    """
+    with _cache_lock:
+        if version is not None and _cached_index['version'] == version:
+            return _cached_index['index']
+    index = TicketIndex(tickets)
+    metrics.increment('jira_index.builds')
+    with _cache_lock:
+        _cached_index['version'] = version
+        _cached_index['index'] = index
+    return index
+
+
+# Ticket fields compared between snapshots
+SNAPSHOT_FIELDS = ('summary', 'status', 'assignee', 'priority', 'type')
+
+
+def snapshot_tickets(tickets: List[Dict]) -> Dict[str, Dict]:
+    """
+    Reduce tickets to the fields compared between chat turns
+
+    Args:
+        tickets: Board tickets
+
+    Returns:
+        Dictionary mapping ticket key to its compared fields
+    """
+    return {
+        ticket['key']: {field: ticket.get(field) for field in SNAPSHOT_FIELDS}
+        for ticket in tickets if ticket.get('key')
+    }
+
+
+def diff_snapshots(old: Dict[str, Dict], new: Dict[str, Dict]) -> Dict[str, List]:
+    """
+    Compare two ticket snapshots
+
+    Args:
+        old: Snapshot the conversation has already seen
+        new: Current snapshot
+
+    Returns:
+        Dictionary with 'added' and 'removed' keys and 'changed' entries (key, field, old value, new value)
+    """
+    changed = []
+    for key in new:
+        if key in old:
+            for field in SNAPSHOT_FIELDS:
+                if old[key].get(field) != new[key].get(field):
+                    changed.append((key, field, old[key].get(field), new[key].get(field)))
+    return {
+        'added': [key for key in new if key not in old],
+        'removed': [key for key in old if key not in new],
+        'changed': changed,
+    }
+
+
+def format_delta(delta: Dict[str, List], new: Dict[str, Dict]) -> str:
+    """
+    Render snapshot changes as compact lines ('' if nothing changed)
+
+    Args:
+        delta: Result of diff_snapshots
+        new: Current snapshot (for details of added tickets)
+
+    Returns:
+        One line per change
+    """
+    lines = []
+    for key in delta['added']:
+        ticket = new[key]
+        lines.append(f"- New: [{key}] {ticket['summary']} ({ticket['status']}, {ticket['assignee']})")
+    for key in delta['removed']:
+        lines.append(f"- Removed from board: [{key}]")
+    for key, field, old_value, new_value in delta['changed']:
+        lines.append(f"- [{key}] {field}: {old_value} -> {new_value}")
+    return '\n'.join(lines)
@@ -4,7 +4,9 @@ from requests.auth import HTTPBasicAuth
 from dotenv import load_dotenv
 import urllib3
 from pathlib import Path
-from typing import List
+from typing import List, Optional
+
+from deadline import Deadline, call_timeout
 
 # 🔇 Disable only the InsecureRequestWarning that verify=False triggers
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
@@ -58,13 +60,14 @@ def get_projects(max_results: int = 50):
     return projects
 
 
-def get_board_issues(board_id: int = 1, max_results: int = 100):
+def get_board_issues(board_id: int = 1, max_results: int = 100, deadline: Optional[Deadline] = None):
     """
     Get all issues from a Jira board using the Agile API.
     
     Args:
         board_id: The ID of the board (default: 1 for the KAN board)
         max_results: Number of results per page (max 100)
+        deadline: Request deadline limiting each page request (optional)
     
     Returns:
         List of all issues from the board
@@ -85,6 +88,7 @@ def get_board_issues(board_id: int = 1, max_results: int = 100):
             auth=auth,
             params=params,
             verify=False,  # 👈 ignore SSL
+            timeout=call_timeout(deadline, 30, "Jira board issues"),
         )
         
         resp.raise_for_status()
@@ -125,7 +129,7 @@ def validate_jira_credentials() -> bool:
         return False
 
 
-def get_jira_data_for_chatbot(board_id: int = 1, project_key: str = "KAN") -> dict:
+def get_jira_data_for_chatbot(board_id: int = 1, project_key: str = "KAN", deadline: Optional[Deadline] = None) -> dict:
     """
     Get simplified JIRA data for chatbot context.
     Returns raw ticket data in a simple format.
@@ -133,13 +137,14 @@ def get_jira_data_for_chatbot(board_id: int = 1, project_key: str = "KAN") -> di
     Args:
         board_id: The ID of the board (default: 1 for the KAN board)
         project_key: Project key (default: "KAN")
+        deadline: Request deadline limiting the board requests (optional)
     
     Returns:
         Dictionary with project summary and tickets
     """
     try:
         # Get all issues from the board
-        issues = get_board_issues(board_id=board_id)
+        issues = get_board_issues(board_id=board_id, deadline=deadline)
         
         # Simplify the data
         tickets = []
@@ -336,7 +341,8 @@ def create_enhanced_jira_ticket(
             headers=headers,
             auth=auth,
             json=payload,
-            verify=False
+            verify=False,
+            timeout=30
         )
         
         response.raise_for_status()
@@ -518,7 +524,8 @@ def create_jira_ticket(mockup_data, project_key="KAN", issue_type="Task"):
             headers=headers,
             auth=auth,
             json=payload,
-            verify=False
+            verify=False,
+            timeout=30
         )
         
         response.raise_for_status()
@@ -6,7 +6,7 @@ from dotenv import load_dotenv
 from typing import Optional
 from fastmcp import FastMCP
 from repo_mockup_generator import generate_mockup_from_repo, parse_github_url
-from github_integration import analyze_repo_for_mockup
+from repo_snapshots import get_repo_snapshot
 
 # Load environment variables
 env_path = Path(__file__).parent / '.env'
@@ -56,8 +56,8 @@ def analyze_repository_mcp(github_repo_url: str, github_token: Optional[str] = N
         if not owner or not repo_name:
             raise ValueError(f"Invalid GitHub repository URL: {github_repo_url}")
         
-        # Analyze repository
-        repo_data = analyze_repo_for_mockup(owner, repo_name, "Analysis request", github_token)
+        # Analyze repository (a local read if its current head is already in the snapshot store)
+        repo_data = get_repo_snapshot(owner, repo_name, github_token)
         
         return {
             "success": True,
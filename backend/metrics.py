@@ -0,0 +1,77 @@
+"""
+In-process metrics registry exposed through the /api/metrics endpoint
+"""
+import threading
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_counters: Dict[str, int] = {}
+_providers: Dict[str, Callable[[], Dict]] = {}
+
+
+def increment(name: str, amount: int = 1) -> None:
+    """
+    Increment a named counter
+
+    Args:
+        name: Counter name (e.g., 'prompt_cache.lookups')
+        amount: Amount to add (default: 1)
+    """
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def get_counter(name: str) -> int:
+    """Return the current value of a counter (0 if never incremented)"""
+    with _lock:
+        return _counters.get(name, 0)
+
+
+def ratio(numerator: str, denominator: str) -> float:
+    """
+    Compute the ratio between two counters
+
+    Args:
+        numerator: Counter name for the numerator
+        denominator: Counter name for the denominator
+
+    Returns:
+        Ratio rounded to 4 decimals, or 0.0 when the denominator is zero
+    """
+    with _lock:
+        total = _counters.get(denominator, 0)
+        if not total:
+            return 0.0
+        return round(_counters.get(numerator, 0) / total, 4)
+
+
+def register_provider(section: str, provider: Callable[[], Dict]) -> None:
+    """
+    Register a callable that reports a section of the metrics snapshot
+
+    Args:
+        section: Section name in the snapshot (e.g., 'prompt_cache')
+        provider: Callable returning a JSON-serializable dictionary
+    """
+    with _lock:
+        _providers[section] = provider
+
+
+def snapshot() -> Dict:
+    """
+    Build a JSON-serializable snapshot of all counters and provider sections
+
+    Returns:
+        Dictionary with raw counters and one entry per registered provider
+    """
+    with _lock:
+        counters = dict(_counters)
+        providers = dict(_providers)
+
+    result = {'counters': counters}
+    for section, provider in providers.items():
+        try:
+            result[section] = provider()
+        except Exception as e:
+            result[section] = {'error': str(e)}
+    return result
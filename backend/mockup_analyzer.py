@@ -4,6 +4,10 @@ Analyze generated mockup against GitHub repository and create Jira tickets
 import re
 from typing import List, Dict, Optional
 from nemotron_client import call_nvidia_nemotron
+from context_packer import get_budget as get_context_budget, pack_context, source as context_source
+
+# Repository files listed (path and size) in the analysis prompt
+MAX_SUMMARY_FILES = 40
 
 
 def analyze_mockup_vs_repo(mockup_html: str, repo_data: dict, github_repo_url: str) -> List[Dict]:
@@ -35,11 +39,14 @@ def analyze_mockup_vs_repo(mockup_html: str, repo_data: dict, github_repo_url: s
     
     # Summarize relevant files
     file_summary = []
-    for file_path, content in list(relevant_files.items())[:10]:  # Limit to 10 files
+    for file_path, content in list(relevant_files.items())[:MAX_SUMMARY_FILES]:
         file_summary.append(f"{file_path}: {len(content)} chars")
     
-    # Truncate mockup HTML for analysis (keep structure and key elements)
-    mockup_preview = mockup_html[:5000] if len(mockup_html) > 5000 else mockup_html
+    # Fit the mockup HTML into the analysis context budget (keep structure and key elements)
+    mockup_preview = pack_context(
+        [context_source('mockup_html', mockup_html, priority=1)],
+        get_context_budget('analysis')
+    )['mockup_html']
     
     # Create analysis prompt
     analysis_prompt = f"""You are an expert product manager and technical lead. Analyze the differences between a generated mockup and an existing GitHub repository to identify what needs to be implemented or changed.
@@ -48,7 +55,7 @@ Repository Context:
 {chr(10).join(repo_context)}
 
 Repository Files Summary:
-{chr(10).join(file_summary[:10])}
+{chr(10).join(file_summary)}
 
 Generated Mockup HTML (preview):
 {mockup_preview}
@@ -3,9 +3,13 @@ Nemotron API client for generating mockups
 """
 import os
 import requests
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import List, Optional
 from dotenv import load_dotenv
 
+from deadline import Deadline, DeadlineExceeded, MIN_CALL_SECONDS, call_timeout
+
 # Load environment variables
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
@@ -14,9 +18,11 @@ load_dotenv()
 # Configuration for NVIDIA Nemotron API
 NVIDIA_API_KEY = os.environ.get('NVIDIA_API_KEY', '').strip()
 NVIDIA_API_URL = os.environ.get('NVIDIA_API_URL', 'https://integrate.api.nvidia.com/v1/chat/completions').strip()
+# Whether the endpoint honours the OpenAI-style `n` parameter (several choices per request)
+NVIDIA_SUPPORTS_N = os.environ.get('NVIDIA_SUPPORTS_N', 'true').lower() == 'true'
 
 
-def call_nvidia_nemotron(prompt: str, system_message: str, conversation_history: list = None) -> str:
+def call_nvidia_nemotron(prompt: str, system_message: str, conversation_history: list = None, deadline: Optional[Deadline] = None) -> str:
     """
     Call NVIDIA Nemotron API to generate content
     
@@ -24,10 +30,54 @@ def call_nvidia_nemotron(prompt: str, system_message: str, conversation_history:
         prompt: User prompt/request
         system_message: System message/instructions
         conversation_history: Optional list of previous messages [{'role': 'user'/'assistant', 'content': '...'}]
+        deadline: Request deadline limiting the API call (optional)
     
     Returns:
         Generated content from Nemotron
     """
+    return _request_completions(prompt, system_message, conversation_history, n=1, deadline=deadline)[0]
+
+
+def call_nvidia_nemotron_variants(prompt: str, system_message: str, n: int, conversation_history: list = None, deadline: Optional[Deadline] = None) -> List[str]:
+    """
+    Generate several alternative completions for the same prompt
+    
+    Uses the API's `n` parameter when supported and fills any missing choices
+    with concurrent single calls.
+    
+    Args:
+        prompt: User prompt/request
+        system_message: System message/instructions
+        n: Number of variants to generate
+        conversation_history: Optional list of previous messages
+        deadline: Request deadline limiting the API calls (optional)
+    
+    Returns:
+        List of n generated contents
+    """
+    choices = []
+    if NVIDIA_SUPPORTS_N and n > 1:
+        try:
+            choices = _request_completions(prompt, system_message, conversation_history, n=n, deadline=deadline)
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            print(f"Multi-choice request failed, falling back to concurrent calls: {str(e)}")
+    elif n == 1:
+        choices = _request_completions(prompt, system_message, conversation_history, n=1, deadline=deadline)
+    
+    missing = n - len(choices)
+    if missing > 0:
+        with ThreadPoolExecutor(max_workers=missing) as pool:
+            choices.extend(pool.map(
+                lambda _: call_nvidia_nemotron(prompt, system_message, conversation_history, deadline),
+                range(missing)
+            ))
+    return choices[:n]
+
+
+def _request_completions(prompt: str, system_message: str, conversation_history: list = None, n: int = 1, deadline: Optional[Deadline] = None) -> List[str]:
+    """Send one chat completion request and return the content of every choice"""
     if not NVIDIA_API_KEY or NVIDIA_API_KEY == '':
         raise Exception("NVIDIA_API_KEY is not set. Please create a .env file in the backend directory with your API key.")
     
@@ -59,6 +109,10 @@ def call_nvidia_nemotron(prompt: str, system_message: str, conversation_history:
         'presence_penalty': 0,
         'stream': False
     }
+    if n > 1:
+        payload['n'] = n
+    # Raises DeadlineExceeded before sending if the request has no time left
+    timeout = call_timeout(deadline, 120, 'Nemotron')
     
     try:
         # Debug logging (don't log the full API key)
@@ -66,12 +120,17 @@ def call_nvidia_nemotron(prompt: str, system_message: str, conversation_history:
         print(f"API Key present: {bool(api_key)}, length: {len(api_key)}")
         print(f"Model: {payload['model']}")
         
-        response = requests.post(NVIDIA_API_URL, headers=headers, json=payload, timeout=120)
+        response = requests.post(NVIDIA_API_URL, headers=headers, json=payload, timeout=timeout)
         response.raise_for_status()
         result = response.json()
         if 'choices' not in result or len(result['choices']) == 0:
             raise Exception("No choices in API response")
-        return result['choices'][0]['message']['content']
+        return [choice['message']['content'] for choice in result['choices']]
+    except requests.exceptions.Timeout as e:
+        print(f"NVIDIA API request timed out: {str(e)}")
+        if deadline is not None and not deadline.has_budget(MIN_CALL_SECONDS):
+            raise DeadlineExceeded("Request deadline exceeded during Nemotron")
+        raise Exception(f"Failed to call NVIDIA API: {str(e)}")
     except requests.exceptions.RequestException as e:
         print(f"Error calling NVIDIA API (RequestException): {str(e)}")
         if hasattr(e, 'response') and e.response is not None:
@@ -0,0 +1,139 @@
+"""
+Stable-prefix prompt assembly.
+Orders prompt segments from most static to most dynamic and memoizes rendered context blocks,
+so consecutive prompts share the longest possible prefix for provider-side prefix/KV caching.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+import metrics
+
+# Segment stability levels, most static first
+STATIC = 0      # Instructions that never change
+SESSION = 1     # Context that changes rarely within a conversation (e.g., README)
+VOLATILE = 2    # Live data that may change between turns (e.g., Jira)
+
+MAX_CACHED_ENTRIES = 1000
+
+
+def content_version(*parts) -> str:
+    """
+    Build a short version string for the data a block is rendered from
+
+    Args:
+        parts: Values the rendered block depends on (converted with str())
+
+    Returns:
+        Hex digest identifying this combination of values
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def segment(name: str, stability: int, text: Optional[str] = None,
+            render: Optional[Callable[[], str]] = None, version: Optional[str] = None) -> Dict:
+    """
+    Describe a prompt segment for PromptAssembler.assemble
+
+    Args:
+        name: Segment name, unique within a prompt
+        stability: STATIC, SESSION or VOLATILE
+        text: Literal text (for static segments)
+        render: Callable producing the text (for cached context blocks)
+        version: Version of the data render() uses; the rendered text is reused while it is unchanged
+
+    Returns:
+        Segment dictionary
+    """
+    return {'name': name, 'stability': stability, 'text': text, 'render': render, 'version': version}
+
+
+class PromptAssembler:
+    """
+    Assembles prompts from segments and tracks how stable their prefixes are per conversation.
+    """
+
+    def __init__(self, max_entries: int = MAX_CACHED_ENTRIES):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._rendered: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._previous: "OrderedDict[str, str]" = OrderedDict()
+
+    def _render(self, key: str, seg: Dict) -> str:
+        if seg['render'] is None:
+            return seg['text'] or ''
+        cache_key = (key, seg['name'])
+        with self._lock:
+            cached = self._rendered.get(cache_key)
+            if cached and cached[0] == seg['version']:
+                self._rendered.move_to_end(cache_key)
+                metrics.increment('prompt_assembly.render_hits')
+                return cached[1]
+
+        text = seg['render']() or ''
+        metrics.increment('prompt_assembly.render_misses')
+        with self._lock:
+            self._rendered[cache_key] = (seg['version'], text)
+            self._rendered.move_to_end(cache_key)
+            while len(self._rendered) > self._max_entries:
+                self._rendered.popitem(last=False)
+        return text
+
+    def assemble(self, key: str, segments: List[Dict], separator: str = '\n\n') -> str:
+        """
+        Render and join segments, most static first
+
+        Args:
+            key: Cache scope (e.g., conversation ID)
+            segments: Segments built with segment()
+            separator: Text placed between non-empty segments
+
+        Returns:
+            Assembled prompt text
+        """
+        ordered = sorted(segments, key=lambda s: s['stability'])
+        parts = [self._render(key, seg) for seg in ordered]
+        prompt = separator.join(part for part in parts if part)
+        self._record_prefix(key, prompt)
+        return prompt
+
+    def _record_prefix(self, key: str, prompt: str):
+        with self._lock:
+            previous = self._previous.get(key)
+            self._previous[key] = prompt
+            self._previous.move_to_end(key)
+            while len(self._previous) > self._max_entries:
+                self._previous.popitem(last=False)
+
+        metrics.increment('prompt_assembly.assemblies')
+        if previous is None:
+            return
+        shared = 0
+        for a, b in zip(previous, prompt):
+            if a != b:
+                break
+            shared += 1
+        metrics.increment('prompt_assembly.compared_chars', len(prompt))
+        metrics.increment('prompt_assembly.stable_prefix_chars', shared)
+        if shared == len(prompt) and len(previous) == len(prompt):
+            metrics.increment('prompt_assembly.identical_prompts')
+
+    def get_stats(self) -> Dict:
+        """Report render cache and prefix stability statistics for the metrics endpoint"""
+        hits = metrics.get_counter('prompt_assembly.render_hits')
+        misses = metrics.get_counter('prompt_assembly.render_misses')
+        return {
+            'assemblies': metrics.get_counter('prompt_assembly.assemblies'),
+            'identical_prompts': metrics.get_counter('prompt_assembly.identical_prompts'),
+            'render_cache_hits': hits,
+            'render_cache_misses': misses,
+            'render_cache_hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'stable_prefix_ratio': metrics.ratio(
+                'prompt_assembly.stable_prefix_chars', 'prompt_assembly.compared_chars'
+            ),
+        }
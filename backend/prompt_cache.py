@@ -0,0 +1,237 @@
+"""
+Near-duplicate prompt cache using MinHash signatures over normalized prompts.
+Lets the backend hand back an existing mockup when a PM re-types almost the same request.
+"""
+import hashlib
+import os
+import random
+import re
+import threading
+import unicodedata
+from typing import Callable, Dict, Iterable, Optional, Set, Tuple
+
+import metrics
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+SHINGLE_SIZE = 3
+# Only short, human-typed requests are cached; refinement prompts embed whole documents
+MAX_PROMPT_CHARS = 2000
+
+SIMILARITY_THRESHOLD = float(os.environ.get('PROMPT_CACHE_THRESHOLD', '0.85'))
+AUTO_RETURN = os.environ.get('PROMPT_CACHE_AUTO_RETURN', 'false').lower() == 'true'
+
+# Terms whose difference changes what a prompt asks for even when the rest is nearly identical
+NUMBER_WORDS = {
+    'zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten',
+    'eleven', 'twelve', 'single', 'double', 'dozen',
+}
+NEGATION_WORDS = {'no', 'not', 'without', 'never', 'none', 'nor', 'except', 'excluding', 'instead'}
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Normalize a prompt so cosmetic differences do not affect matching
+
+    Args:
+        prompt: Raw user prompt
+
+    Returns:
+        Lowercased prompt with punctuation removed and whitespace collapsed
+    """
+    text = unicodedata.normalize('NFKC', prompt or '').lower()
+    text = re.sub(r"[^\w\s]", ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def shingle(normalized: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """
+    Split a normalized prompt into overlapping character shingles
+
+    Args:
+        normalized: Output of normalize_prompt
+        size: Shingle length in characters
+
+    Returns:
+        Set of shingles (the whole string if shorter than size)
+    """
+    if len(normalized) <= size:
+        return {normalized} if normalized else set()
+    return {normalized[i:i + size] for i in range(len(normalized) - size + 1)}
+
+
+def key_terms(normalized: str) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """
+    Extract the numbers and negations of a normalized prompt
+
+    Character shingles barely change between "3 charts" and "4 charts" or when "and no photo gallery" is
+    appended, so prompts only count as near-duplicates when these terms are the same.
+
+    Args:
+        normalized: Output of normalize_prompt
+
+    Returns:
+        Tuple of (sorted numeric tokens, sorted negations each with the word that follows)
+    """
+    words = normalized.split()
+    numbers = sorted(w for w in words if w.isdigit() or w in NUMBER_WORDS)
+    negations = []
+    for i, word in enumerate(words):
+        # normalize_prompt turns "don't" into "don t"
+        if word in NEGATION_WORDS or (word == 't' and i > 0 and words[i - 1].endswith('n')):
+            negations.append(f"{word} {words[i + 1]}" if i + 1 < len(words) else word)
+    return tuple(numbers), tuple(sorted(negations))
+
+
+def _base_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def minhash_signature(shingles: Iterable[str]) -> Tuple[int, ...]:
+    """
+    Compute a MinHash signature for a set of shingles
+
+    Args:
+        shingles: Shingle set from shingle()
+
+    Returns:
+        Tuple of NUM_PERMUTATIONS minimum hash values
+    """
+    hashes = [_base_hash(s) for s in shingles]
+    if not hashes:
+        return tuple([_MERSENNE_PRIME] * NUM_PERMUTATIONS)
+    return tuple(
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+
+def estimate_similarity(sig_a: Tuple[int, ...], sig_b: Tuple[int, ...]) -> float:
+    """Estimate Jaccard similarity from two MinHash signatures"""
+    matches = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return matches / NUM_PERMUTATIONS
+
+
+def _bands(signature: Tuple[int, ...]):
+    for band in range(LSH_BANDS):
+        yield band, signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]
+
+
+class PromptCache:
+    """
+    MinHash + LSH index of stored mockup prompts.
+    The index is built lazily from the database on first lookup.
+    """
+
+    def __init__(self, loader: Callable[[], Iterable[Tuple[str, str]]], threshold: float = SIMILARITY_THRESHOLD):
+        """
+        Args:
+            loader: Callable returning (mockup_id, prompt) pairs already stored
+            threshold: Minimum estimated similarity to count as a near-duplicate
+        """
+        self._loader = loader
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._exact: Dict[str, str] = {}
+        self._signatures: Dict[str, Tuple[int, ...]] = {}
+        self._key_terms: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[str]] = {}
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        try:
+            rows = list(self._loader())
+        except Exception as e:
+            print(f"Could not load prompt cache: {str(e)}")
+            rows = []
+        for mockup_id, prompt in rows:
+            self._add_locked(mockup_id, prompt)
+        self._loaded = True
+
+    def _add_locked(self, mockup_id: str, prompt: str):
+        if not prompt or len(prompt) > MAX_PROMPT_CHARS:
+            return
+        normalized = normalize_prompt(prompt)
+        if not normalized:
+            return
+        signature = minhash_signature(shingle(normalized))
+        # Newer mockups win for identical prompts
+        self._exact[normalized] = mockup_id
+        self._signatures[mockup_id] = signature
+        self._key_terms[mockup_id] = key_terms(normalized)
+        for key in _bands(signature):
+            self._buckets.setdefault(key, set()).add(mockup_id)
+
+    def add(self, mockup_id: str, prompt: str) -> None:
+        """Index a newly stored mockup prompt"""
+        with self._lock:
+            if self._loaded:
+                self._add_locked(mockup_id, prompt)
+
+    def lookup(self, prompt: str) -> Optional[Dict]:
+        """
+        Find the stored mockup whose prompt is most similar to this one
+
+        Args:
+            prompt: Incoming user prompt
+
+        Returns:
+            Dictionary with mockup_id and similarity, or None if nothing clears the threshold
+        """
+        metrics.increment('prompt_cache.lookups')
+        if not prompt or len(prompt) > MAX_PROMPT_CHARS:
+            return None
+
+        normalized = normalize_prompt(prompt)
+        with self._lock:
+            self._ensure_loaded()
+
+            if normalized in self._exact:
+                metrics.increment('prompt_cache.hits')
+                return {'mockup_id': self._exact[normalized], 'similarity': 1.0}
+
+            signature = minhash_signature(shingle(normalized))
+            terms = key_terms(normalized)
+            candidates = set()
+            for key in _bands(signature):
+                candidates.update(self._buckets.get(key, ()))
+
+            best_id, best_score = None, 0.0
+            for candidate_id in candidates:
+                if self._key_terms[candidate_id] != terms:
+                    metrics.increment('prompt_cache.key_term_mismatches')
+                    continue
+                score = estimate_similarity(signature, self._signatures[candidate_id])
+                # Mockup ids are timestamps, so ties go to the newest mockup
+                if score > best_score or (score == best_score and (best_id is None or candidate_id > best_id)):
+                    best_id, best_score = candidate_id, score
+
+        if best_id is None or best_score < self.threshold:
+            return None
+        metrics.increment('prompt_cache.hits')
+        return {'mockup_id': best_id, 'similarity': round(best_score, 4)}
+
+    def get_stats(self) -> Dict:
+        """Report cache size and hit rate for the metrics endpoint"""
+        with self._lock:
+            indexed = len(self._signatures)
+        return {
+            'indexed_prompts': indexed,
+            'threshold': self.threshold,
+            'auto_return': AUTO_RETURN,
+            'lookups': metrics.get_counter('prompt_cache.lookups'),
+            'hits': metrics.get_counter('prompt_cache.hits'),
+            'served': metrics.get_counter('prompt_cache.served'),
+            'key_term_mismatches': metrics.get_counter('prompt_cache.key_term_mismatches'),
+            'hit_rate': metrics.ratio('prompt_cache.hits', 'prompt_cache.lookups'),
+        }
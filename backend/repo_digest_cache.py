@@ -0,0 +1,144 @@
+"""
+SQLite cache of repository digests (parsed profile and distilled style guide) per commit SHA.
+Shared by the Flask backend and the MCP server, so a repository is only re-analyzed when its head moves.
+"""
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import metrics
+
+DATA_DIR = Path('data')
+DB_PATH = DATA_DIR / 'mockups.db'
+
+# Older commits kept per repository and mode
+MAX_DIGESTS_PER_REPO = 5
+# Saves between two prunes of digests beyond MAX_DIGESTS_PER_REPO
+PRUNE_INTERVAL = 20
+
+_prune_lock = threading.Lock()
+_saves_since_prune = 0
+
+
+def _get_connection():
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_db():
+    """Create the digest table if it does not exist"""
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS repo_digests (
+                    repo TEXT NOT NULL,
+                    sha TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    digest TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (repo, sha, mode)
+                )
+                """
+            )
+    finally:
+        conn.close()
+
+
+# Create the table once per process
+init_db()
+
+
+def load_digest(repo: str, sha: str, mode: str) -> Optional[Dict]:
+    """
+    Load the cached digest of a repository at a commit
+
+    Args:
+        repo: Repository as 'owner/name'
+        sha: Commit SHA of the default branch head
+        mode: Digest mode ('local' or 'llm')
+
+    Returns:
+        Digest dictionary, or None if it has not been computed for this commit
+    """
+    conn = _get_connection()
+    try:
+        row = conn.execute(
+            "SELECT digest FROM repo_digests WHERE repo = ? AND sha = ? AND mode = ?",
+            (repo.lower(), sha, mode)
+        ).fetchone()
+    finally:
+        conn.close()
+
+    metrics.increment('repo_digest.hits' if row else 'repo_digest.misses')
+    return json.loads(row['digest']) if row else None
+
+
+def save_digest(repo: str, sha: str, mode: str, digest: Dict) -> None:
+    """
+    Store the digest of a repository at a commit, pruning digests of older commits every PRUNE_INTERVAL saves
+
+    Args:
+        repo: Repository as 'owner/name'
+        sha: Commit SHA of the default branch head
+        mode: Digest mode ('local' or 'llm')
+        digest: JSON-serializable digest
+    """
+    global _saves_since_prune
+    conn = _get_connection()
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO repo_digests (repo, sha, mode, digest, created_at) VALUES (?, ?, ?, ?, ?)",
+                (repo.lower(), sha, mode, json.dumps(digest), datetime.now().isoformat())
+            )
+    finally:
+        conn.close()
+
+    with _prune_lock:
+        _saves_since_prune += 1
+        should_prune = _saves_since_prune >= PRUNE_INTERVAL
+        if should_prune:
+            _saves_since_prune = 0
+    if should_prune:
+        prune_digests()
+
+
+def prune_digests(keep: int = MAX_DIGESTS_PER_REPO) -> int:
+    """
+    Delete all but the newest digests of every repository and mode
+
+    Args:
+        keep: Digests kept per repository and mode
+
+    Returns:
+        Number of digests deleted
+    """
+    conn = _get_connection()
+    try:
+        with conn:
+            deleted = conn.execute(
+                """
+                DELETE FROM repo_digests WHERE rowid IN (
+                    SELECT rowid FROM (
+                        SELECT rowid, ROW_NUMBER() OVER (
+                            PARTITION BY repo, mode ORDER BY created_at DESC
+                        ) AS position
+                        FROM repo_digests
+                    )
+                    WHERE position > ?
+                )
+                """,
+                (keep,)
+            ).rowcount
+    finally:
+        conn.close()
+    if deleted:
+        metrics.increment('repo_digest.pruned', deleted)
+    return deleted
@@ -2,10 +2,25 @@
 Repository-aware mockup generator - core functionality without MCP decorators
 This module provides the core functions that can be used by both MCP server and Flask backend
 """
+import os
 import re
-from typing import Optional
-from github_integration import analyze_repo_for_mockup
+from typing import List, Optional
+import metrics
 from nemotron_client import call_nvidia_nemotron
+from context_packer import get_budget as get_context_budget, pack_context, source as context_source
+from deadline import Deadline, DeadlineExceeded
+from repo_digest_cache import load_digest, save_digest
+from repo_profiler import build_profiled_prompt, format_profile, profile_repository
+from repo_retrieval import BM25Index, format_chunks
+from repo_snapshots import get_repo_snapshot, resolve_head
+
+# Whether the repository digest includes a style guide distilled by the model (one LLM call per commit).
+# When disabled, only the locally parsed repository profile is added to requests.
+LLM_ENHANCEMENT = os.environ.get('REPO_LLM_ENHANCEMENT', 'false').lower() == 'true'
+# Bumped when the digest format changes, so older cached digests are recomputed
+DIGEST_VERSION = 2
+# Seconds a request must have left to spend a model call on the optional style guide
+STYLE_GUIDE_MIN_SECONDS = 60
 
 
 def parse_github_url(repo_url: str) -> tuple[Optional[str], Optional[str]]:
@@ -34,16 +49,16 @@ def parse_github_url(repo_url: str) -> tuple[Optional[str], Optional[str]]:
     return None, None
 
 
-def enhance_prompt_with_repo_context(user_request: str, repo_data: dict) -> str:
+def build_repo_context(repo_data: dict, profile: dict) -> str:
     """
-    Enhance mockup request with repository context using Nemotron
+    Build the repository context text (facts, parsed profile, README and files) within the enhance budget
     
     Args:
-        user_request: Original user request for mockup
         repo_data: Repository analysis data
+        profile: Parsed repository profile
     
     Returns:
-        Enhanced prompt with repository context
+        Repository context text
     """
     repo_info = repo_data.get("repo_info", {})
     readme = repo_data.get("readme", "")
@@ -60,129 +75,275 @@ def enhance_prompt_with_repo_context(user_request: str, repo_data: dict) -> str:
     if repo_info.get("topics"):
         context_parts.append(f"Topics: {', '.join(repo_info['topics'])}")
     
-    # Add README if available
-    if readme:
-        # Truncate README if too long
-        readme_preview = readme[:2000] if len(readme) > 2000 else readme
-        context_parts.append(f"\nREADME:\n{readme_preview}")
+    # Add the parsed tech stack and design tokens
+    profile_summary = format_profile(profile)
+    if profile_summary:
+        context_parts.append(f"\nParsed Repository Profile:\n{profile_summary}")
     
-    # Add relevant file contents (prioritize key files)
+    # Share the enhancement budget between the README and repository files,
+    # giving well-known manifest files priority over other sources
     key_files = ["package.json", "requirements.txt", "README.md", "*.json"]
-    file_contents = []
-    
-    for file_path, content in relevant_files.items():
-        # Prioritize key files
+    sources = [context_source('readme', readme, priority=1, min_tokens=300)]
+    for index, (file_path, content) in enumerate(relevant_files.items()):
         is_key_file = any(key_file in file_path for key_file in key_files)
-        
-        if is_key_file or len(file_contents) < 5:
-            # Truncate file content if too long
-            content_preview = content[:1000] if len(content) > 1000 else content
-            file_contents.append(f"\n{file_path}:\n{content_preview}")
+        sources.append(context_source(
+            f"file:{file_path}", content,
+            priority=(2 if is_key_file else 3) * 1000 + index,
+            min_tokens=100,
+            max_tokens=400
+        ))
+    packed = pack_context(sources, get_context_budget('enhance'))
+    
+    # Add README if available
+    if packed['readme']:
+        context_parts.append(f"\nREADME:\n{packed['readme']}")
+    
+    # Add relevant file contents that fit the budget
+    file_contents = [
+        f"\n{file_path}:\n{packed[f'file:{file_path}']}"
+        for file_path in relevant_files
+        if packed[f'file:{file_path}']
+    ]
     
     if file_contents:
         context_parts.append("\nRelevant Files:")
-        context_parts.extend(file_contents[:5])  # Limit to 5 files
+        context_parts.extend(file_contents)
     
-    # Build context string
-    repo_context = "\n".join(context_parts)
+    return "\n".join(context_parts)
+
+
+def distill_repo_style_guide(repo_context: str, deadline: Optional[Deadline] = None) -> Optional[str]:
+    """
+    Distill repository context into a reusable mockup style guide using Nemotron
+    
+    The guide does not depend on any particular request, so it is computed once per commit.
+    
+    Args:
+        repo_context: Repository context from build_repo_context
+        deadline: Request deadline (the guide is skipped when too little time is left)
+    
+    Returns:
+        Style guide text, or None if the model call failed or was skipped
+    """
+    if deadline is not None and not deadline.has_budget(STYLE_GUIDE_MIN_SECONDS):
+        print(f"Skipping style guide distillation ({deadline.remaining():.0f}s left)")
+        return None
     
-    # Create prompt for Nemotron to enhance the request
-    enhancement_prompt = f"""You are an expert product manager and developer. Analyze the following repository information and user request, then create an enhanced, detailed mockup specification that incorporates the repository's context, technology stack, and existing patterns.
+    distill_prompt = f"""You are an expert product manager and developer. Analyze the following repository information and write a concise style guide that any new UI mockup for this project should follow.
 
 Repository Context:
 {repo_context}
 
-Original User Request:
-{user_request}
-
-Based on the repository information above, enhance the mockup request to:
-1. Align with the repository's technology stack and patterns
-2. Match the project's style and conventions
-3. Incorporate relevant design patterns from the codebase
-4. Ensure consistency with existing components and structure
-5. Add specific technical details relevant to the project
-
-Provide an enhanced, detailed mockup specification that the user would want, incorporating all relevant repository context. Be specific about:
+Be specific about:
 - Technology stack to use (based on package.json, requirements.txt, etc.)
 - Design patterns and components from the repo
 - Color schemes and styling approaches
 - Component structure and organization
 - Any specific libraries or frameworks to consider
 
-Return ONLY the enhanced mockup specification, no explanations or markdown formatting."""
+Return ONLY the style guide, no explanations or markdown formatting."""
     
-    # Call Nemotron to enhance the prompt
     system_message = """You are an expert at analyzing codebases and creating detailed product specifications. 
-Your task is to enhance user requests with relevant repository context to create better mockups.
-Return only the enhanced specification text."""
+Your task is to summarize a repository's stack and design conventions so mockups can match them.
+Return only the style guide text."""
     
     try:
-        enhanced_prompt = call_nvidia_nemotron(enhancement_prompt, system_message)
+        style_guide = call_nvidia_nemotron(distill_prompt, system_message, deadline=deadline)
         
         # Clean up the response
-        if '<think>' in enhanced_prompt:
-            start_idx = enhanced_prompt.find('<think>')
-            end_idx = enhanced_prompt.find('</think>') + len('</think>')
-            enhanced_prompt = enhanced_prompt[:start_idx] + enhanced_prompt[end_idx:]
-            enhanced_prompt = enhanced_prompt.strip()
+        if '<think>' in style_guide:
+            start_idx = style_guide.find('<think>')
+            end_idx = style_guide.find('</think>') + len('</think>')
+            style_guide = style_guide[:start_idx] + style_guide[end_idx:]
+            style_guide = style_guide.strip()
         
         # Remove markdown code blocks if present
-        if '```' in enhanced_prompt:
-            enhanced_prompt = re.sub(r'```[^`]*```', '', enhanced_prompt, flags=re.DOTALL)
-            enhanced_prompt = enhanced_prompt.strip()
+        if '```' in style_guide:
+            style_guide = re.sub(r'```[^`]*```', '', style_guide, flags=re.DOTALL)
+            style_guide = style_guide.strip()
         
-        return enhanced_prompt
+        return style_guide or None
     except Exception as e:
-        print(f"Error enhancing prompt with Nemotron: {str(e)}")
-        # Fallback to basic enhancement
-        return f"""{user_request}
+        print(f"Error distilling style guide with Nemotron: {str(e)}")
+        return None
 
-Repository Context:
-- Project: {repo_info.get('name', 'Unknown')}
-- Description: {repo_info.get('description', 'N/A')}
-- Language: {repo_info.get('language', 'N/A')}
-- Technologies: {', '.join(repo_info.get('topics', []))}
 
-Please ensure the mockup aligns with this project's context and technology stack."""
+def build_repo_digest(repo_data: dict, use_llm: Optional[bool] = None, deadline: Optional[Deadline] = None) -> dict:
+    """
+    Compute the repository-derived part of prompt enhancement
+    
+    Args:
+        repo_data: Repository analysis data
+        use_llm: Whether to distill a style guide with Nemotron (default: REPO_LLM_ENHANCEMENT)
+        deadline: Request deadline for the distillation call (optional)
+    
+    Returns:
+        Digest with the parsed 'profile', the 'style_guide' (None unless distilled)
+        and the serialized BM25 'retrieval_index' over file chunks
+    """
+    if use_llm is None:
+        use_llm = LLM_ENHANCEMENT
+    profile = repo_data.get("profile") or profile_repository(repo_data)
+    style_guide = distill_repo_style_guide(build_repo_context(repo_data, profile), deadline) if use_llm else None
+    retrieval_index = BM25Index.build(repo_data.get("relevant_files", {}))
+    return {
+        "version": DIGEST_VERSION,
+        "profile": profile,
+        "style_guide": style_guide,
+        "retrieval_index": retrieval_index.to_dict(),
+    }
 
 
-def generate_mockup_from_repo(
-    github_repo_url: str,
-    mockup_request: str,
-    github_token: Optional[str] = None
-) -> str:
+def update_repo_digest(previous: dict, repo_data: dict, use_llm: Optional[bool] = None, deadline: Optional[Deadline] = None) -> dict:
     """
-    Generate a mockup by analyzing a GitHub repository and enhancing the request with repository context.
+    Derive the digest of an incrementally refreshed snapshot from the digest of its previous commit
+    
+    Only the retrieval chunks of changed files are rebuilt. The style guide is kept while the parsed
+    profile and the README are unchanged, so a code-only change costs no model call.
     
     Args:
-        github_repo_url: GitHub repository URL (e.g., 'https://github.com/owner/repo' or 'owner/repo')
-        mockup_request: User's original mockup request/description
-        github_token: Optional GitHub personal access token (uses GITHUB_TOKEN env var if not provided)
+        previous: Digest of the commit the snapshot was refreshed from
+        repo_data: Refreshed snapshot with 'refreshed_from' from get_repo_snapshot
+        use_llm: Whether the digest includes a Nemotron-distilled style guide (default: REPO_LLM_ENHANCEMENT)
+        deadline: Request deadline for the distillation call (optional)
     
     Returns:
-        Generated HTML mockup content
+        Digest like build_repo_digest
     """
-    try:
-        # Parse GitHub URL
-        owner, repo_name = parse_github_url(github_repo_url)
-        
-        if not owner or not repo_name:
-            raise ValueError(f"Invalid GitHub repository URL: {github_repo_url}. Expected format: 'https://github.com/owner/repo' or 'owner/repo'")
-        
-        print(f"Analyzing repository: {owner}/{repo_name}")
-        
-        # Analyze repository
-        repo_data = analyze_repo_for_mockup(owner, repo_name, mockup_request, github_token)
-        
-        print(f"Repository analyzed. Found {len(repo_data['relevant_files'])} relevant files.")
-        
-        # Enhance prompt with repository context
-        enhanced_prompt = enhance_prompt_with_repo_context(mockup_request, repo_data)
-        
-        print(f"Enhanced prompt generated (length: {len(enhanced_prompt)} characters)")
-        
-        # Generate mockup using Nemotron
-        system_message = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
+    if use_llm is None:
+        use_llm = LLM_ENHANCEMENT
+    changes = repo_data["refreshed_from"]
+    relevant_files = repo_data.get("relevant_files", {})
+    profile = profile_repository(repo_data)
+    
+    style_guide = None
+    if use_llm:
+        if previous.get("style_guide") and profile == previous.get("profile") and not changes["readme_changed"]:
+            metrics.increment("repo_digest.style_guides_reused")
+            style_guide = previous["style_guide"]
+        else:
+            style_guide = distill_repo_style_guide(build_repo_context(repo_data, profile), deadline)
+    
+    retrieval_index = BM25Index.from_dict(previous["retrieval_index"]).update(
+        {path: relevant_files[path] for path in changes["changed"]}, changes["removed"]
+    )
+    metrics.increment("repo_digest.incremental_updates")
+    return {
+        "version": DIGEST_VERSION,
+        "profile": profile,
+        "style_guide": style_guide,
+        "retrieval_index": retrieval_index.to_dict(),
+    }
+
+
+def retrieve_repo_excerpts(digest: dict, query: str, budget: Optional[int] = None) -> str:
+    """
+    Retrieve the repository file excerpts most relevant to a request
+    
+    Args:
+        digest: Result of build_repo_digest
+        query: Mockup request or question
+        budget: Token budget for the excerpts (default: the 'retrieval' context budget)
+    
+    Returns:
+        Formatted excerpts ('' if nothing relevant was found)
+    """
+    if not digest.get("retrieval_index"):
+        return ""
+    index = BM25Index.from_dict(digest["retrieval_index"])
+    if budget is None:
+        budget = get_context_budget('retrieval')
+    return format_chunks(index.retrieve(query, budget))
+
+
+def apply_repo_digest(user_request: str, digest: dict) -> str:
+    """
+    Combine a mockup request with a repository digest
+    
+    Args:
+        user_request: Original user request for mockup
+        digest: Result of build_repo_digest
+    
+    Returns:
+        Enhanced prompt with repository context
+    """
+    prompt = build_profiled_prompt(user_request, digest["profile"])
+    if digest.get("style_guide"):
+        prompt += f"\n\nProject Style Guide:\n{digest['style_guide']}"
+    excerpts = retrieve_repo_excerpts(digest, user_request)
+    if excerpts:
+        prompt += f"\n\nRelevant Code Excerpts:\n{excerpts}"
+    return prompt
+
+
+def enhance_prompt_with_repo_context(user_request: str, repo_data: dict, use_llm: Optional[bool] = None) -> str:
+    """
+    Enhance mockup request with repository context
+    
+    Args:
+        user_request: Original user request for mockup
+        repo_data: Repository analysis data
+        use_llm: Whether to include a Nemotron-distilled style guide (default: REPO_LLM_ENHANCEMENT)
+    
+    Returns:
+        Enhanced prompt with repository context
+    """
+    return apply_repo_digest(user_request, build_repo_digest(repo_data, use_llm))
+
+
+def get_repo_digest(
+    owner: str,
+    repo_name: str,
+    github_token: Optional[str] = None,
+    use_llm: Optional[bool] = None,
+    deadline: Optional[Deadline] = None
+) -> dict:
+    """
+    Get the digest of a repository at its current default branch head, computing it only when the head moved
+    
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        github_token: Optional GitHub personal access token
+        use_llm: Whether the digest includes a Nemotron-distilled style guide (default: REPO_LLM_ENHANCEMENT)
+        deadline: Request deadline for the GitHub and Nemotron calls (optional)
+    
+    Returns:
+        Digest from build_repo_digest
+    """
+    if use_llm is None:
+        use_llm = LLM_ENHANCEMENT
+    repo = f"{owner}/{repo_name}"
+    mode = "llm" if use_llm else "local"
+    
+    sha = resolve_head(owner, repo_name, github_token, deadline)
+    
+    if sha:
+        digest = load_digest(repo, sha, mode)
+        if digest and digest.get("version") == DIGEST_VERSION:
+            print(f"Using cached digest for {repo}@{sha[:7]}")
+            return digest
+    
+    # The snapshot store is shared with the other repository callers, so the files may already be local
+    repo_data = get_repo_snapshot(owner, repo_name, github_token, deadline, sha)
+    
+    # A snapshot patched from an older commit only invalidates the parts of that commit's digest it changed
+    previous = None
+    if repo_data.get("refreshed_from"):
+        previous = load_digest(repo, repo_data["refreshed_from"]["sha"], mode)
+    if previous and previous.get("version") == DIGEST_VERSION:
+        digest = update_repo_digest(previous, repo_data, use_llm, deadline)
+    else:
+        digest = build_repo_digest(repo_data, use_llm, deadline)
+    
+    # Incomplete analyses and failed distillations are recomputed on the next request
+    complete = not repo_data.get("missing_sources") and (digest["style_guide"] or not use_llm)
+    if sha and complete:
+        save_digest(repo, sha, mode, digest)
+    return digest
+
+
+REPO_MOCKUP_SYSTEM_MESSAGE = """You are an expert UI/UX designer and frontend developer. Generate complete, production-ready HTML mockups based on user requirements.
 
 Your mockups should:
 1. Be fully self-contained with inline CSS (no external dependencies)
@@ -196,26 +357,106 @@ Your mockups should:
 9. Align with the technology stack and patterns specified in the request
 
 Return ONLY the complete HTML code, no explanations or markdown formatting."""
+
+
+def clean_html_response(html_content: str) -> str:
+    """
+    Strip reasoning tags and markdown code fences from a generated HTML response
+    
+    Args:
+        html_content: Raw model output
+    
+    Returns:
+        Cleaned HTML content
+    """
+    if '<think>' in html_content:
+        start_idx = html_content.find('<think>')
+        end_idx = html_content.find('</think>') + len('</think>')
+        html_content = html_content[:start_idx] + html_content[end_idx:]
+        html_content = html_content.strip()
+    
+    # Remove markdown code blocks if present
+    if '```html' in html_content:
+        html_content = html_content.split('```html')[1].split('```')[0].strip()
+    elif '```' in html_content:
+        html_content = html_content.split('```')[1].split('```')[0].strip()
+    
+    return html_content
+
+
+def prepare_repo_enhanced_prompts(
+    github_repo_url: str,
+    mockup_requests: List[str],
+    github_token: Optional[str] = None,
+    use_llm_enhancement: Optional[bool] = None,
+    deadline: Optional[Deadline] = None
+) -> List[str]:
+    """
+    Enhance several mockup requests with the context of one repository.
+    
+    The repository digest is cached per commit, so the repository is only analyzed again
+    when its default branch head moves.
+    
+    Args:
+        github_repo_url: GitHub repository URL (e.g., 'https://github.com/owner/repo' or 'owner/repo')
+        mockup_requests: User mockup requests to enhance
+        github_token: Optional GitHub personal access token (uses GITHUB_TOKEN env var if not provided)
+        use_llm_enhancement: Whether the digest includes a Nemotron-distilled style guide (default: REPO_LLM_ENHANCEMENT)
+        deadline: Request deadline for the GitHub and Nemotron calls (optional)
+    
+    Returns:
+        Enhanced prompts in the same order as mockup_requests
+    """
+    # Parse GitHub URL
+    owner, repo_name = parse_github_url(github_repo_url)
+    
+    if not owner or not repo_name:
+        raise ValueError(f"Invalid GitHub repository URL: {github_repo_url}. Expected format: 'https://github.com/owner/repo' or 'owner/repo'")
+    
+    digest = get_repo_digest(owner, repo_name, github_token, use_llm_enhancement, deadline)
+    
+    # Combining the digest with each request is plain string work
+    enhanced_prompts = [apply_repo_digest(mockup_request, digest) for mockup_request in mockup_requests]
+    
+    for enhanced_prompt in enhanced_prompts:
+        print(f"Enhanced prompt generated (length: {len(enhanced_prompt)} characters)")
+    
+    return enhanced_prompts
+
+
+def generate_mockup_from_repo(
+    github_repo_url: str,
+    mockup_request: str,
+    github_token: Optional[str] = None,
+    use_llm_enhancement: Optional[bool] = None,
+    deadline: Optional[Deadline] = None
+) -> str:
+    """
+    Generate a mockup by analyzing a GitHub repository and enhancing the request with repository context.
+    
+    Args:
+        github_repo_url: GitHub repository URL (e.g., 'https://github.com/owner/repo' or 'owner/repo')
+        mockup_request: User's original mockup request/description
+        github_token: Optional GitHub personal access token (uses GITHUB_TOKEN env var if not provided)
+        use_llm_enhancement: Whether the digest includes a Nemotron-distilled style guide (default: REPO_LLM_ENHANCEMENT)
+        deadline: Request deadline for the GitHub and Nemotron calls (optional)
+    
+    Returns:
+        Generated HTML mockup content
+    """
+    try:
+        enhanced_prompt = prepare_repo_enhanced_prompts(
+            github_repo_url, [mockup_request], github_token, use_llm_enhancement, deadline
+        )[0]
         
-        html_content = call_nvidia_nemotron(enhanced_prompt, system_message)
-        
-        # Clean up the response
-        if '<think>' in html_content:
-            start_idx = html_content.find('<think>')
-            end_idx = html_content.find('</think>') + len('</think>')
-            html_content = html_content[:start_idx] + html_content[end_idx:]
-            html_content = html_content.strip()
-        
-        # Remove markdown code blocks if present
-        if '```html' in html_content:
-            html_content = html_content.split('```html')[1].split('```')[0].strip()
-        elif '```' in html_content:
-            html_content = html_content.split('```')[1].split('```')[0].strip()
+        # Generate mockup using Nemotron
+        html_content = call_nvidia_nemotron(enhanced_prompt, REPO_MOCKUP_SYSTEM_MESSAGE, deadline=deadline)
         
-        return html_content
+        return clean_html_response(html_content)
     
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         error_message = f"Error generating mockup from repository: {str(e)}"
         print(error_message)
         raise Exception(error_message)
-
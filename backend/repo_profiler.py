@@ -0,0 +1,219 @@
+"""
+Deterministic local repository profiler.
+Extracts a compact tech-stack and design-token summary from fetched repository files,
+so repo-aware generation does not need a model call to infer facts that can be parsed.
+"""
+import json
+import os
+import re
+from collections import Counter
+from typing import Dict, List
+
+# npm packages worth naming, mapped to display names
+NPM_FRAMEWORKS = {
+    'react': 'React', 'next': 'Next.js', 'vue': 'Vue', 'nuxt': 'Nuxt', 'svelte': 'Svelte',
+    '@sveltejs/kit': 'SvelteKit', '@angular/core': 'Angular', 'solid-js': 'SolidJS', 'preact': 'Preact',
+    'gatsby': 'Gatsby', 'remix': 'Remix', '@remix-run/react': 'Remix', 'astro': 'Astro',
+    'express': 'Express', 'typescript': 'TypeScript', 'vite': 'Vite', 'react-scripts': 'Create React App',
+    'redux': 'Redux', '@reduxjs/toolkit': 'Redux Toolkit', 'react-router-dom': 'React Router',
+    'react-native': 'React Native', 'electron': 'Electron',
+}
+NPM_UI_LIBRARIES = {
+    'tailwindcss': 'Tailwind CSS', 'bootstrap': 'Bootstrap', 'react-bootstrap': 'React Bootstrap',
+    '@mui/material': 'Material UI', '@material-ui/core': 'Material UI', 'antd': 'Ant Design',
+    '@chakra-ui/react': 'Chakra UI', 'styled-components': 'styled-components', '@emotion/react': 'Emotion',
+    'sass': 'Sass', 'less': 'Less', 'bulma': 'Bulma', '@headlessui/react': 'Headless UI',
+    '@radix-ui/react-dialog': 'Radix UI', 'framer-motion': 'Framer Motion', 'lucide-react': 'Lucide icons',
+    'react-icons': 'React Icons', '@fortawesome/fontawesome-free': 'Font Awesome',
+    'chart.js': 'Chart.js', 'recharts': 'Recharts', 'd3': 'D3',
+}
+# Python packages worth naming, mapped to display names
+PYTHON_FRAMEWORKS = {
+    'flask': 'Flask', 'django': 'Django', 'fastapi': 'FastAPI', 'streamlit': 'Streamlit',
+    'gradio': 'Gradio', 'dash': 'Dash', 'tornado': 'Tornado', 'aiohttp': 'aiohttp',
+    'sqlalchemy': 'SQLAlchemy', 'celery': 'Celery', 'pandas': 'pandas', 'jinja2': 'Jinja2',
+}
+
+MAX_COLORS = 12
+MAX_CSS_VARIABLES = 20
+MAX_FONTS = 5
+MAX_COMPONENTS = 25
+
+_CSS_VARIABLE = re.compile(r'(--[A-Za-z0-9_-]+)\s*:\s*([^;}{]+)')
+_COLOR = re.compile(r'#[0-9a-fA-F]{6}\b|#[0-9a-fA-F]{3}\b|\b(?:rgba?|hsla?)\([^)]*\)')
+_FONT_FAMILY = re.compile(r'font-family\s*:\s*([^;}{]+)')
+_STYLE_BLOCK = re.compile(r'<style[^>]*>(.*?)</style>', re.DOTALL | re.IGNORECASE)
+_COMPONENT = re.compile(
+    r'(?:^|\n)\s*(?:export\s+)?(?:default\s+)?(?:function|class|const)\s+([A-Z][A-Za-z0-9]*)\b'
+)
+_REQUIREMENT_NAME = re.compile(r'^\s*([A-Za-z0-9_.\-]+)')
+
+
+def _basename(file_path: str) -> str:
+    return os.path.basename(file_path).lower()
+
+
+def _parse_package_json(content: str) -> Dict[str, str]:
+    try:
+        package = json.loads(content)
+    except (ValueError, TypeError):
+        return {}
+    if not isinstance(package, dict):
+        return {}
+    dependencies = {}
+    for key in ('dependencies', 'devDependencies', 'peerDependencies'):
+        if isinstance(package.get(key), dict):
+            dependencies.update(package[key])
+    return dependencies
+
+
+def _parse_requirements(content: str) -> List[str]:
+    packages = []
+    for line in content.splitlines():
+        line = line.split('#', 1)[0]
+        if not line.strip() or line.strip().startswith('-'):
+            continue
+        match = _REQUIREMENT_NAME.match(line)
+        if match:
+            packages.append(match.group(1).lower().replace('_', '-'))
+    return packages
+
+
+def _normalize_color(color: str) -> str:
+    color = color.strip().lower()
+    if re.fullmatch(r'#[0-9a-f]{3}', color):
+        color = '#' + ''.join(c * 2 for c in color[1:])
+    return re.sub(r'\s+', '', color)
+
+
+def profile_repository(repo_data: Dict) -> Dict:
+    """
+    Build a structured tech-stack and design-token profile from repository analysis data
+
+    Args:
+        repo_data: Result of analyze_repo_for_mockup (repo_info, readme, relevant_files)
+
+    Returns:
+        Dictionary with project facts, frameworks, UI libraries, Python packages,
+        CSS variables, colors, fonts and component names
+    """
+    repo_info = repo_data.get('repo_info') or {}
+    relevant_files = repo_data.get('relevant_files') or {}
+
+    frameworks = []
+    ui_libraries = []
+    python_frameworks = []
+    css_variables = {}
+    colors = Counter()
+    fonts = Counter()
+    components = []
+
+    def add(items: List[str], value: str):
+        if value not in items:
+            items.append(value)
+
+    for file_path, content in relevant_files.items():
+        if not content:
+            continue
+        name = _basename(file_path)
+        extension = os.path.splitext(name)[1]
+
+        if name == 'package.json':
+            for package in _parse_package_json(content):
+                if package in NPM_FRAMEWORKS:
+                    add(frameworks, NPM_FRAMEWORKS[package])
+                elif package in NPM_UI_LIBRARIES:
+                    add(ui_libraries, NPM_UI_LIBRARIES[package])
+        elif name == 'requirements.txt':
+            for package in _parse_requirements(content):
+                if package in PYTHON_FRAMEWORKS:
+                    add(python_frameworks, PYTHON_FRAMEWORKS[package])
+
+        styles = ''
+        if extension in ('.css', '.scss', '.less'):
+            styles = content
+        elif extension in ('.html', '.htm'):
+            styles = '\n'.join(_STYLE_BLOCK.findall(content))
+        if styles:
+            for variable, value in _CSS_VARIABLE.findall(styles):
+                css_variables.setdefault(variable, value.strip())
+            colors.update(_normalize_color(c) for c in _COLOR.findall(styles))
+            fonts.update(re.sub(r'\s*!important\s*$', '', f.strip()) for f in _FONT_FAMILY.findall(styles))
+
+        if extension in ('.jsx', '.tsx') or (extension in ('.js', '.ts') and '/components/' in file_path.lower()):
+            for component in _COMPONENT.findall(content):
+                add(components, component)
+
+    return {
+        'name': repo_info.get('name'),
+        'description': repo_info.get('description'),
+        'language': repo_info.get('language'),
+        'topics': repo_info.get('topics', []),
+        'frameworks': frameworks,
+        'ui_libraries': ui_libraries,
+        'python_frameworks': python_frameworks,
+        'css_variables': dict(list(css_variables.items())[:MAX_CSS_VARIABLES]),
+        'colors': [color for color, _ in colors.most_common(MAX_COLORS)],
+        'fonts': [font for font, _ in fonts.most_common(MAX_FONTS)],
+        'components': components[:MAX_COMPONENTS],
+    }
+
+
+def format_profile(profile: Dict) -> str:
+    """
+    Render a repository profile as a compact text block for prompts
+
+    Args:
+        profile: Result of profile_repository
+
+    Returns:
+        Multi-line summary ('' if the profile has no facts)
+    """
+    lines = []
+    if profile.get('name'):
+        lines.append(f"- Project: {profile['name']}")
+    if profile.get('description'):
+        lines.append(f"- Description: {profile['description']}")
+    if profile.get('language'):
+        lines.append(f"- Primary language: {profile['language']}")
+    if profile.get('topics'):
+        lines.append(f"- Topics: {', '.join(profile['topics'])}")
+    if profile.get('frameworks'):
+        lines.append(f"- Frameworks: {', '.join(profile['frameworks'])}")
+    if profile.get('ui_libraries'):
+        lines.append(f"- UI / styling libraries: {', '.join(profile['ui_libraries'])}")
+    if profile.get('python_frameworks'):
+        lines.append(f"- Backend (Python): {', '.join(profile['python_frameworks'])}")
+    if profile.get('css_variables'):
+        variables = '; '.join(f"{name}: {value}" for name, value in profile['css_variables'].items())
+        lines.append(f"- CSS variables: {variables}")
+    if profile.get('colors'):
+        lines.append(f"- Color palette (most used first): {', '.join(profile['colors'])}")
+    if profile.get('fonts'):
+        lines.append(f"- Fonts: {' | '.join(profile['fonts'])}")
+    if profile.get('components'):
+        lines.append(f"- Existing components: {', '.join(profile['components'])}")
+    return '\n'.join(lines)
+
+
+def build_profiled_prompt(user_request: str, profile: Dict) -> str:
+    """
+    Build a repo-aware mockup prompt directly from a repository profile
+
+    Args:
+        user_request: Original user request for the mockup
+        profile: Result of profile_repository
+
+    Returns:
+        Mockup prompt with the repository's stack and design tokens
+    """
+    summary = format_profile(profile)
+    if not summary:
+        return user_request
+    return f"""{user_request}
+
+Repository Context:
+{summary}
+
+Match this project's look and conventions: use its color palette and CSS variables, its fonts,
+and mirror its existing components where they fit the request."""
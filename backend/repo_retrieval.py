@@ -0,0 +1,204 @@
+"""
+BM25 retrieval over chunked repository files.
+Selects the file excerpts most relevant to a mockup request within a token budget,
+instead of sending whichever files the directory walk happened to reach first.
+"""
+import math
+import re
+from collections import Counter
+from typing import Dict, List
+
+import metrics
+from context_packer import count_tokens
+
+# Target size of one chunk
+CHUNK_TOKENS = 200
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 'have', 'i', 'in', 'is', 'it',
+    'its', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'we', 'with', 'you', 'your', 'me', 'my',
+    'create', 'make', 'build', 'page', 'mockup', 'please', 'should', 'can', 'will', 'want', 'need',
+    'const', 'let', 'var', 'return', 'import', 'export', 'default', 'function', 'new', 'null', 'true', 'false',
+}
+
+_WORD = re.compile(r'[A-Za-z][a-z]+|[A-Z]+(?![a-z])|[0-9]+')
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase terms, breaking camelCase, snake_case and kebab-case identifiers
+
+    Args:
+        text: Text or code to tokenize
+
+    Returns:
+        List of terms without stopwords and single characters
+    """
+    terms = []
+    for word in _WORD.findall(text or ''):
+        word = word.lower()
+        if len(word) > 1 and word not in STOPWORDS:
+            terms.append(word)
+    return terms
+
+
+def chunk_file(file_path: str, content: str, chunk_tokens: int = CHUNK_TOKENS) -> List[Dict]:
+    """
+    Split a file into chunks of whole lines of roughly chunk_tokens tokens
+
+    Args:
+        file_path: Path of the file in the repository
+        content: File content
+        chunk_tokens: Target tokens per chunk
+
+    Returns:
+        List of chunks {'path', 'start_line', 'text', 'tokens'} (start_line is 1-based)
+    """
+    chunks = []
+    lines = []
+    tokens = 0
+    start_line = 1
+    for number, line in enumerate((content or '').splitlines(), start=1):
+        line_tokens = count_tokens(line) + 1
+        if lines and tokens + line_tokens > chunk_tokens:
+            chunks.append({'path': file_path, 'start_line': start_line, 'text': '\n'.join(lines), 'tokens': tokens})
+            lines, tokens, start_line = [], 0, number
+        lines.append(line)
+        tokens += line_tokens
+    if lines and any(line.strip() for line in lines):
+        chunks.append({'path': file_path, 'start_line': start_line, 'text': '\n'.join(lines), 'tokens': tokens})
+    return chunks
+
+
+class BM25Index:
+    """
+    BM25 index over repository file chunks; serializable so it can be stored with the repository digest.
+    """
+
+    def __init__(self, chunks: List[Dict], term_frequencies: List[Dict[str, int]]):
+        self.chunks = chunks
+        self._term_frequencies = term_frequencies
+        self._lengths = [sum(tf.values()) for tf in term_frequencies]
+        self._average_length = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        document_frequency = Counter()
+        for tf in term_frequencies:
+            document_frequency.update(tf.keys())
+        count = len(term_frequencies)
+        self._idf = {
+            term: math.log(1 + (count - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+    @classmethod
+    def build(cls, relevant_files: Dict[str, str]) -> 'BM25Index':
+        """
+        Chunk and index repository files
+
+        Args:
+            relevant_files: Dictionary mapping file paths to content
+
+        Returns:
+            Built index
+        """
+        chunks = []
+        for file_path, content in relevant_files.items():
+            chunks.extend(chunk_file(file_path, content))
+        # The path is part of every chunk's terms, so "login form" finds LoginForm.jsx
+        term_frequencies = [dict(Counter(tokenize(chunk['path']) + tokenize(chunk['text']))) for chunk in chunks]
+        return cls(chunks, term_frequencies)
+
+    def update(self, changed_files: Dict[str, str], removed_paths: List[str]) -> 'BM25Index':
+        """
+        Build an index with changed files re-chunked and removed files dropped, reusing all other chunks
+
+        Args:
+            changed_files: Dictionary mapping added or modified file paths to their new content
+            removed_paths: Paths of files no longer in the repository snapshot
+
+        Returns:
+            Updated index
+        """
+        stale = set(changed_files) | set(removed_paths)
+        kept = [index for index, chunk in enumerate(self.chunks) if chunk['path'] not in stale]
+        added = BM25Index.build(changed_files)
+        return BM25Index(
+            [self.chunks[index] for index in kept] + added.chunks,
+            [self._term_frequencies[index] for index in kept] + added._term_frequencies
+        )
+
+    def to_dict(self) -> Dict:
+        """Serialize the index to JSON-compatible data"""
+        return {'chunks': self.chunks, 'term_frequencies': self._term_frequencies}
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'BM25Index':
+        """Load an index serialized with to_dict"""
+        return cls(data['chunks'], data['term_frequencies'])
+
+    def search(self, query: str) -> List[tuple]:
+        """
+        Score chunks against a query
+
+        Args:
+            query: Mockup request or question
+
+        Returns:
+            List of (score, chunk index) with positive scores, best first
+        """
+        terms = set(tokenize(query))
+        results = []
+        for index, tf in enumerate(self._term_frequencies):
+            score = 0.0
+            length_norm = K1 * (1 - B + B * self._lengths[index] / self._average_length) if self._average_length else K1
+            for term in terms:
+                frequency = tf.get(term)
+                if frequency:
+                    score += self._idf[term] * frequency * (K1 + 1) / (frequency + length_norm)
+            if score > 0:
+                results.append((score, index))
+        results.sort(key=lambda r: (-r[0], r[1]))
+        return results
+
+    def retrieve(self, query: str, budget: int) -> List[Dict]:
+        """
+        Pick the most relevant chunks that fit a token budget
+
+        Args:
+            query: Mockup request or question
+            budget: Maximum total tokens of the returned chunks
+
+        Returns:
+            Selected chunks, grouped by file and in file order
+        """
+        selected = []
+        used = 0
+        for _, index in self.search(query):
+            chunk = self.chunks[index]
+            if used + chunk['tokens'] > budget:
+                continue
+            selected.append(index)
+            used += chunk['tokens']
+
+        metrics.increment('retrieval.queries')
+        metrics.increment('retrieval.chunks_selected', len(selected))
+        metrics.increment('retrieval.tokens_selected', used)
+        return [self.chunks[index] for index in sorted(selected, key=lambda i: (self.chunks[i]['path'], self.chunks[i]['start_line']))]
+
+
+def format_chunks(chunks: List[Dict]) -> str:
+    """
+    Render retrieved chunks as labelled excerpts for a prompt
+
+    Args:
+        chunks: Chunks from BM25Index.retrieve
+
+    Returns:
+        Excerpt text ('' if there are no chunks)
+    """
+    return '\n\n'.join(
+        f"{chunk['path']} (from line {chunk['start_line']}):\n{chunk['text']}"
+        for chunk in chunks
+    )
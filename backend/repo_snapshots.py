@@ -0,0 +1,352 @@
+"""
+On-disk store of repository snapshots (metadata, README and selected files) per commit SHA.
+Shared by every caller that analyzes a repository (Flask backend and MCP server), so analyzing a repository
+whose default branch has not moved is a local read after one cheap head lookup.
+"""
+import json
+import os
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+import metrics
+from deadline import Deadline, DeadlineExceeded
+from github_integration import (
+    ANALYSIS_FILE_PATTERNS, ANALYSIS_MAX_FILES, FETCH_MODE, FETCH_MODES, TARBALL_MAX_FILES,
+    analyze_repo_for_mockup, compare_commits, fetch_files, get_default_branch_head, get_repo_info,
+    get_repo_readme, get_repo_tree, select_tree_files
+)
+
+SNAPSHOT_DIR = Path('data') / 'repo_snapshots'
+# Disk space used by snapshots before the least recently used ones are evicted
+DISK_BUDGET_BYTES = int(float(os.environ.get('REPO_SNAPSHOT_BUDGET_MB', '200')) * 1024 * 1024)
+# Bumped when the snapshot format changes, so older snapshots are ignored
+SNAPSHOT_VERSION = 1
+# The compare API lists at most 300 changed files; larger changes are re-analyzed from scratch
+COMPARE_FILE_LIMIT = 300
+# Directories the /readme endpoint looks in, and README file names (README, README.md, readme.rst, ...)
+README_DIRECTORIES = {'', '.github', 'docs'}
+_README_NAME = re.compile(r'^readme(\.\w+)?$', re.IGNORECASE)
+
+_evict_lock = threading.Lock()
+
+
+def _snapshot_path(owner: str, repo_name: str, sha: str, fetch_mode: str) -> Path:
+    return SNAPSHOT_DIR / f"{owner.lower()}__{repo_name.lower()}__{sha}__{fetch_mode}.json"
+
+
+def load_snapshot(owner: str, repo_name: str, sha: str, fetch_mode: str = FETCH_MODE) -> Optional[Dict]:
+    """
+    Load the snapshot of a repository at a commit, marking it as recently used
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        sha: Commit SHA
+        fetch_mode: File fetch mode the snapshot was built with ("api" or "tarball")
+
+    Returns:
+        Snapshot with 'sha', 'repo_info', 'readme' and 'relevant_files', or None if not stored
+    """
+    path = _snapshot_path(owner, repo_name, sha, fetch_mode)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        os.utime(path)
+    except (OSError, ValueError):
+        snapshot = None
+    if snapshot and snapshot.get('version') != SNAPSHOT_VERSION:
+        snapshot = None
+
+    metrics.increment('repo_snapshot.hits' if snapshot else 'repo_snapshot.misses')
+    return snapshot
+
+
+def save_snapshot(owner: str, repo_name: str, sha: str, repo_data: Dict, fetch_mode: str = FETCH_MODE) -> None:
+    """
+    Store the snapshot of a repository at a commit, then evict snapshots beyond the disk budget
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        sha: Commit SHA the data was read at
+        repo_data: Result of analyze_repo_for_mockup
+        fetch_mode: File fetch mode the data was built with ("api" or "tarball")
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'repo': f"{owner}/{repo_name}",
+        'sha': sha,
+        'fetch_mode': fetch_mode,
+        'repo_info': repo_data.get('repo_info', {}),
+        'readme': repo_data.get('readme'),
+        'relevant_files': repo_data.get('relevant_files', {}),
+        'created_at': datetime.now().isoformat(),
+    }
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    path = _snapshot_path(owner, repo_name, sha, fetch_mode)
+    # Write to a temporary file first so concurrent readers never see a partial snapshot
+    temp_path = path.with_suffix(f'.{threading.get_ident()}.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f)
+    os.replace(temp_path, path)
+    metrics.increment('repo_snapshot.saves')
+    evict_snapshots()
+
+
+def evict_snapshots(budget: int = DISK_BUDGET_BYTES) -> int:
+    """
+    Delete the least recently used snapshots until the store fits the disk budget
+
+    Args:
+        budget: Maximum total size in bytes
+
+    Returns:
+        Number of snapshots deleted
+    """
+    with _evict_lock:
+        if not SNAPSHOT_DIR.exists():
+            return 0
+        files = []
+        for path in SNAPSHOT_DIR.glob('*.json'):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in files)
+        evicted = 0
+        for _, size, path in sorted(files):
+            if total <= budget:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            evicted += 1
+    if evicted:
+        metrics.increment('repo_snapshot.evictions', evicted)
+    return evicted
+
+
+def resolve_head(owner: str, repo_name: str, token: Optional[str] = None,
+                 deadline: Optional[Deadline] = None) -> Optional[str]:
+    """
+    Resolve the default branch head, returning None (instead of raising) if it cannot be looked up
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional)
+
+    Returns:
+        Commit SHA or None
+    """
+    try:
+        return get_default_branch_head(owner, repo_name, token, deadline)
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        print(f"Could not resolve head of {owner}/{repo_name}: {str(e)}")
+        return None
+
+
+def find_snapshot(owner: str, repo_name: str, token: Optional[str] = None,
+                  deadline: Optional[Deadline] = None) -> Optional[Dict]:
+    """
+    Return a stored snapshot (any fetch mode) at the current head without analyzing the repository if there is none
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional)
+
+    Returns:
+        Snapshot or None
+    """
+    sha = resolve_head(owner, repo_name, token, deadline)
+    if not sha:
+        return None
+    for fetch_mode in FETCH_MODES:
+        snapshot = load_snapshot(owner, repo_name, sha, fetch_mode)
+        if snapshot:
+            return snapshot
+    return None
+
+
+def latest_snapshot(owner: str, repo_name: str, fetch_mode: str = FETCH_MODE) -> Optional[Dict]:
+    """
+    Load the most recently used snapshot of a repository at any commit
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        fetch_mode: File fetch mode the snapshot was built with
+
+    Returns:
+        Snapshot or None if the repository has none
+    """
+    repo = f"{owner}/{repo_name}".lower()
+    pattern = f"{owner.lower()}__{repo_name.lower()}__*__{fetch_mode}.json"
+    paths = sorted(SNAPSHOT_DIR.glob(pattern), key=lambda p: p.stat().st_mtime, reverse=True) if SNAPSHOT_DIR.exists() else []
+    for path in paths:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if snapshot.get('version') == SNAPSHOT_VERSION and snapshot.get('repo', '').lower() == repo:
+            return snapshot
+    return None
+
+
+def is_readme_path(file_path: str) -> bool:
+    """Check whether a changed file may be the README served by the /readme endpoint"""
+    directory, name = os.path.split(file_path)
+    return directory.lower() in README_DIRECTORIES and bool(_README_NAME.match(name))
+
+
+def refresh_snapshot(owner: str, repo_name: str, previous: Dict, sha: str, token: Optional[str] = None,
+                     deadline: Optional[Deadline] = None, fetch_mode: str = FETCH_MODE) -> Optional[Dict]:
+    """
+    Bring an older snapshot up to a new commit, fetching only selected files that changed or are newly selected
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        previous: Snapshot at an older commit
+        sha: New head commit SHA
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional)
+        fetch_mode: File fetch mode of the snapshot
+
+    Returns:
+        Repository data like get_repo_snapshot plus 'refreshed_from' ({'sha', 'changed', 'removed',
+        'readme_changed'}), or None if the change cannot be applied incrementally
+    """
+    comparison = compare_commits(owner, repo_name, previous['sha'], sha, token, deadline)
+    # Only a head that moved forward can be patched; a force push or revert needs a full analysis
+    if comparison['status'] not in ('ahead', 'identical') or len(comparison['files']) >= COMPARE_FILE_LIMIT:
+        return None
+
+    # Select from the new tree exactly as a full analysis would, then fetch only the selected files
+    # that changed or were not in the previous snapshot
+    max_files = TARBALL_MAX_FILES if fetch_mode == 'tarball' else ANALYSIS_MAX_FILES
+    tree = get_repo_tree(owner, repo_name, sha, token, deadline)
+    selected = [entry['path'] for entry in select_tree_files(tree, ANALYSIS_FILE_PATTERNS, max_files)]
+    changed_paths = {f['filename'] for f in comparison['files'] if f['status'] != 'removed'}
+    previous_files = previous['relevant_files']
+    to_fetch = [path for path in selected if path in changed_paths or path not in previous_files]
+
+    fetched = fetch_files(owner, repo_name, to_fetch, token, deadline, sha)
+    if len(fetched) < len(to_fetch):
+        # A stale copy of a changed file must not survive, so fall back to a full analysis
+        return None
+    relevant_files = {path: fetched[path] if path in fetched else previous_files[path] for path in selected}
+    removed = [path for path in previous_files if path not in relevant_files]
+
+    # Repository metadata is not part of the commit; it is a conditional request, so unchanged metadata is free
+    repo_info = get_repo_info(owner, repo_name, token, deadline)
+    readme_changed = any(
+        is_readme_path(f['filename']) or is_readme_path(f.get('previous_filename') or '') for f in comparison['files']
+    )
+    readme = get_repo_readme(owner, repo_name, token, deadline) if readme_changed else previous['readme']
+
+    metrics.increment('repo_snapshot.refreshes')
+    metrics.increment('repo_snapshot.refreshed_files', len(fetched) + len(removed))
+    return {
+        'sha': sha,
+        'repo_info': repo_info,
+        'readme': readme,
+        'relevant_files': relevant_files,
+        'missing_sources': [],
+        'refreshed_from': {
+            'sha': previous['sha'],
+            'changed': list(fetched),
+            'removed': removed,
+            'readme_changed': readme_changed,
+        },
+    }
+
+
+def get_repo_snapshot(owner: str, repo_name: str, token: Optional[str] = None,
+                      deadline: Optional[Deadline] = None, sha: Optional[str] = None,
+                      fetch_mode: str = FETCH_MODE) -> Dict:
+    """
+    Get repository data at the current default branch head, analyzing the repository only if it is not stored
+
+    Args:
+        owner: Repository owner
+        repo_name: Repository name
+        token: GitHub personal access token (optional)
+        deadline: Request deadline (optional)
+        sha: Already resolved head SHA (optional, looked up if not provided)
+        fetch_mode: "api" (per-file requests) or "tarball" (one streamed archive with broader file coverage)
+
+    Returns:
+        Dictionary with 'sha' (None if the head could not be resolved), 'repo_info', 'readme',
+        'relevant_files' and 'missing_sources', plus 'refreshed_from' if an older snapshot was patched
+    """
+    sha = sha or resolve_head(owner, repo_name, token, deadline)
+    if sha:
+        snapshot = load_snapshot(owner, repo_name, sha, fetch_mode)
+        if snapshot:
+            print(f"Using repository snapshot {owner}/{repo_name}@{sha[:7]}")
+            snapshot['missing_sources'] = []
+            return snapshot
+
+        # When the head moved, patch the latest snapshot with just the changed files
+        previous = latest_snapshot(owner, repo_name, fetch_mode)
+        if previous:
+            try:
+                refreshed = refresh_snapshot(owner, repo_name, previous, sha, token, deadline, fetch_mode)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                print(f"Incremental refresh failed, analyzing from scratch: {str(e)}")
+                refreshed = None
+            if refreshed:
+                print(f"Refreshed snapshot {owner}/{repo_name} {previous['sha'][:7]}..{sha[:7]}")
+                try:
+                    save_snapshot(owner, repo_name, sha, refreshed, fetch_mode)
+                except OSError as e:
+                    print(f"Could not store repository snapshot: {str(e)}")
+                return refreshed
+
+    print(f"Analyzing repository: {owner}/{repo_name}")
+    repo_data = analyze_repo_for_mockup(owner, repo_name, "", token, deadline, ref=sha or "HEAD", fetch_mode=fetch_mode)
+    print(f"Repository analyzed. Found {len(repo_data['relevant_files'])} relevant files.")
+    # Incomplete analyses are not stored, so the next request tries again
+    if sha and not repo_data.get('missing_sources'):
+        try:
+            save_snapshot(owner, repo_name, sha, repo_data, fetch_mode)
+        except OSError as e:
+            print(f"Could not store repository snapshot: {str(e)}")
+    repo_data['sha'] = sha
+    return repo_data
+
+
+def get_stats() -> Dict:
+    """
+    Report snapshot store usage
+
+    Returns:
+        Dictionary with hit, miss, save, eviction and refresh counts, hit ratio and disk usage
+    """
+    sizes = [path.stat().st_size for path in SNAPSHOT_DIR.glob('*.json')] if SNAPSHOT_DIR.exists() else []
+    hits = metrics.get_counter('repo_snapshot.hits')
+    misses = metrics.get_counter('repo_snapshot.misses')
+    return {
+        'hits': hits,
+        'misses': misses,
+        'saves': metrics.get_counter('repo_snapshot.saves'),
+        'evictions': metrics.get_counter('repo_snapshot.evictions'),
+        'refreshes': metrics.get_counter('repo_snapshot.refreshes'),
+        'refreshed_files': metrics.get_counter('repo_snapshot.refreshed_files'),
+        'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+        'snapshots': len(sizes),
+        'disk_bytes': sum(sizes),
+        'disk_budget_bytes': DISK_BUDGET_BYTES,
+    }
@@ -0,0 +1,271 @@
+"""
+Speculative mockup generation for the chat flow.
+Builds a mockup from the suggested feature list while the user is still reading the suggestions.
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import metrics
+
+# Words that may appear in a reply that accepts the suggestions unchanged
+CONFIRMATION_WORDS = {
+    'yes', 'yeah', 'yep', 'yup', 'sure', 'ok', 'okay', 'k', 'proceed', 'go', 'ahead',
+    'create', 'build', 'make', 'generate', 'it', 'looks', 'look', 'sounds', 'good',
+    'great', 'perfect', 'fine', 'please', 'do', 'that', 'lets', 'let', 's', 'the',
+    'mockup', 'with', 'these', 'those', 'features', 'all', 'of', 'them', 'thanks',
+    'thank', 'you', 'awesome', 'cool', 'nice', 'love', 'alright', 'now', 'and', 'for',
+}
+
+# Words that only make sense in a confirmation
+CONFIRMATION_TRIGGERS = {
+    'yes', 'yeah', 'yep', 'yup', 'sure', 'ok', 'okay', 'k', 'proceed', 'ahead',
+    'good', 'great', 'perfect', 'fine', 'awesome', 'alright', 'create', 'build', 'generate',
+}
+
+
+# Words that signal the user wants something different from the suggestions
+MODIFICATION_WORDS = {
+    'but', 'change', 'add', 'remove', 'instead', 'without', 'except', 'modify', 'replace',
+    'also', 'no', 'not', 'don', 'dont', 'more', 'less', 'different', 'swap', 'rather',
+    'actually', 'wait', 'hold', 'stop', 'cancel', 'drop', 'skip', 'only', 'plus',
+}
+
+# Seconds a speculative build is kept for a conversation that never confirms or changes its request
+JOB_TTL_SECONDS = float(os.environ.get('SPECULATIVE_JOB_TTL_SECONDS', '900'))
+# Seconds between sweeps for expired builds
+SWEEP_INTERVAL_SECONDS = 60
+
+CONFIRM = 'confirm'
+MODIFY = 'modify'
+AMBIGUOUS = 'ambiguous'
+
+
+def _tokenize(message: str):
+    return re.findall(r"[a-z0-9]+", (message or '').lower())
+
+
+def classify_confirmation(message: str) -> str:
+    """
+    Classify a reply to suggestions without calling the model
+
+    Args:
+        message: User reply to a <SUGGESTIONS> message
+
+    Returns:
+        CONFIRM if it accepts the suggestions unchanged, MODIFY if it asks for changes,
+        AMBIGUOUS if the model should decide
+    """
+    tokens = _tokenize(message)
+    if not tokens:
+        return AMBIGUOUS
+    if any(t in MODIFICATION_WORDS for t in tokens) or len(tokens) > 12:
+        return MODIFY
+    if all(t in CONFIRMATION_WORDS for t in tokens) and any(t in CONFIRMATION_TRIGGERS for t in tokens):
+        return CONFIRM
+    return AMBIGUOUS
+
+
+def parse_suggestion_set(user_request: str, suggestions: str) -> Dict:
+    """
+    Store the suggestions as a structured spec the mockup can be generated from
+
+    Args:
+        user_request: The chat message that asked for something to be created
+        suggestions: Text of the <SUGGESTIONS> block
+
+    Returns:
+        Dictionary with the request, raw suggestion text and the bulleted feature list
+    """
+    features = []
+    for line in suggestions.splitlines():
+        match = re.match(r"^\s*(?:[-*\u2022]|\d+[.)])\s+(.*\S)", line)
+        if match:
+            features.append(match.group(1).strip())
+    return {
+        'request': user_request,
+        'suggestions': suggestions,
+        'features': features,
+    }
+
+
+def extract_tagged_block(text: str, tag: str) -> Optional[str]:
+    """
+    Extract the content between <TAG> and </TAG>
+
+    Args:
+        text: Model response
+        tag: Tag name without brackets (e.g., 'SUGGESTIONS')
+
+    Returns:
+        Stripped content, or None if the tag pair is missing
+    """
+    start_tag = f'<{tag}>'
+    end_tag = f'</{tag}>'
+    start_idx = text.find(start_tag)
+    end_idx = text.find(end_tag)
+    if start_idx == -1 or end_idx == -1 or end_idx < start_idx:
+        return None
+    return text[start_idx + len(start_tag):end_idx].strip()
+
+
+def build_speculative_spec(user_request: str, suggestions: str) -> str:
+    """
+    Build the mockup description for a suggestion set
+
+    Args:
+        user_request: The chat message that asked for something to be created
+        suggestions: Text of the <SUGGESTIONS> block
+
+    Returns:
+        Mockup description combining the request and suggested features
+    """
+    return f"""{user_request}
+
+Include these features for Version 1:
+{suggestions}"""
+
+
+def build_spec_from_suggestion_set(suggestion_set: Dict) -> str:
+    """Build the mockup description from a stored suggestion set"""
+    if suggestion_set.get('features'):
+        suggestions = '\n'.join(f"- {feature}" for feature in suggestion_set['features'])
+    else:
+        suggestions = suggestion_set.get('suggestions', '')
+    return build_speculative_spec(suggestion_set['request'], suggestions)
+
+
+class SpeculativeGenerator:
+    """
+    Runs one background mockup build per conversation.
+    Results are claimed on confirmation or discarded when the user changes the request.
+    """
+
+    def __init__(self, build_fn: Callable[[str], Dict], cleanup_fn: Callable[[Dict], None], max_workers: int = 2,
+                 ttl: float = JOB_TTL_SECONDS):
+        """
+        Args:
+            build_fn: Builds a prepared mockup (HTML and rendered files) from a spec
+            cleanup_fn: Removes the artifacts of a prepared mockup that will not be used
+            max_workers: Maximum concurrent speculative builds
+            ttl: Seconds after which an unclaimed build is discarded
+        """
+        self._build_fn = build_fn
+        self._cleanup_fn = cleanup_fn
+        self._ttl = ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='speculative')
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict] = {}
+        # Abandoned conversations never claim or discard their build, so expire them in the background
+        threading.Thread(target=self._sweep_loop, name='speculative-sweep', daemon=True).start()
+
+    def start(self, key: str, spec: str) -> None:
+        """
+        Start building a mockup for a conversation, replacing any earlier job
+
+        Args:
+            key: Conversation ID
+            spec: Mockup description to build
+        """
+        self.discard(key)
+        future = self._executor.submit(self._build_fn, spec)
+        with self._lock:
+            self._jobs[key] = {'spec': spec, 'future': future, 'started_at': time.monotonic()}
+        metrics.increment('speculative.started')
+        print(f"Started speculative mockup generation for conversation {key}")
+
+    def claim(self, key: str, timeout: Optional[float] = None) -> Optional[Dict]:
+        """
+        Take the speculative result for a conversation, waiting for it if still running
+
+        A build still queued behind other builds is cancelled instead, so the caller can build inline
+        rather than spend its time waiting for a free worker.
+
+        Args:
+            key: Conversation ID
+            timeout: Maximum seconds to wait (default: wait until done)
+
+        Returns:
+            Prepared mockup dictionary with the spec it was built from, or None if unavailable
+        """
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if not job:
+            return None
+
+        future: Future = job['future']
+        if future.cancel():
+            print(f"Speculative mockup for conversation {key} had not started; building it inline")
+            metrics.increment('speculative.cancelled_queued')
+            return None
+        try:
+            prepared = future.result(timeout=timeout)
+        except Exception as e:
+            print(f"Speculative mockup unavailable for conversation {key}: {str(e)}")
+            metrics.increment('speculative.failed')
+            future.add_done_callback(self._cleanup_future)
+            return None
+
+        metrics.increment('speculative.claimed')
+        return {**prepared, 'spec': job['spec']}
+
+    def discard(self, key: str) -> None:
+        """Drop the speculative job for a conversation and clean up its artifacts"""
+        with self._lock:
+            job = self._jobs.pop(key, None)
+        if not job:
+            return
+        future: Future = job['future']
+        metrics.increment('speculative.discarded')
+        if not future.cancel():
+            future.add_done_callback(self._cleanup_future)
+
+    def sweep(self) -> int:
+        """
+        Discard builds older than the TTL, removing their artifacts
+
+        Returns:
+            Number of builds discarded
+        """
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, job in self._jobs.items() if now - job['started_at'] > self._ttl]
+        for key in expired:
+            self.discard(key)
+        if expired:
+            metrics.increment('speculative.expired', len(expired))
+        return len(expired)
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(SWEEP_INTERVAL_SECONDS)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"Error sweeping speculative mockups: {str(e)}")
+
+    def _cleanup_future(self, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        try:
+            self._cleanup_fn(future.result())
+        except Exception as e:
+            print(f"Error cleaning up speculative mockup: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """Report speculative generation outcomes for the metrics endpoint"""
+        with self._lock:
+            pending = len(self._jobs)
+        return {
+            'pending': pending,
+            'started': metrics.get_counter('speculative.started'),
+            'claimed': metrics.get_counter('speculative.claimed'),
+            'discarded': metrics.get_counter('speculative.discarded'),
+            'failed': metrics.get_counter('speculative.failed'),
+            'cancelled_queued': metrics.get_counter('speculative.cancelled_queued'),
+            'expired': metrics.get_counter('speculative.expired'),
+            'claim_rate': metrics.ratio('speculative.claimed', 'speculative.started'),
+        }
@@ -22,6 +22,17 @@ import {
 import { API_ENDPOINTS } from '../config/api';
 import './MockupViewer.css';
 
+// Apply line changes returned by the edit endpoint: replace lines [start, end) of the base document
+const applyLineChanges = (baseHtml, changes) => {
+  const lines = baseHtml.match(/[^\n]*\n|[^\n]+$/g) || [];
+  [...changes]
+    .sort((a, b) => b.start - a.start)
+    .forEach((change) => {
+      lines.splice(change.start, change.end - change.start, ...change.lines);
+    });
+  return lines.join('');
+};
+
 function MockupViewer({ mockup, onBack }) {
   const [activeTab, setActiveTab] = useState('preview');
   const [refining, setRefining] = useState(false);
@@ -44,12 +55,22 @@ function MockupViewer({ mockup, onBack }) {
     setRefining(true);
 
     try {
-      const response = await axios.post(API_ENDPOINTS.REFINE_MOCKUP, {
-        original_html: htmlContent,
+      // The server refines its stored copy, so save any unsaved manual changes first
+      if (htmlContent !== mockup.html_content) {
+        await axios.put(API_ENDPOINTS.UPDATE_MOCKUP(mockup.id), {
+          html_content: htmlContent
+        });
+        mockup.html_content = htmlContent;
+      }
+
+      // The server loads the stored HTML and any unapplied feedback itself
+      const response = await axios.post(API_ENDPOINTS.REFINE_STORED_MOCKUP(mockup.id), {
         feedback: ['Refine and improve the design']
       });
 
       if (response.data.success) {
+        // Keep working on the refined version, so later edits don't overwrite the original
+        Object.assign(mockup, response.data.mockup, { html_content: response.data.html_content });
         setHtmlContent(response.data.html_content);
         alert('Mockup refined successfully!');
       }
@@ -109,33 +130,31 @@ function MockupViewer({ mockup, onBack }) {
     setEditInstruction('');
 
     try {
-      const response = await axios.post(API_ENDPOINTS.EDIT_HTML, {
-        html_content: htmlContent,
+      // The server edits its stored copy, so save any unsaved manual changes first
+      if (htmlContent !== mockup.html_content) {
+        await axios.put(API_ENDPOINTS.UPDATE_MOCKUP(mockup.id), {
+          html_content: htmlContent
+        });
+        mockup.html_content = htmlContent;
+      }
+
+      const response = await axios.post(API_ENDPOINTS.EDIT_MOCKUP(mockup.id), {
         instruction: userMessage
       });
 
-      if (response.data.success && response.data.html_content) {
-        const newHtml = response.data.html_content;
-        setHtmlContent(newHtml);
-        
-        // Automatically save the edited HTML to the database
-        try {
-          await axios.put(API_ENDPOINTS.UPDATE_MOCKUP(mockup.id), {
-            html_content: newHtml
-          });
-          // Update mockup object to reflect saved changes
-          mockup.html_content = newHtml;
-          setChatHistory(prev => [...prev, { 
-            role: 'assistant', 
-            content: 'HTML has been updated and saved successfully! Check the preview to see the changes.' 
-          }]);
-        } catch (saveErr) {
-          console.error('Error auto-saving changes:', saveErr);
-          setChatHistory(prev => [...prev, { 
-            role: 'assistant', 
-            content: 'HTML has been updated, but failed to save. Please click "Save Changes" manually.' 
-          }]);
+      if (response.data.success) {
+        // Only the changed lines come back; apply them to the saved document
+        let newHtml = applyLineChanges(mockup.html_content, response.data.changes || []);
+        if (newHtml.length !== response.data.html_length) {
+          const refreshed = await axios.get(API_ENDPOINTS.GET_MOCKUP(mockup.id));
+          newHtml = refreshed.data.mockup.html_content;
         }
+        setHtmlContent(newHtml);
+        mockup.html_content = newHtml;
+        setChatHistory(prev => [...prev, { 
+          role: 'assistant', 
+          content: 'HTML has been updated and saved successfully! Check the preview to see the changes.' 
+        }]);
       } else {
         throw new Error(response.data.error || 'Unknown error occurred');
       }
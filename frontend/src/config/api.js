@@ -17,7 +17,9 @@ export const API_ENDPOINTS = {
   GET_FEEDBACK: (id) => `${API_BASE_URL}/api/mockups/${id}/feedback`,
   ADD_FEEDBACK: (id) => `${API_BASE_URL}/api/mockups/${id}/feedback`,
   EDIT_HTML: `${API_BASE_URL}/api/edit-html`,
+  EDIT_MOCKUP: (id) => `${API_BASE_URL}/api/mockups/${id}/edit`,
   REFINE_MOCKUP: `${API_BASE_URL}/api/refine-mockup`,
+  REFINE_STORED_MOCKUP: (id) => `${API_BASE_URL}/api/mockups/${id}/refine`,
   SIMULATE_FEEDBACK: `${API_BASE_URL}/api/simulate-feedback`,
   SUBMIT_MOCKUP: (id) => `${API_BASE_URL}/api/mockups/${id}/submit`,
   JIRA_TEST: `${API_BASE_URL}/api/jira/test`,